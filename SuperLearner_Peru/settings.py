@@ -81,6 +81,21 @@ DATABASES = {
     )
 }
 
+# Los tests de concurrencia (p. ej. create_session) abren conexiones desde varios hilos:
+# con SQLite la base de datos de test debe ser un archivo y no la que Django crea en memoria
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('TEST', {}).setdefault('NAME', os.path.join(BASE_DIR, 'test_db.sqlite3'))
+
+# Memoria local por defecto; en producción apuntar CACHE_URL a un backend compartido
+# (p. ej. redis://host:6379/0) para que todas las instancias vean las mismas versiones
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://')
+}
+
+# Reportes Excel generados en segundo plano (ver metricas.services.reporte_service)
+REPORTES_DIR = env('REPORTES_DIR', default=os.path.join(BASE_DIR, 'reportes'))
+REPORTES_MAX_WORKERS = env.int('REPORTES_MAX_WORKERS', default=1)
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -128,6 +143,8 @@ CORS_ALLOWED_HEADERS = [
     'x-requested-with',
     'cache-control',
     'x-api-key',
+    'if-none-match',
+    'if-modified-since',
 ]
 
 CORS_ALLOWED_METHODS = [
@@ -143,6 +160,9 @@ CORS_EXPOSE_HEADERS = [
     'content-disposition',
     'content-type',
     'authorization',
+    'x-sync-token',
+    'etag',
+    'last-modified',
 ]
 
 CORS_PREFLIGHT_MAX_AGE = 86400
@@ -205,7 +225,7 @@ REDOC_SETTINGS = {
 # ----------- DRF CONFIGURATION -----------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -0,0 +1,63 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication que guarda en la caché de Django los campos de CACHED_FIELDS
+    del usuario del token, para que las peticiones autenticadas no consulten
+    authtoken_token JOIN auth_user.
+
+    En la caché no se guarda el usuario completo (ni su contraseña): con una entrada
+    vigente se devuelve un User con solo esos campos cargados. Son los que leen los
+    permisos de DRF, AuthorizationSnapshot y el perfil; cualquier otro campo se lee de
+    la base de datos si la vista llega a usarlo.
+
+    Las entradas duran poco y se descartan al borrar el token (login emite uno nuevo)
+    o al modificar el usuario, tanto desde User como desde el espejo AuthUser.
+    """
+
+    CACHE_PREFIX = 'auth:token'
+    TIMEOUT = 60 * 2
+    # Nunca la contraseña: solo lo que el camino de una petición normal lee del usuario.
+    # En el orden de los campos de User, como los espera Model.from_db
+    CACHED_FIELDS = ('id', 'is_superuser', 'username', 'email', 'is_staff', 'is_active')
+
+    @classmethod
+    def cache_key(cls, key):
+        # Nunca el token en claro como clave: las claves pueden verse en las herramientas de la caché
+        return f'{cls.CACHE_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+    def authenticate_credentials(self, key):
+        entry = cache.get(self.cache_key(key))
+        # Una entrada con otros campos (de una versión anterior) cuenta como ausente
+        if entry is None or len(entry) != len(self.CACHED_FIELDS):
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            user = token.user
+            cache.set(self.cache_key(key), tuple(getattr(user, name) for name in self.CACHED_FIELDS), self.TIMEOUT)
+        else:
+            User = get_user_model()
+            user = User.from_db(User.objects.db, list(self.CACHED_FIELDS), list(entry))
+            token = Token.from_db(Token.objects.db, ['key', 'user_id'], [key, user.pk])
+            token.user = user
+
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return user, token
+
+    @classmethod
+    def invalidate(cls, *keys):
+        cache.delete_many([cls.cache_key(key) for key in keys])
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        """Descarta los tokens cacheados de un usuario (p. ej. al desactivar la cuenta)."""
+        cls.invalidate(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import AuthUserRoles
+
+
+class AuthorizationSnapshot:
+    """
+    Roles, grupos y permisos de un usuario, resueltos juntos y reutilizados.
+
+    La instantánea se guarda en el objeto del usuario durante el resto de la petición
+    y en la caché de Django entre peticiones. Los cambios de roles y grupos la
+    invalidan con las señales de api/signals.py.
+    """
+
+    CACHE_PREFIX = 'auth:snapshot'
+    TIMEOUT = 60 * 10
+    ATTRIBUTE = '_authorization_snapshot'
+
+    ADMIN = 'admin'
+    VOLUNTEER = 'Volunteers_Profesor'
+
+    def __init__(self, user_id, role_ids, role_names, groups, permissions):
+        self.user_id = user_id
+        self.role_ids = role_ids
+        self.role_names = role_names
+        self.groups = groups
+        self.permissions = permissions
+
+    @property
+    def role_id(self):
+        """Primer rol asignado al usuario (con el que trabaja el front end), o None."""
+        return self.role_ids[0] if self.role_ids else None
+
+    def has_role(self, name):
+        return name in self.role_names
+
+    @property
+    def is_admin(self):
+        return self.has_role(self.ADMIN)
+
+    @property
+    def is_volunteer(self):
+        return self.has_role(self.VOLUNTEER)
+
+    @classmethod
+    def cache_key(cls, user_id):
+        return f'{cls.CACHE_PREFIX}:{user_id}'
+
+    @classmethod
+    def for_user(cls, user):
+        snapshot = getattr(user, cls.ATTRIBUTE, None)
+        if snapshot is None:
+            snapshot = cache.get(cls.cache_key(user.pk))
+            if snapshot is None:
+                snapshot = cls._load(user)
+                cache.set(cls.cache_key(user.pk), snapshot, cls.TIMEOUT)
+            setattr(user, cls.ATTRIBUTE, snapshot)
+        return snapshot
+
+    @classmethod
+    def _load(cls, user):
+        # La copia no administrada AuthUser no tiene API de permisos: se resuelven con el User de Django
+        if not isinstance(user, User):
+            user = User.objects.get(pk=user.pk)
+
+        roles = list(
+            AuthUserRoles.objects.filter(user_id=user.pk).order_by('id').values_list('role_id', 'role__name')
+        )
+        return cls(
+            user_id=user.pk,
+            role_ids=tuple(role_id for role_id, _ in roles),
+            role_names=frozenset(name for _, name in roles),
+            groups=tuple(user.groups.values_list('name', flat=True)),
+            permissions=frozenset(user.get_all_permissions()),
+        )
+
+    @classmethod
+    def invalidate(cls, *user_ids):
+        cache.delete_many([cls.cache_key(user_id) for user_id in user_ids])
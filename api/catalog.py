@@ -0,0 +1,70 @@
+from .models import Class
+from .versioned import VersionedSnapshot
+
+
+class ClassCatalog:
+    """
+    Copia en memoria del proceso de la tabla `class`, por ID.
+
+    Se carga con una sola consulta values_list() y se mantiene con VersionedSnapshot:
+    guardar o borrar una Class incrementa su versión desde api/signals.py, y pasados
+    VersionedSnapshot.MAX_AGE segundos se recarga aunque nadie avise. Con la copia
+    vigente, cada búsqueda cuesta una lectura de la versión en la caché y ninguna
+    consulta.
+
+    Cada búsqueda devuelve instancias nuevas, como Class.objects.get, así que se
+    pueden modificar o guardar sin tocar el catálogo.
+    """
+
+    def __init__(self):
+        self._fields = [field.attname for field in Class._meta.concrete_fields]
+        # {id: fila en el orden de self._fields}, ordenado por ID
+        self.snapshot = VersionedSnapshot('catalog:class', self._load)
+
+    def _load(self):
+        return {row[0]: row for row in Class.objects.order_by('id').values_list(*self._fields)}
+
+    def invalidate(self):
+        self.snapshot.invalidate()
+
+    @staticmethod
+    def _key(pk):
+        # IDs que no son enteros no existen, igual que uno que no está en la tabla
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            return None
+
+    def _instance(self, row):
+        return Class.from_db(Class.objects.db, self._fields, row)
+
+    def get(self, pk):
+        """Como Class.objects.get(pk=pk), pero un ID mal formado también lanza Class.DoesNotExist."""
+        row = self.snapshot.get().get(self._key(pk))
+        if row is None:
+            raise Class.DoesNotExist(f"No existe la clase con id={pk}.")
+        return self._instance(row)
+
+    def get_many(self, pks):
+        """{id: Class} de los IDs de `pks` que existen; los demás se omiten."""
+        rows = self.snapshot.get()
+        found = (rows.get(self._key(pk)) for pk in pks)
+        return {row[0]: self._instance(row) for row in found if row is not None}
+
+    def all(self):
+        """Todas las clases, ordenadas por ID."""
+        return [self._instance(row) for row in self.snapshot.get().values()]
+
+    def values(self, pks=None):
+        """
+        Filas como diccionarios de columnas (como Class.objects.values()), ordenadas por
+        ID; solo las de `pks` si se indica. Pensado para las subclases de ValuesSerializer.
+        """
+        rows = self.snapshot.get()
+        if pks is not None:
+            keys = sorted({self._key(pk) for pk in pks} - {None})
+            rows = {key: rows[key] for key in keys if key in rows}
+        return [dict(zip(self._fields, row)) for row in rows.values()]
+
+
+CLASS_CATALOG = ClassCatalog()
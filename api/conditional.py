@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def _timestamp(value):
+    # Con USE_TZ = False las fechas de la base de datos son locales a TIME_ZONE, no a la zona del servidor
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_default_timezone())
+    return int(value.timestamp())
+
+
+def conditional_response(request, fingerprint, build, last_modified=None):
+    """
+    GET condicional para endpoints de lectura.
+
+    `fingerprint` es un valor pequeño serializable a JSON que cambia siempre que
+    cambiaría la respuesta (normalmente total de filas, último ID y máximo
+    updated_at, leídos con una sola consulta de agregados). El ETag fuerte se deriva
+    de él y de la URL, así que un If-None-Match que coincide recibe un 304 sin que
+    `build()` llegue a ejecutarse.
+
+    `last_modified` solo debe pasarse cuando toda modificación de la respuesta la
+    hace avanzar: un máximo de updated_at no se mueve al borrar filas, y con él un
+    cliente que solo envía If-Modified-Since recibiría un 304 con datos viejos.
+    """
+    content = json.dumps([request.get_full_path(), fingerprint], default=str, sort_keys=True)
+    etag = quote_etag(hashlib.sha256(content.encode()).hexdigest())
+    timestamp = _timestamp(last_modified) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        # Respuestas con token: solo en la caché del cliente, y siempre revalidadas
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,42 @@
+from drf_yasg import openapi
+
+
+# Parámetro con la lista, separada por comas, de los campos que quiere recibir el cliente
+FIELDS_PARAM = 'fields'
+
+FIELDS_PARAMETER = openapi.Parameter(
+    FIELDS_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING,
+    description="Campos a devolver separados por coma (p. ej. id,name,last_name,status). "
+                "Los campos omitidos no se consultan"
+)
+
+
+def requested_fields(request, available):
+    """
+    Campos pedidos en `?fields=`, en el orden del serializador, o None si no se envía el
+    parámetro (todos los campos). Lanza ValueError con los campos desconocidos.
+    """
+    value = request.query_params.get(FIELDS_PARAM)
+    if value is None:
+        return None
+
+    requested = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = sorted(requested - set(available))
+    if unknown or not requested:
+        raise ValueError(
+            f"Campos no válidos: {', '.join(unknown) or '(vacío)'}. Disponibles: {', '.join(available)}"
+        )
+    return [name for name in available if name in requested]
+
+
+class SparseFieldsMixin:
+    """
+    Mixin para ModelSerializer: `Serializer(..., fields=[...])` conserva solo esos campos,
+    así que los SerializerMethodField omitidos nunca se evalúan.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -5,7 +5,7 @@
 #   * Make sure each ForeignKey and OneToOneField has `on_delete` set to the desired behavior
 #   * Remove `managed = False` lines if you wish to allow Django to create, modify, and delete the table
 # Feel free to rename the models, but don't rename db_table values or field names.
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 
 class AttendanceStudent(models.Model):
@@ -249,6 +249,60 @@ class Session(models.Model):
         db_table = 'sessions'
 
 
+class ClassSessionCounter(models.Model):
+    """
+    Último num_session asignado por clase. Cada asignación es un solo
+    UPDATE ... SET last_num_session = last_num_session + 1, así que el bloqueo de la
+    fila ordena las peticiones concurrentes de una misma clase en lugar de que
+    compitan con SELECT MAX(num_session).
+    """
+    id_class = models.OneToOneField(Class, models.CASCADE, primary_key=True, db_column='id_class', db_constraint=False)
+    last_num_session = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'class_session_counter'
+
+    @classmethod
+    def next_num_session(cls, class_id):
+        """
+        Reserva el siguiente número de sesión de la clase. Debe ejecutarse dentro de la
+        misma transacción que crea la sesión, y antes de cualquier lectura en ella, para
+        que el bloqueo del contador se mantenga hasta que se confirme la sesión.
+        """
+        updated = cls.objects.filter(id_class=class_id).update(last_num_session=models.F('last_num_session') + 1)
+        if not updated:
+            # Primera asignación de la clase: se continúa desde las sesiones creadas antes del contador
+            current = Session.objects.filter(id_class=class_id).aggregate(
+                current=models.Max('num_session')
+            )['current'] or 0
+            try:
+                with transaction.atomic():
+                    cls.objects.create(id_class_id=class_id, last_num_session=current + 1)
+            except IntegrityError:
+                # Otra petición creó el contador antes: se toma el siguiente número de él
+                cls.objects.filter(id_class=class_id).update(last_num_session=models.F('last_num_session') + 1)
+
+        return cls.objects.values_list('last_num_session', flat=True).get(id_class=class_id)
+
+
+class SyncTombstone(models.Model):
+    """Filas eliminadas, para que las sincronizaciones incrementales (changes_since) informen las bajas."""
+    STUDENTS = 'students'
+    PARENTS = 'parents'
+    CLASSES = 'classes'
+    SESSIONS = 'sessions'
+    VOLUNTEER_CLASSES = 'volunteer_classes'
+
+    entity = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    scope_id = models.BigIntegerField(blank=True, null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'sync_tombstones'
+        indexes = [models.Index(fields=['entity', 'deleted_at'])]
+
+
 class VolunteerClass(models.Model):
     id = models.BigAutoField(primary_key=True)
     id_class = models.ForeignKey(Class, models.CASCADE, db_column='id_class')
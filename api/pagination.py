@@ -0,0 +1,46 @@
+from drf_yasg import openapi
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework import status
+
+
+class IdCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre la clave primaria, de la más reciente a la más antigua.
+    Cada página es una consulta `WHERE id < cursor ORDER BY id DESC LIMIT n`, así que su
+    costo no depende de cuán adentro de la lista esté el cliente.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+# Parámetro que devuelve la lista completa sin paginar (formato de respuesta anterior)
+UNPAGINATED_PARAM = 'paginate'
+
+PAGINATION_PARAMETERS = [
+    openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Cursor devuelto en 'next' o 'previous'"),
+    openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description=f"Elementos por página (por defecto {IdCursorPagination.page_size}, máximo {IdCursorPagination.max_page_size})"),
+    openapi.Parameter(UNPAGINATED_PARAM, openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, default=True,
+                      description="false devuelve la lista completa sin paginar (formato anterior)"),
+]
+
+
+def paginated_response(request, queryset, serializer_class, view=None, pagination_class=IdCursorPagination,
+                       **serializer_kwargs):
+    """
+    Serializa una página de `queryset` como {next, previous, results}, o el queryset
+    completo como lista cuando el cliente envía `paginate=false`. Los demás argumentos
+    con nombre (p. ej. `fields`) se pasan al serializador.
+    """
+    if request.query_params.get(UNPAGINATED_PARAM, 'true').lower() in ('false', '0'):
+        serializer = serializer_class(queryset, many=True, **serializer_kwargs)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    paginator = pagination_class()
+    page = paginator.paginate_queryset(queryset, request, view=view)
+    serializer = serializer_class(page, many=True, **serializer_kwargs)
+    return paginator.get_paginated_response(serializer.data)
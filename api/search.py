@@ -0,0 +1,126 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+
+from drf_yasg import openapi
+
+from .models import Parents, Students
+from .versioned import VersionedSnapshot
+
+
+SEARCH_QUERY_PARAM = 'q'
+SEARCH_LIMIT_PARAM = 'limit'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+SEARCH_PARAMETERS = [
+    openapi.Parameter(SEARCH_QUERY_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                      description="Texto a buscar en nombre, apellido o documento (por prefijo, sin distinguir tildes)"),
+    openapi.Parameter(SEARCH_LIMIT_PARAM, openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description=f"Máximo de resultados (por defecto {DEFAULT_LIMIT}, máximo {MAX_LIMIT})"),
+]
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def normalize(text):
+    """Palabras en minúsculas y sin tildes: 'Núñez-Pérez' -> ['nunez', 'perez']."""
+    decomposed = unicodedata.normalize('NFKD', str(text or ''))
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _TOKEN.findall(stripped.lower())
+
+
+class PrefixSearchIndex:
+    """
+    Índice por prefijo, en memoria del proceso, sobre name, last_name y document_id
+    de un modelo.
+
+    Cada par (palabra, id) se guarda en una lista ordenada, así que buscar un prefijo
+    son dos bisecciones. El índice se construye con una consulta values() y se
+    mantiene con VersionedSnapshot: las escrituras incrementan su versión desde
+    api/signals.py, y pasados VersionedSnapshot.MAX_AGE segundos se recarga aunque
+    nadie avise. La reconstrucción corre en segundo plano y mientras tanto las
+    búsquedas usan el índice anterior.
+    """
+
+    TEXT_FIELDS = ('name', 'last_name', 'document_id')
+
+    def __init__(self, name, model, fields):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        # (lista ordenada [(palabra, id)], {id: datos para ordenar resultados})
+        self.snapshot = VersionedSnapshot(f'search:{name}', self._build, background=True)
+
+    def invalidate(self):
+        self.snapshot.invalidate()
+
+    def _build(self):
+        tokens, rows = [], {}
+        for row in self.model.objects.values(*self.fields).order_by():
+            words = {field: normalize(row[field]) for field in self.TEXT_FIELDS}
+            # Precalculado para ordenar: todas las palabras, documento normalizado, primer nombre, clave de orden
+            rows[row['id']] = (
+                row,
+                frozenset(word for field_words in words.values() for word in field_words),
+                ''.join(words['document_id']),
+                words['name'][0] if words['name'] else '',
+                (' '.join(words['last_name']), row['id']),
+            )
+            for field_words in words.values():
+                for token in field_words:
+                    tokens.append((token, row['id']))
+        tokens.sort()
+        return tokens, rows
+
+    @staticmethod
+    def _prefix_ids(tokens, prefix):
+        # Las palabras solo tienen [a-z0-9]: todas las que empiezan por `prefix` van antes que prefix + '{'
+        start = bisect_left(tokens, (prefix,))
+        end = bisect_left(tokens, (prefix + '{',), start)
+        return {row_id for _, row_id in tokens[start:end]}
+
+    @staticmethod
+    def _score(entry, terms):
+        _, words, document, first_name, _ = entry
+        score = 100 if document and document == ''.join(terms) else 0
+        for term in terms:
+            score += 10 if term in words else 1
+        if first_name.startswith(terms[0]):
+            score += 5
+        return score
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """Filas con alguna palabra que empieza por cada término de `text`, las mejores primero."""
+        terms = normalize(text)
+        if not terms:
+            return []
+        tokens, rows = self.snapshot.get()
+
+        # Intersección empezando por el término más largo, que suele tener menos coincidencias
+        ordered = sorted(set(terms), key=len, reverse=True)
+        ids = self._prefix_ids(tokens, ordered[0])
+        for term in ordered[1:]:
+            if not ids:
+                break
+            ids &= self._prefix_ids(tokens, term)
+
+        best = heapq.nsmallest(
+            limit, ids, key=lambda row_id: (-self._score(rows[row_id], terms), rows[row_id][4])
+        )
+        return [rows[row_id][0] for row_id in best]
+
+
+STUDENT_INDEX = PrefixSearchIndex(
+    'students', Students, ('id', 'name', 'last_name', 'document_id', 'parent_id', 'status')
+)
+PARENT_INDEX = PrefixSearchIndex(
+    'parents', Parents, ('id', 'name', 'last_name', 'document_id', 'email', 'phone', 'status')
+)
+
+
+def parse_limit(request):
+    """Parámetro `limit` acotado a 1..MAX_LIMIT. Lanza ValueError si no es un entero."""
+    limit = int(request.query_params.get(SEARCH_LIMIT_PARAM, DEFAULT_LIMIT))
+    return max(1, min(limit, MAX_LIMIT))
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import AuthUser, Class, Students, AttendanceStudent, Session, Volunteers, AuthUserRoles
+from .authorization import AuthorizationSnapshot
+from .values_serializers import ValuesSerializer
+from .models import AuthUser, Class, Students, AttendanceStudent, Session, Volunteers
 
 
 def map_attendance_value(value):
@@ -74,23 +76,27 @@ class UserSerializer(serializers.ModelSerializer):
         model = AuthUser
         fields = ['id', 'email', 'all_permissions', 'groups', 'role']
 
+    # Los tres campos salen de la misma instantánea de autorización (cacheada entre peticiones)
     def get_all_permissions(self, obj):
-        return list(obj.get_all_permissions())
+        return sorted(AuthorizationSnapshot.for_user(obj).permissions)
 
     def get_groups(self, obj):
-        return list(obj.groups.values_list('name', flat=True))
+        return list(AuthorizationSnapshot.for_user(obj).groups)
 
     def get_role(self, obj):
-        # Suponiendo que AuthUserRoles tiene una relación con AuthUser y AuthRole
-        user_role = AuthUserRoles.objects.filter(user=obj).first()  # Obtener el primer rol (o ajusta según tu lógica)
-        if user_role:
-            return user_role.role.id  # Devuelve el ID del rol en lugar del nombre
-        return None  # Devuelve None si no tiene rol
+        # ID del primer rol del usuario, o None si no tiene rol
+        return AuthorizationSnapshot.for_user(obj).role_id
     
 class GetCourses(serializers.ModelSerializer):
     class Meta:
         model = Class
         fields = ["id","category","name","day","start_time","end_time","color","status","created_at","updated_at"]
+
+
+class GetCoursesValues(ValuesSerializer):
+    """Misma salida que GetCourses, construida desde .values()"""
+    model_serializer = GetCourses
+    values = GetCourses.Meta.fields
         
 
         
@@ -0,0 +1,102 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .authentication import CachedTokenAuthentication
+from .authorization import AuthorizationSnapshot
+from .catalog import CLASS_CATALOG
+from .search import PARENT_INDEX, STUDENT_INDEX
+from .models import AuthUser, AuthUserRoles, Class, Parents, Session, Students, SyncTombstone, VolunteerClass
+
+
+def _tombstone(entity, object_id, scope_id=None):
+    SyncTombstone.objects.create(entity=entity, object_id=object_id, scope_id=scope_id)
+
+
+@receiver(post_delete, sender=Students)
+def students_deleted(sender, instance, **kwargs):
+    _tombstone(SyncTombstone.STUDENTS, instance.pk)
+
+
+@receiver(post_delete, sender=Parents)
+def parents_deleted(sender, instance, **kwargs):
+    _tombstone(SyncTombstone.PARENTS, instance.pk)
+
+
+@receiver(post_delete, sender=Class)
+def class_deleted(sender, instance, **kwargs):
+    _tombstone(SyncTombstone.CLASSES, instance.pk)
+
+
+@receiver(post_delete, sender=Session)
+def session_deleted(sender, instance, **kwargs):
+    _tombstone(SyncTombstone.SESSIONS, instance.pk, scope_id=instance.id_class_id)
+
+
+@receiver(post_delete, sender=VolunteerClass)
+def volunteer_class_deleted(sender, instance, **kwargs):
+    # Para el voluntario la clase desaparece de su lista aunque siga existiendo
+    _tombstone(SyncTombstone.VOLUNTEER_CLASSES, instance.id_class_id, scope_id=instance.id_volunteer_id)
+
+
+@receiver(post_save, sender=VolunteerClass)
+def volunteer_class_saved(sender, instance, created, **kwargs):
+    # Una clase recién asignada debe aparecer como modificada en la próxima sincronización del voluntario
+    if created:
+        Class.objects.filter(id=instance.id_class_id).update(updated_at=timezone.now())
+        CLASS_CATALOG.invalidate()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    CachedTokenAuthentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=AuthUser)
+def user_saved(sender, instance, created, **kwargs):
+    # Las cachés guardan el estado del usuario y sus permisos: un cambio (p. ej. is_active) debe verse de inmediato.
+    # update_volunteer edita la cuenta a través del espejo AuthUser, que no dispara las señales de User
+    if not created:
+        CachedTokenAuthentication.invalidate_user(instance.pk)
+        AuthorizationSnapshot.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=AuthUserRoles)
+@receiver(post_delete, sender=AuthUserRoles)
+def user_role_changed(sender, instance, **kwargs):
+    # create_volunteer / update_volunteer asignan roles: la próxima petición debe ver el rol nuevo
+    AuthorizationSnapshot.invalidate(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_groups_changed(sender, instance, reverse, pk_set, **kwargs):
+    if not kwargs['action'].startswith('post_'):
+        return
+    if reverse:
+        # Cambio hecho desde el grupo o el permiso: afecta a los usuarios de pk_set
+        AuthorizationSnapshot.invalidate(*(pk_set or ()))
+    else:
+        AuthorizationSnapshot.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Students)
+@receiver(post_delete, sender=Students)
+def students_changed(sender, **kwargs):
+    STUDENT_INDEX.invalidate()
+
+
+@receiver(post_save, sender=Parents)
+@receiver(post_delete, sender=Parents)
+def parents_changed(sender, **kwargs):
+    PARENT_INDEX.invalidate()
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+def class_changed(sender, **kwargs):
+    # update_color y cualquier otra escritura: los procesos recargan el catálogo en la próxima consulta
+    CLASS_CATALOG.invalidate()
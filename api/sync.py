@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from drf_yasg import openapi
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import SyncTombstone
+
+
+# Parámetro que pasa un endpoint de listado a modo incremental
+CHANGES_SINCE_PARAM = 'changes_since'
+
+# Cabecera con el token que el cliente debe enviar como `changes_since` en la siguiente sincronización
+SYNC_TOKEN_HEADER = 'X-Sync-Token'
+
+# El token entregado se retrasa este margen para que la siguiente sincronización recoja las filas
+# de transacciones que seguían abiertas durante la lectura (a costa de repetir algunas)
+SYNC_GRACE = timedelta(seconds=30)
+
+SYNC_PARAMETERS = [
+    openapi.Parameter(CHANGES_SINCE_PARAM, openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="sync_token de la sincronización anterior (o fecha ISO 8601). "
+                                  "Devuelve solo las filas creadas, modificadas o eliminadas desde entonces"),
+]
+
+
+def parse_changes_since(request):
+    """
+    Fecha enviada en `changes_since`, o None si el cliente pide la lista completa.
+    Lanza ValueError si el valor no es una fecha válida.
+    """
+    value = request.query_params.get(CHANGES_SINCE_PARAM)
+    if not value:
+        return None
+
+    invalid = ValueError(f"Invalid {CHANGES_SINCE_PARAM}: {value}")
+    try:
+        # parse_* devuelven None si el formato no coincide y lanzan ValueError si la fecha no existe (mes 13)
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise invalid
+            since = datetime.combine(day, datetime.min.time())
+    except ValueError:
+        raise invalid
+
+    # Los tokens se emiten siempre en la hora (naive) del servidor; se descarta el desfase que agregue el cliente
+    if timezone.is_aware(since) and not timezone.is_aware(timezone.now()):
+        since = timezone.make_naive(since)
+    return since
+
+
+def next_sync_token():
+    """Token de la sincronización que se va a servir; se toma antes de leer las filas."""
+    return (timezone.now() - SYNC_GRACE).isoformat()
+
+
+def deleted_ids(entity, since, scope_id=None):
+    """IDs de las filas de `entity` eliminadas desde `since`, opcionalmente solo las de un ámbito."""
+    tombstones = SyncTombstone.objects.filter(entity=entity, deleted_at__gte=since)
+    if scope_id is not None:
+        tombstones = tombstones.filter(scope_id=scope_id)
+    return sorted(set(tombstones.values_list('object_id', flat=True)))
+
+
+def changes_response(sync_token, updated, deleted):
+    """Respuesta incremental: filas a insertar o actualizar, IDs a eliminar y el token de la siguiente sincronización."""
+    response = Response({
+        'sync_token': sync_token,
+        'updated': updated,
+        'deleted': deleted,
+    }, status=status.HTTP_200_OK)
+    response[SYNC_TOKEN_HEADER] = sync_token
+    return response
+
+
+def invalid_changes_since_response(error):
+    return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
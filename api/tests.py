@@ -1,3 +1,987 @@
-from django.test import TestCase
+import datetime
+import re
+import threading
+from unittest import SkipTest, mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.db.models import Prefetch
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from students.serializers import (
+    StudentCourseInfoSerializer, StudentCourseInfoValuesSerializer,
+    StudentDetailsSerializer, StudentDetailsValuesSerializer,
+)
+from metricas.models import AsistenciaDiariaEstudiante, SesionesDiariasClase
+from metricas.services.cache_service import MetricasCacheService
+from metricas.services.rollup_service import RollupAsistenciaService
+from .authentication import CachedTokenAuthentication
+from .authorization import AuthorizationSnapshot
+from .catalog import CLASS_CATALOG
+from .models import (
+    AttendanceStudent, AuthRole, AuthUser, AuthUserRoles, BirthStudents, Class, ClassSessionCounter,
+    Parents, Session, StudentClass, Students, SyncTombstone, VolunteerClass, Volunteers,
+)
+from .search import STUDENT_INDEX, PrefixSearchIndex, normalize
+from .serializers import GetCourses, GetCoursesValues
+from .sync import CHANGES_SINCE_PARAM, SYNC_GRACE, SYNC_TOKEN_HEADER, deleted_ids, next_sync_token
+from .views import BATCH_MAX_SESSIONS
+
+# Tablas que en producción existen fuera de Django (managed = False) y que los tests crean a mano
+UNMANAGED_MODELS = [
+    Parents, Class, Students, BirthStudents, StudentClass, Volunteers, VolunteerClass,
+    AttendanceStudent, AuthRole, AuthUserRoles,
+]
+
+
+def selected_columns(sql, table):
+    """Columnas de `table` en la lista del SELECT de una consulta capturada"""
+    return re.findall(rf'"{table}"\."(\w+)"', sql.split(' FROM ', 1)[0])
+
+
+class UnmanagedTablesTestCase(TransactionTestCase):
+    """Crea las tablas de UNMANAGED_MODELS para la clase de test y las vacía después de cada test"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with connection.schema_editor() as editor:
+            for model in UNMANAGED_MODELS:
+                editor.create_model(model)
+
+    @classmethod
+    def tearDownClass(cls):
+        with connection.schema_editor() as editor:
+            for model in reversed(UNMANAGED_MODELS):
+                editor.delete_model(model)
+        super().tearDownClass()
+
+    def tearDown(self):
+        # flush solo vacía las tablas administradas; las demás se vacían antes para no romper claves foráneas
+        AttendanceStudent.objects.all().delete()
+        Session.objects.all().delete()
+        for model in reversed(UNMANAGED_MODELS):
+            model.objects.all().delete()
+        super().tearDown()
+
+
+class CreateSessionConcurrencyTest(UnmanagedTablesTestCase):
+    THREADS = 8
+    STUDENTS = 5
+
+    @classmethod
+    def setUpClass(cls):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise SkipTest("Necesita una base de datos que acepte conexiones concurrentes desde varios hilos")
+        super().setUpClass()
+
+    def setUp(self):
+        user = User.objects.create_user(username='admin', password='admin')
+        AuthUserRoles.objects.create(user=user, role=AuthRole.objects.create(name='admin'))
+        self.token = Token.objects.create(user=user).key
+
+        self.course = Class.objects.create(name='Clase')
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1)
+        VolunteerClass.objects.create(id_class=self.course, id_volunteer=volunteer)
+        for i in range(self.STUDENTS):
+            student = Students.objects.create(name=f'Estudiante {i}', document_id=f'S{i}', status=1)
+            StudentClass.objects.create(id_class=self.course, id_student=student)
+
+        # Sesión creada antes de que existiera el contador: la numeración debe continuar desde ella
+        Session.objects.create(id_class=self.course, num_session=3)
+
+    def test_concurrent_requests_get_distinct_session_numbers(self):
+        barrier = threading.Barrier(self.THREADS)
+        responses = []
+
+        def create_session():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+            try:
+                barrier.wait()
+                responses.append(client.post('/api/student/create_session/', {'id_class': self.course.id}, format='json'))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=create_session) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [201] * self.THREADS)
+
+        numbers = sorted(response.data['session']['num_session'] for response in responses)
+        self.assertEqual(numbers, list(range(4, 4 + self.THREADS)))
+        self.assertEqual(ClassSessionCounter.objects.get(id_class=self.course).last_num_session, 3 + self.THREADS)
+
+        for response in responses:
+            attendance = AttendanceStudent.objects.filter(id_session=response.data['session']['id_session'])
+            self.assertEqual(attendance.count(), self.STUDENTS)
+            self.assertEqual(set(attendance.values_list('attendance', flat=True)), {''})
+
+
+class CreateSessionErrorTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        user = User.objects.create_user(username='admin', password='admin')
+        AuthUserRoles.objects.create(user=user, role=AuthRole.objects.create(name='admin'))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        self.course = Class.objects.create(name='Clase')
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1)
+        VolunteerClass.objects.create(id_class=self.course, id_volunteer=volunteer)
+        student = Students.objects.create(name='Estudiante', document_id='S1', status=1)
+        StudentClass.objects.create(id_class=self.course, id_student=student)
+
+    def test_unexpected_error_is_logged_and_rolled_back(self):
+        with mock.patch.object(Session.objects, 'create', side_effect=DatabaseError('fallo')), \
+                self.assertLogs('api.views', level='ERROR') as logs:
+            response = self.client.post('/api/student/create_session/', {'id_class': self.course.id}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'fallo'})
+        self.assertIn('Error en create_session', logs.output[0])
+        self.assertIn('DatabaseError: fallo', logs.output[0])
+        # El contador de sesiones se reservó dentro de la transacción deshecha
+        self.assertFalse(ClassSessionCounter.objects.filter(id_class=self.course).exists())
+        self.assertFalse(Session.objects.exists())
+
+
+class ValuesSerializersTest(UnmanagedTablesTestCase):
+    """Los serializadores sobre .values() deben producir exactamente el mismo JSON que los ModelSerializer"""
+
+    def setUp(self):
+        created = datetime.datetime(2025, 3, 1, 8, 30, 15, 123456)
+        courses = [
+            Class.objects.create(name='Inglés 5 - 7', category='Idiomas', day='Lunes', color='#FF5733', status=1,
+                                 start_time=datetime.time(15, 0), end_time=datetime.time(16, 30),
+                                 created_at=created, updated_at=created),
+            Class.objects.create(name='Arte', category=None, day=None, status=0),
+            Class.objects.create(name='Ñandú', category='Ciencia', day='Martes', start_time=datetime.time(0, 0),
+                                 end_time=datetime.time(9, 5, 7), created_at=created),
+        ]
+        parent = Parents.objects.create(name='María', last_name='Núñez', document_id='P001', email='maria@x.com')
+
+        students = [
+            Students.objects.create(name='Ana', last_name='Pérez', parent=parent, document_id='S001',
+                                    birthdate=datetime.date(2015, 2, 28), gender='F', status=1),
+            Students.objects.create(name='Luis', last_name=None, document_id='S002', status=0),
+            Students.objects.create(name='José', last_name='Quispe', parent=parent, nationality='Peruana',
+                                    document_type='DNI', document_id='S003', birthdate=datetime.date(2012, 12, 1)),
+        ]
+        # Sin cursos, con uno y con varios; sin información de nacimiento, con uno y con varios registros
+        StudentClass.objects.create(id_student=students[0], id_class=courses[2])
+        StudentClass.objects.create(id_student=students[0], id_class=courses[0])
+        StudentClass.objects.create(id_student=students[2], id_class=courses[1])
+        BirthStudents.objects.create(id_student=students[0], city='Lima', country='Perú')
+        BirthStudents.objects.create(id_student=students[2], city='Cusco', country=None)
+        BirthStudents.objects.create(id_student=students[2], city='Arequipa', country='Perú')
+
+    def assertSameJSON(self, expected, actual):
+        self.assertEqual(JSONRenderer().render(expected), JSONRenderer().render(actual))
+
+    def test_get_courses(self):
+        courses = Class.objects.order_by('id')
+        self.assertSameJSON(
+            GetCourses(courses, many=True).data,
+            GetCoursesValues(GetCoursesValues.queryset(courses), many=True).data
+        )
+
+    def test_student_details(self):
+        students = Students.objects.order_by('-id')
+        expected = StudentDetailsSerializer(
+            students.select_related('parent').prefetch_related(
+                'studentclass_set__id_class',
+                Prefetch('birthstudents_set', queryset=BirthStudents.objects.all(), to_attr='birth_prefetched')
+            ),
+            many=True
+        ).data
+
+        with self.assertNumQueries(3):
+            actual = StudentDetailsValuesSerializer(StudentDetailsValuesSerializer.queryset(students), many=True).data
+        self.assertSameJSON(expected, actual)
+
+        # Con `fields` solo salen esos campos, y se omiten las consultas de cursos y nacimiento
+        fields = ['id', 'birthdate', 'parent_info']
+        with self.assertNumQueries(1):
+            actual = StudentDetailsValuesSerializer(
+                StudentDetailsValuesSerializer.queryset(students, fields), many=True, fields=fields
+            ).data
+        self.assertSameJSON([{name: item[name] for name in fields} for item in expected], actual)
+
+    def test_student_course_info(self):
+        students = Students.objects.order_by('-id')
+        expected = StudentCourseInfoSerializer(students.prefetch_related('studentclass_set__id_class'), many=True).data
+
+        with self.assertNumQueries(2):
+            actual = StudentCourseInfoValuesSerializer(StudentCourseInfoValuesSerializer.queryset(students), many=True).data
+        self.assertSameJSON(expected, actual)
+
+
+class CachedTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='profe', password='clave', email='profe@x.com')
+        self.key = Token.objects.create(user=self.user).key
+        self.auth = CachedTokenAuthentication()
+
+    def test_cache_hit_skips_database_and_stores_no_user(self):
+        self.auth.authenticate_credentials(self.key)
+        # Solo los campos de CACHED_FIELDS: ni el usuario ni el hash de la contraseña pasan por la caché
+        self.assertEqual(cache.get(CachedTokenAuthentication.cache_key(self.key)),
+                         (self.user.pk, False, 'profe', 'profe@x.com', False, True))
+
+        with self.assertNumQueries(0):
+            user, token = self.auth.authenticate_credentials(self.key)
+            self.assertEqual((user.username, user.email, user.is_staff, user.is_superuser),
+                             ('profe', 'profe@x.com', False, False))
+        self.assertEqual((user.pk, token.key, token.user_id), (self.user.pk, self.key, self.user.pk))
+
+        # Los demás campos se leen de la base de datos cuando la vista los usa
+        with self.assertNumQueries(1):
+            self.assertEqual(user.last_login, None)
+
+    def test_entry_from_previous_version_is_a_miss(self):
+        cache.set(CachedTokenAuthentication.cache_key(self.key), (self.user.pk, True))
+
+        with self.assertNumQueries(1):
+            user, token = self.auth.authenticate_credentials(self.key)
+        self.assertEqual(user.email, 'profe@x.com')
+        self.assertEqual(len(cache.get(CachedTokenAuthentication.cache_key(self.key))),
+                         len(CachedTokenAuthentication.CACHED_FIELDS))
+
+    def test_invalid_token_is_rejected(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials('no-existe')
+
+    def test_deleted_token_is_rejected(self):
+        self.auth.authenticate_credentials(self.key)
+        Token.objects.filter(key=self.key).delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_user_deactivated_through_user_is_rejected(self):
+        self.auth.authenticate_credentials(self.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_user_deactivated_through_auth_user_is_rejected(self):
+        # update_volunteer y demás vistas de voluntarios editan la cuenta a través del espejo AuthUser
+        self.auth.authenticate_credentials(self.key)
+        auth_user = AuthUser.objects.get(pk=self.user.pk)
+        auth_user.is_active = 0
+        auth_user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+        # El estado inactivo también queda en caché y se sigue rechazando sin consultar
+        with self.assertNumQueries(0), self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+
+class CachedTokenRequestTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='profe', password='clave', email='profe@x.com')
+        self.key = Token.objects.create(user=self.user).key
+
+    def test_cached_request_reads_user_attributes_without_queries(self):
+        self.user.groups.add(Group.objects.create(name='Coordinación'))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        # La primera petición llena las cachés del token y de la instantánea de autorización
+        first = client.get('/api/user/profile/')
+        self.assertEqual(first.status_code, 200)
+
+        # IsAuthenticated, UserSerializer (id, email) y la instantánea: nada va a la base de datos
+        with self.assertNumQueries(0):
+            response = client.get('/api/user/profile/')
+        self.assertEqual(response.json(), first.json())
+        self.assertEqual((response.json()['email'], response.json()['groups']), ('profe@x.com', ['Coordinación']))
+
+        # Un cambio en el usuario descarta la entrada y la siguiente petición ve el dato nuevo
+        self.user.email = 'nuevo@x.com'
+        self.user.save()
+        self.assertEqual(client.get('/api/user/profile/').json()['email'], 'nuevo@x.com')
+
+
+class ConditionalGetTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        self.course = Class.objects.create(name='Inglés', updated_at=datetime.datetime(2025, 3, 1, 8, 30))
+        self.other = Class.objects.create(name='Arte')
+        self.students = [Students.objects.create(name=f'Estudiante {i}', document_id=f'S{i}') for i in range(3)]
+        for student in self.students:
+            StudentClass.objects.create(id_class=self.course, id_student=student)
+        self.sessions = [
+            Session.objects.create(id_class=self.course, num_session=i, date=datetime.datetime(2025, 3, i, 15, 0))
+            for i in (1, 2)
+        ]
+
+    def assertRevalidates(self, url, change):
+        """200 con ETag; 304 vacío con el mismo ETag; tras `change()`, 200 con otro ETag"""
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        etag = response['ETag']
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+        self.assertEqual(not_modified['ETag'], etag)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def assertIgnoresIfModifiedSince(self, url):
+        # Las listas no envían Last-Modified: un If-Modified-Since solo nunca produce un 304
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(2_000_000_000))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_get_courses(self):
+        url = '/api/class/get_courses/?user_id=1&role_id=1'
+        response = self.assertRevalidates(url, self.other.delete)
+        self.assertEqual([course['id'] for course in response.data], [self.course.id])
+        self.assertIgnoresIfModifiedSince(url)
+
+    def test_get_students_id(self):
+        url = f'/api/student/getStudents_id/?class_id={self.course.id}'
+        response = self.assertRevalidates(
+            url, StudentClass.objects.filter(id_student=self.students[0]).delete
+        )
+        self.assertEqual(sorted(student['id'] for student in response.data), [s.id for s in self.students[1:]])
+        self.assertIgnoresIfModifiedSince(url)
+
+    def test_get_sessions_class(self):
+        url = f'/api/student/get_sessions_class/?class_id={self.course.id}'
+        response = self.assertRevalidates(url, self.sessions[0].delete)
+        self.assertEqual([session['id_session'] for session in response.data['sessions']], [self.sessions[1].id_session])
+        self.assertIgnoresIfModifiedSince(url)
+
+    def test_get_course_by_id(self):
+        url = f'/api/class/get_Courses_id/?course_id={self.course.id}'
+        response = self.client.get(url)
+        # updated_at se interpreta en TIME_ZONE (America/Lima, UTC-5)
+        self.assertEqual(response['Last-Modified'], 'Sat, 01 Mar 2025 13:30:00 GMT')
+
+        not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.client.post('/api/class/update_color/', {'class_id': self.course.id, 'color': '#000000'}, format='json')
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['color'], '#000000')
+
+
+class PrefixSearchIndexTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.nunez = Students.objects.create(name='José Luis', last_name='Núñez Pérez', document_id='70123456')
+        self.perez = Students.objects.create(name='Ana', last_name='Pérez', document_id='70999999')
+        self.otro = Students.objects.create(name='Luisa', last_name='Quispe', document_id='123')
+        # Índice nuevo con la misma versión que STUDENT_INDEX, la que incrementan las señales
+        self.index = PrefixSearchIndex('students', Students, STUDENT_INDEX.fields)
+
+    def ids(self, text):
+        return [row['id'] for row in self.index.search(text)]
+
+    def test_normalize_folds_case_and_accents(self):
+        self.assertEqual(normalize('  NÚÑEZ-Pérez, José '), ['nunez', 'perez', 'jose'])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.ids('núñ'), [self.nunez.id])
+        self.assertEqual(self.ids('NUNEZ'), [self.nunez.id])
+        self.assertEqual(sorted(self.ids('luis')), sorted([self.nunez.id, self.otro.id]))
+        # Cada término debe coincidir con alguna palabra de la misma fila
+        self.assertEqual(self.ids('per jos'), [self.nunez.id])
+        self.assertEqual(self.ids('zzz'), [])
+        self.assertEqual(self.ids(' - '), [])
+
+    def test_ranking_and_limit(self):
+        # Documento exacto primero; luego palabras completas antes que prefijos
+        self.assertEqual(self.ids('70999999')[0], self.perez.id)
+        self.assertEqual(self.ids('luis'), [self.nunez.id, self.otro.id])
+        self.assertEqual(len(self.index.search('7', limit=1)), 1)
+
+    def test_writes_rebuild_in_background(self):
+        self.assertEqual(self.ids('marco'), [])
+        marco = Students.objects.create(name='Marco', document_id='555')
+
+        # La búsqueda siguiente aún usa el índice anterior y no espera la reconstrucción
+        self.assertEqual(self.ids('marco'), [])
+        self.index.snapshot.wait(5)
+        self.assertEqual(self.ids('marco'), [marco.id])
+
+        marco.delete()
+        self.ids('marco')
+        self.index.snapshot.wait(5)
+        self.assertEqual(self.ids('marco'), [])
+
+    def test_external_writes_are_picked_up_after_max_age(self):
+        self.ids('ana')
+        # update() no dispara señales, como una edición hecha fuera de Django
+        Students.objects.filter(pk=self.perez.pk).update(name='Anabel')
+        self.index.snapshot.wait(5)
+        self.assertEqual(self.index.search('anabel'), [])
+
+        self.index.snapshot.max_age = 0
+        self.ids('anabel')
+        self.index.snapshot.wait(5)
+        self.assertEqual(self.ids('anabel'), [self.perez.id])
+
+
+class ClassCatalogTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.ingles = Class.objects.create(name='Inglés', color='#FF5733')
+        self.arte = Class.objects.create(name='Arte')
+        user = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+    def test_warm_lookups_do_not_query(self):
+        CLASS_CATALOG.all()
+        with self.assertNumQueries(0):
+            self.assertEqual(CLASS_CATALOG.get(str(self.ingles.id)).name, 'Inglés')
+            self.assertEqual(set(CLASS_CATALOG.get_many([self.ingles.id, self.arte.id, 999])), {self.ingles.id, self.arte.id})
+            self.assertEqual([course.id for course in CLASS_CATALOG.all()], [self.ingles.id, self.arte.id])
+            self.assertEqual([row['name'] for row in CLASS_CATALOG.values([self.arte.id])], ['Arte'])
+
+    def test_returned_instances_are_independent(self):
+        course = CLASS_CATALOG.get(self.ingles.id)
+        course.name = 'Cambiado'
+        self.assertEqual(CLASS_CATALOG.get(self.ingles.id).name, 'Inglés')
+
+    def test_malformed_ids_do_not_exist(self):
+        for pk in ('abc', '1.5', None, '', [1]):
+            with self.subTest(pk=pk), self.assertRaises(Class.DoesNotExist):
+                CLASS_CATALOG.get(pk)
+        self.assertEqual(set(CLASS_CATALOG.get_many(['abc', None, str(self.arte.id)])), {self.arte.id})
+
+        response = self.client.get('/api/class/get_Courses_id/?course_id=abc')
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_invalidate(self):
+        CLASS_CATALOG.all()
+        self.client.post('/api/class/update_color/', {'class_id': self.ingles.id, 'color': '#000000'}, format='json')
+        self.assertEqual(CLASS_CATALOG.get(self.ingles.id).color, '#000000')
+
+        nuevo = Class.objects.create(name='Música')
+        self.assertEqual(CLASS_CATALOG.get(nuevo.id).name, 'Música')
+
+        self.arte.delete()
+        with self.assertRaises(Class.DoesNotExist):
+            CLASS_CATALOG.get(self.arte.id)
+
+    def test_external_writes_are_picked_up_after_max_age(self):
+        CLASS_CATALOG.all()
+        Class.objects.filter(pk=self.arte.pk).update(name='Artes')
+        self.assertEqual(CLASS_CATALOG.get(self.arte.id).name, 'Arte')
+
+        CLASS_CATALOG.snapshot.max_age = 0
+        try:
+            self.assertEqual(CLASS_CATALOG.get(self.arte.id).name, 'Artes')
+        finally:
+            CLASS_CATALOG.snapshot.max_age = CLASS_CATALOG.snapshot.MAX_AGE
+
+
+class ChangesSinceSyncTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+        self.ana = Students.objects.create(name='Ana', document_id='S1')
+        self.luis = Students.objects.create(name='Luis', document_id='S2')
+        self.jose = Students.objects.create(name='José', document_id='S3')
+        # Filas escritas antes de la sincronización anterior
+        anteayer = datetime.datetime.now() - datetime.timedelta(days=2)
+        Students.objects.update(created_at=anteayer, updated_at=anteayer)
+
+    def sync(self, url, token, **params):
+        response = self.client.get(url, {CHANGES_SINCE_PARAM: token, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response[SYNC_TOKEN_HEADER], response.json()['sync_token'])
+        return response.json()
+
+    def test_token_is_issued_before_the_read_minus_the_grace_window(self):
+        before = datetime.datetime.now()
+        response = self.client.get('/api/student/getStudents/')
+        after = datetime.datetime.now()
+
+        token = datetime.datetime.fromisoformat(response[SYNC_TOKEN_HEADER])
+        self.assertGreaterEqual(token, before - SYNC_GRACE)
+        self.assertLessEqual(token, after - SYNC_GRACE)
+
+    def test_created_updated_and_deleted_since_token(self):
+        token = self.client.get('/api/student/getStudents/')[SYNC_TOKEN_HEADER]
+
+        nuevo = Students.objects.create(name='Nuevo', document_id='S4')
+        self.luis.name = 'Luis Alberto'
+        self.luis.save()
+        jose_id = self.jose.id
+        self.jose.delete()
+
+        changes = self.sync('/api/student/getStudents/', token)
+        self.assertEqual({row['id'] for row in changes['updated']}, {nuevo.id, self.luis.id})
+        self.assertEqual(changes['deleted'], [jose_id])
+
+        # El token devuelto sirve para la siguiente sincronización: las filas viejas ya no vuelven
+        hace_un_minuto = datetime.datetime.now() - datetime.timedelta(minutes=1)
+        Students.objects.update(created_at=hace_un_minuto, updated_at=hace_un_minuto)
+        SyncTombstone.objects.update(deleted_at=hace_un_minuto)
+        changes = self.sync('/api/student/getStudents/', changes['sync_token'])
+        self.assertEqual((changes['updated'], changes['deleted']), ([], []))
+
+    def test_grace_window_repeats_rows_committed_just_before_the_token(self):
+        token = self.client.get('/api/student/getStudents/')[SYNC_TOKEN_HEADER]
+        issued = datetime.datetime.fromisoformat(token) + SYNC_GRACE
+
+        # Escrita por una transacción que seguía abierta durante la lectura anterior
+        Students.objects.filter(pk=self.ana.pk).update(updated_at=issued - SYNC_GRACE / 2)
+        SyncTombstone.objects.create(entity=SyncTombstone.STUDENTS, object_id=self.jose.pk)
+        SyncTombstone.objects.update(deleted_at=issued - SYNC_GRACE / 2)
+        # Más antigua que el margen: ya la vio la sincronización anterior
+        Students.objects.filter(pk=self.luis.pk).update(updated_at=issued - SYNC_GRACE * 2)
+
+        changes = self.sync('/api/student/getStudents/', token)
+        self.assertEqual([row['id'] for row in changes['updated']], [self.ana.id])
+        self.assertEqual(changes['deleted'], [self.jose.id])
+
+    def test_changes_since_accepts_dates_and_offsets(self):
+        ahora = datetime.datetime.now()
+        self.luis.save()
+        for value in [(ahora - datetime.timedelta(seconds=5)).isoformat(), ahora.date().isoformat()]:
+            with self.subTest(value=value):
+                self.assertEqual([row['id'] for row in self.sync('/api/student/getStudents/', value)['updated']], [self.luis.id])
+        aware = timezone.make_aware(ahora - datetime.timedelta(seconds=5), datetime.timezone.utc)
+        self.sync('/api/student/getStudents/', aware.isoformat())
+
+    def test_malformed_token_returns_400(self):
+        course = Class.objects.create(name='Inglés')
+        urls = [
+            ('/api/student/getStudents/', {}),
+            ('/api/parents/get/', {}),
+            ('/api/class/get_courses/', {'user_id': 1, 'role_id': 1}),
+            ('/api/student/get_sessions_class/', {'class_id': course.id}),
+        ]
+        for url, params in urls:
+            for value in ['ayer', '2025-13-01', '2025-03-01T25:00']:
+                with self.subTest(url=url, value=value):
+                    response = self.client.get(url, {CHANGES_SINCE_PARAM: value, **params})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn(CHANGES_SINCE_PARAM, response.json()['error'])
+
+    def test_deleted_ids_are_scoped(self):
+        ingles = Class.objects.create(name='Inglés')
+        arte = Class.objects.create(name='Arte')
+        token = next_sync_token()
+
+        sesiones = [Session.objects.create(id_class=course, num_session=1) for course in (ingles, arte)]
+        ingles_session_id = sesiones[0].pk
+        for session in sesiones:
+            session.delete()
+        changes = self.sync('/api/student/get_sessions_class/', token, class_id=ingles.id)
+        self.assertEqual(changes['deleted'], [ingles_session_id])
+
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1, user_id=self.user.id)
+        VolunteerClass.objects.create(id_class=ingles, id_volunteer=volunteer).delete()
+        VolunteerClass.objects.create(id_class=arte, id_volunteer=volunteer).delete()
+        # Arte se le vuelve a asignar: no debe aparecer como eliminada
+        VolunteerClass.objects.create(id_class=arte, id_volunteer=volunteer)
+        changes = self.sync('/api/class/get_courses/', token, user_id=self.user.id, role_id=2)
+        self.assertEqual(changes['deleted'], [ingles.id])
+        self.assertEqual(deleted_ids(SyncTombstone.VOLUNTEER_CLASSES, since=datetime.datetime.now() + SYNC_GRACE), [])
+
+
+class AttendanceTestCase(UnmanagedTablesTestCase):
+    """Clase con tres estudiantes inscritos y dos sesiones en días distintos, con asistencia en blanco y rollups al día"""
+
+    DAYS = [datetime.datetime(2025, 3, 3, 15, 0), datetime.datetime(2025, 3, 5, 15, 0)]
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='profe', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        self.course = Class.objects.create(name='Inglés')
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1)
+        self.students = [Students.objects.create(name=f'Estudiante {i}', document_id=f'S{i}') for i in range(3)]
+        # Existe pero no está en la clase: no tiene registros de asistencia
+        self.outsider = Students.objects.create(name='Otro', document_id='X1')
+
+        self.sessions = []
+        for num, day in enumerate(self.DAYS, start=1):
+            session = Session.objects.create(id_class=self.course, num_session=num, date=day)
+            for student in self.students:
+                AttendanceStudent.objects.create(
+                    id_session=session, id_student=student, id_volunteer=volunteer, attendance=''
+                )
+            self.sessions.append(session)
+        RollupAsistenciaService.reconstruir()
+
+    def attendance(self, session):
+        return dict(AttendanceStudent.objects.filter(id_session=session).values_list('id_student', 'attendance'))
+
+    def rollup(self, session):
+        return {
+            (row.id_student_id, row.attendance): row.total
+            for row in AsistenciaDiariaEstudiante.objects.filter(id_class=self.course, fecha=session.date.date())
+        }
+
+
+class UpdateAttendanceStatusesTest(AttendanceTestCase):
+    URL = '/api/student/update_statuses_students/'
+
+    def put(self, attendances, num_session=1):
+        return self.client.put(
+            self.URL, {'attendances': attendances, 'num_session': num_session, 'id_class': self.course.id}, format='json'
+        )
+
+    def test_mixed_found_and_unknown_students(self):
+        a, b, c = self.students
+        response = self.put([
+            {'id': a.id, 'attendance': 'PRESENT'},
+            {'id': str(b.id), 'attendance': 'ABSENT'},
+            {'id': self.outsider.id, 'attendance': 'PRESENT'},
+            {'id': 99999, 'attendance': 'TARDY'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [a.id, b.id])
+        self.assertEqual(response.data['not_found'], [self.outsider.id, 99999])
+        self.assertEqual(self.attendance(self.sessions[0]), {a.id: 'PRESENT', b.id: 'ABSENT', c.id: ''})
+        # La otra sesión de la clase no cambia
+        self.assertEqual(set(self.attendance(self.sessions[1]).values()), {''})
+
+    def test_duplicate_student_ids_keep_the_last_value(self):
+        a = self.students[0]
+        response = self.put([
+            {'id': a.id, 'attendance': 'PRESENT'},
+            {'id': a.id, 'attendance': 'TARDY'},
+            {'id': str(a.id), 'attendance': 'JUSTIFIED'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], [a.id])
+        self.assertEqual(response.data['not_found'], [])
+        self.assertEqual(self.attendance(self.sessions[0])[a.id], 'JUSTIFIED')
+
+    def test_invalid_input_changes_nothing(self):
+        a = self.students[0]
+        for attendances in (
+            [{'id': a.id, 'attendance': 'PRESENT'}, {'id': a.id, 'attendance': 'LATE'}],
+            [{'id': a.id, 'attendance': 'PRESENT'}, {'id': 'x', 'attendance': 'ABSENT'}],
+        ):
+            with self.subTest(attendances=attendances):
+                self.assertEqual(self.put(attendances).status_code, 400)
+                self.assertEqual(set(self.attendance(self.sessions[0]).values()), {''})
+
+    def test_unknown_session_reports_every_student_as_not_found(self):
+        a = self.students[0]
+        response = self.put([{'id': a.id, 'attendance': 'PRESENT'}], num_session=9)
+        self.assertEqual((response.data['updated'], response.data['not_found']), ([], [a.id]))
+
+    def test_refreshes_rollups_and_invalidates_metrics_after_commit(self):
+        a, b, c = self.students
+        version = MetricasCacheService.version()
+        class_version = MetricasCacheService.version(self.course.id)
+
+        self.put([{'id': a.id, 'attendance': 'PRESENT'}, {'id': b.id, 'attendance': 'PRESENT'}])
+
+        self.assertEqual(self.rollup(self.sessions[0]), {(a.id, 'PRESENT'): 1, (b.id, 'PRESENT'): 1, (c.id, ''): 1})
+        self.assertEqual(self.rollup(self.sessions[1]), {(a.id, ''): 1, (b.id, ''): 1, (c.id, ''): 1})
+        self.assertEqual(
+            SesionesDiariasClase.objects.get(id_class=self.course, fecha=self.DAYS[0].date()).total_registros, 3
+        )
+        self.assertGreater(MetricasCacheService.version(), version)
+        self.assertGreater(MetricasCacheService.version(self.course.id), class_version)
+
+
+class UpdateAttendanceStatusesBatchTest(AttendanceTestCase):
+    URL = '/api/student/update_statuses_students_batch/'
+
+    def put(self, sessions):
+        return self.client.put(self.URL, {'sessions': sessions}, format='json')
+
+    def entry(self, num_session, attendances):
+        return {'id_class': self.course.id, 'num_session': num_session, 'attendances': attendances}
+
+    def test_mixed_sessions_and_students(self):
+        a, b, c = self.students
+        response = self.put([
+            self.entry(1, [{'id': a.id, 'attendance': 'PRESENT'}, {'id': self.outsider.id, 'attendance': 'ABSENT'}]),
+            self.entry(2, [{'id': b.id, 'attendance': 'TARDY'}, {'id': c.id, 'attendance': 'ABSENT'}]),
+            self.entry(9, [{'id': a.id, 'attendance': 'PRESENT'}]),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'id_class': self.course.id, 'num_session': 1, 'status': 'UPDATED', 'updated': [a.id], 'not_found': [self.outsider.id]},
+            {'id_class': self.course.id, 'num_session': 2, 'status': 'UPDATED', 'updated': [b.id, c.id], 'not_found': []},
+            {'id_class': self.course.id, 'num_session': 9, 'status': 'SESSION_NOT_FOUND', 'updated': [], 'not_found': [a.id]},
+        ])
+        self.assertEqual(self.attendance(self.sessions[0]), {a.id: 'PRESENT', b.id: '', c.id: ''})
+        self.assertEqual(self.attendance(self.sessions[1]), {a.id: '', b.id: 'TARDY', c.id: 'ABSENT'})
+
+    def test_duplicates_keep_the_last_value(self):
+        a, b, _ = self.students
+        response = self.put([
+            self.entry(1, [{'id': a.id, 'attendance': 'PRESENT'}, {'id': a.id, 'attendance': 'ABSENT'}]),
+            # La misma sesión otra vez en el lote: gana la última entrada
+            self.entry(1, [{'id': str(a.id), 'attendance': 'JUSTIFIED'}, {'id': b.id, 'attendance': 'TARDY'}]),
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['updated'] for result in response.data['results']], [[a.id], [a.id, b.id]])
+        self.assertEqual(self.attendance(self.sessions[0])[a.id], 'JUSTIFIED')
+        self.assertEqual(self.attendance(self.sessions[0])[b.id], 'TARDY')
+
+    def test_session_limit(self):
+        a = self.students[0]
+        too_many = [self.entry(1, [{'id': a.id, 'attendance': 'PRESENT'}])] * (BATCH_MAX_SESSIONS + 1)
+        response = self.put(too_many)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.attendance(self.sessions[0])[a.id], '')
+
+        self.assertEqual(self.put(too_many[:BATCH_MAX_SESSIONS]).status_code, 200)
+        self.assertEqual(self.attendance(self.sessions[0])[a.id], 'PRESENT')
+
+    def test_invalid_entry_rejects_the_whole_batch(self):
+        a = self.students[0]
+        for bad in (
+            self.entry(2, [{'id': a.id, 'attendance': 'LATE'}]),
+            self.entry(2, [{'id': None, 'attendance': 'ABSENT'}]),
+            {'id_class': self.course.id, 'attendances': []},
+            {'id_class': self.course.id, 'num_session': 2},
+        ):
+            with self.subTest(bad=bad):
+                response = self.put([self.entry(1, [{'id': a.id, 'attendance': 'PRESENT'}]), bad])
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.attendance(self.sessions[0])[a.id], '')
+        self.assertEqual(self.put([]).status_code, 400)
+
+    def test_refreshes_rollups_and_invalidates_metrics_after_commit(self):
+        a, b, c = self.students
+        class_version = MetricasCacheService.version(self.course.id)
+
+        self.put([
+            self.entry(1, [{'id': a.id, 'attendance': 'PRESENT'}]),
+            self.entry(2, [{'id': c.id, 'attendance': 'ABSENT'}]),
+        ])
+
+        self.assertEqual(self.rollup(self.sessions[0]), {(a.id, 'PRESENT'): 1, (b.id, ''): 1, (c.id, ''): 1})
+        self.assertEqual(self.rollup(self.sessions[1]), {(a.id, ''): 1, (b.id, ''): 1, (c.id, 'ABSENT'): 1})
+        self.assertGreater(MetricasCacheService.version(self.course.id), class_version)
+
+
+class SessionRosterTest(AttendanceTestCase):
+    URL = '/api/student/getStudents_by_session_class/'
+
+    def get(self, session_class, class_id=None):
+        return self.client.get(self.URL, {'session_class': session_class, 'class_id': class_id or self.course.id})
+
+    def test_roster_payload_and_query_count(self):
+        session = self.sessions[1]
+        self.students[0].last_name = 'Pérez'
+        self.students[0].birthdate = datetime.date(2015, 4, 20)
+        self.students[0].save()
+        AttendanceStudent.objects.filter(id_session=session, id_student=self.students[1]).update(attendance='LATE')
+        # Un registro repetido del mismo estudiante no lo duplica en la lista: vale el primero
+        AttendanceStudent.objects.create(id_session=session, id_student=self.students[2],
+                                         id_volunteer=Volunteers.objects.get(), attendance='ONTIME')
+        self.assertEqual(self.get(session.id_session).status_code, 200)
+
+        # Con el token en caché: la sesión y la lista con sus estudiantes y el curso en un JOIN
+        with self.assertNumQueries(2):
+            response = self.get(session.id_session)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'students': [
+            {'id': self.students[0].id, 'nombre_completo': 'Estudiante 0 Pérez', 'curso': 'Inglés',
+             'sesion': 2, 'fecha_nacimiento': '2015-04-20', 'asistencia': ''},
+            {'id': self.students[1].id, 'nombre_completo': 'Estudiante 1 None', 'curso': 'Inglés',
+             'sesion': 2, 'fecha_nacimiento': None, 'asistencia': 'LATE'},
+            {'id': self.students[2].id, 'nombre_completo': 'Estudiante 2 None', 'curso': 'Inglés',
+             'sesion': 2, 'fecha_nacimiento': None, 'asistencia': ''},
+        ]})
+
+        # session_class también acepta el num_session de la clase
+        self.assertEqual(self.get(9999).status_code, 404)
+        by_number = self.get(2)
+        self.assertEqual(by_number.json(), response.json())
+
+    def test_missing_parameters_and_session(self):
+        self.assertEqual(self.client.get(self.URL, {'class_id': self.course.id}).status_code, 400)
+        self.assertEqual(self.client.get(self.URL, {'session_class': self.sessions[0].id_session}).status_code, 400)
+
+        response = self.get(self.sessions[0].id_session, class_id=self.course.id + 1)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Sesión no encontrada para esta clase.'})
+
+    def test_empty_session(self):
+        empty = Session.objects.create(id_class=self.course, num_session=3, date=datetime.datetime(2025, 3, 7, 15, 0))
+
+        response = self.get(empty.id_session)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'No se encontraron registros de asistencia para esta sesión y clase.'})
+
+    def test_attendance_of_deleted_students(self):
+        # Las tablas no administradas también se editan fuera de Django: la asistencia puede quedar sin su estudiante
+        session = self.sessions[0]
+        with connection.constraint_checks_disabled(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Students._meta.db_table} WHERE id IN (%s, %s)',
+                           [self.students[0].id, self.students[1].id])
+
+        response = self.get(session.id_session)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['students']], [self.students[2].id])
+
+        with connection.constraint_checks_disabled(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {Students._meta.db_table} WHERE id = %s', [self.students[2].id])
+        response = self.get(session.id_session)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'detail': 'Estudiantes no encontrados.'})
+
+
+class AuthorizationSnapshotTest(UnmanagedTablesTestCase):
+    URL = '/api/student/create_session/'
+
+    def setUp(self):
+        cache.clear()
+        self.profesor = AuthRole.objects.create(name=AuthorizationSnapshot.VOLUNTEER)
+        self.admin = AuthRole.objects.create(name=AuthorizationSnapshot.ADMIN)
+
+        self.user = User.objects.create_user(username='profe', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+        self.course = Class.objects.create(name='Inglés')
+        self.volunteer = Volunteers.objects.create(name='Profe', user_id=self.user.id, status=1)
+        student = Students.objects.create(name='Ana', document_id='S1')
+        StudentClass.objects.create(id_class=self.course, id_student=student)
+
+    def snapshot(self):
+        # Usuario nuevo en cada llamada: sin la instantánea memorizada de una petición anterior
+        return AuthorizationSnapshot.for_user(User.objects.get(pk=self.user.pk))
+
+    def cached(self):
+        return cache.get(AuthorizationSnapshot.cache_key(self.user.pk))
+
+    def create_session(self):
+        return self.client.post(self.URL, {'id_class': self.course.id}, format='json')
+
+    def test_roles_groups_and_permissions(self):
+        snapshot = self.snapshot()
+        self.assertEqual((snapshot.role_id, snapshot.is_admin, snapshot.is_volunteer), (None, False, False))
+
+        AuthUserRoles.objects.create(user_id=self.user.id, role=self.profesor)
+        AuthUserRoles.objects.create(user_id=self.user.id, role=self.admin)
+        group = Group.objects.create(name='Coordinación')
+        group.permissions.add(Permission.objects.get(codename='view_user'))
+        self.user.groups.add(group)
+
+        snapshot = self.snapshot()
+        # El rol del front end es el primero asignado
+        self.assertEqual((snapshot.role_id, snapshot.is_admin, snapshot.is_volunteer), (self.profesor.id, True, True))
+        self.assertEqual((snapshot.groups, snapshot.permissions), (('Coordinación',), frozenset({'auth.view_user'})))
+
+        # Memorizada en el usuario y guardada en la caché: las lecturas siguientes no consultan
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(AuthorizationSnapshot.for_user(user), AuthorizationSnapshot.for_user(user))
+
+    def test_create_session_allow_and_deny(self):
+        # Sin rol
+        self.assertEqual(self.create_session().status_code, 403)
+
+        # Profesor sin la clase asignada
+        AuthUserRoles.objects.create(user_id=self.user.id, role=self.profesor)
+        response = self.create_session()
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'error': 'No tienes permiso para crear sesiones en esta clase.'})
+
+        # Profesor asignado a la clase
+        VolunteerClass.objects.create(id_class=self.course, id_volunteer=self.volunteer)
+        self.assertEqual(self.create_session().status_code, 201)
+
+    def test_admin_creates_sessions_for_any_assigned_class(self):
+        AuthUserRoles.objects.create(user_id=self.user.id, role=self.admin)
+        # Sin voluntarios en la clase no hay a quién asignar la sesión
+        self.assertEqual(self.create_session().status_code, 404)
+
+        otro = Volunteers.objects.create(name='Otro', status=1)
+        VolunteerClass.objects.create(id_class=self.course, id_volunteer=otro)
+        self.assertEqual(self.create_session().status_code, 201)
+
+    def test_revoked_assignment_and_role_take_effect_immediately(self):
+        role = AuthUserRoles.objects.create(user_id=self.user.id, role=self.profesor)
+        assignment = VolunteerClass.objects.create(id_class=self.course, id_volunteer=self.volunteer)
+        self.assertEqual(self.create_session().status_code, 201)
+        self.assertTrue(self.cached().is_volunteer)
+
+        # La asignación a la clase se comprueba en cada petición, sin caché de por medio
+        assignment.delete()
+        self.assertEqual(self.create_session().status_code, 403)
+
+        VolunteerClass.objects.create(id_class=self.course, id_volunteer=self.volunteer)
+        self.assertEqual(self.create_session().status_code, 201)
+
+        # Quitar el rol descarta la instantánea cacheada: no hay que esperar a su TIMEOUT
+        role.delete()
+        self.assertIsNone(self.cached())
+        response = self.create_session()
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json(), {'error': 'No tienes permisos para realizar esta acción.'})
+
+        # Y asignar uno nuevo también
+        AuthUserRoles.objects.create(user_id=self.user.id, role=self.admin)
+        self.assertIsNone(self.cached())
+        self.assertEqual(self.create_session().status_code, 201)
+        self.assertTrue(self.cached().is_admin)
+
+    def test_group_and_user_changes_invalidate_the_snapshot(self):
+        self.snapshot()
+        group = Group.objects.create(name='Coordinación')
+        self.user.groups.add(group)
+        self.assertIsNone(self.cached())
+        self.assertEqual(self.snapshot().groups, ('Coordinación',))
+
+        # Cambio hecho desde el grupo
+        group.user_set.remove(self.user)
+        self.assertIsNone(self.cached())
+        self.assertEqual(self.snapshot().groups, ())
+
+        # is_superuser cambia los permisos efectivos
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertIsNone(self.cached())
+        self.assertIn('auth.view_user', self.snapshot().permissions)
@@ -0,0 +1,83 @@
+from rest_framework import serializers
+
+
+class ValuesSerializer:
+    """
+    Equivalente de solo lectura de un ModelSerializer para listados, sobre filas de `.values()`.
+
+    Produce la misma salida que `model_serializer` sin construir instancias del modelo
+    ni objetos de campo por fila: el queryset se reduce a las columnas de `values`,
+    los datos relacionados se cargan en `related()` con una consulta por relación y
+    cada fila se convierte en un diccionario en `to_representation()`. Tiene la misma
+    interfaz `Serializer(queryset, many=True).data`, así que se puede pasar a
+    `paginated_response`.
+
+    Cada campo de salida es la columna del mismo nombre, con el formato del campo del
+    model_serializer. Para los campos calculados la subclase define
+    `get_<campo>(row, related)`, como un SerializerMethodField.
+
+    `fields` limita la salida a un subconjunto de los campos del model_serializer; las
+    subclases consultan `wants()` para no leer las columnas ni hacer las consultas del resto.
+    """
+
+    model_serializer = None
+    values = ()
+
+    _converters = None
+
+    def __init__(self, instance, many=False, fields=None):
+        self.instance = instance
+        self.many = many
+        self.fields = fields
+
+    @classmethod
+    def field_names(cls):
+        """Campos de salida, en el orden del model_serializer."""
+        return list(cls.model_serializer.Meta.fields)
+
+    @classmethod
+    def queryset(cls, queryset, fields=None):
+        """Reduce un queryset del modelo a las columnas que lee este serializador."""
+        return queryset.values(*cls.values)
+
+    def wants(self, name):
+        return self.fields is None or name in self.fields
+
+    @classmethod
+    def converters(cls):
+        """
+        to_representation de los campos del model_serializer cuyo JSON no es el valor de la
+        columna tal cual (fechas, horas, decimales); las demás columnas se devuelven sin cambios.
+        """
+        if cls._converters is None:
+            passthrough = (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                           serializers.RelatedField, serializers.SerializerMethodField)
+            cls._converters = {
+                name: field.to_representation
+                for name, field in cls.model_serializer().fields.items()
+                if not isinstance(field, passthrough)
+            }
+        return cls._converters
+
+    def represent(self, name, value):
+        """El valor de una columna con el formato que le daría el model_serializer."""
+        converter = self.converters().get(name)
+        return converter(value) if value is not None and converter else value
+
+    def related(self, rows):
+        """Carga lo que necesitan las filas además de sus columnas. Devuelve un objeto de contexto."""
+        return None
+
+    def to_representation(self, row, related):
+        data = {}
+        for name in self.field_names() if self.fields is None else self.fields:
+            method = getattr(self, f'get_{name}', None)
+            data[name] = method(row, related) if method else self.represent(name, row[name])
+        return data
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        related = self.related(rows)
+        data = [self.to_representation(row, related) for row in rows]
+        return data if self.many else data[0]
@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedSnapshot:
+    """
+    Copia en memoria del proceso de datos leídos de la base de datos.
+
+    La copia vale mientras no cambie su versión en la caché de Django y como máximo
+    `max_age` segundos, porque las tablas no administradas también se editan fuera de
+    Django y esas escrituras no avisan. Las escrituras hechas desde Django llaman a
+    `invalidate()` (normalmente desde api/signals.py) y cada proceso reconstruye su
+    copia con `build()` en la siguiente lectura.
+
+    Con `background=True` esa lectura sigue devolviendo la copia anterior mientras un
+    hilo la reconstruye, así que ninguna petición paga la reconstrucción salvo la
+    primera del proceso.
+    """
+
+    MAX_AGE = 300
+
+    def __init__(self, name, build, background=False, max_age=MAX_AGE):
+        self.version_key = f'{name}:version'
+        self.build = build
+        self.background = background
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._worker = None
+        # (versión, instante de carga, datos): se reemplaza entero para que un lector nunca mezcle dos cargas
+        self._state = (None, 0.0, None)
+
+    def version(self):
+        """
+        Versión vigente, con una sola lectura de la caché si la clave existe. Se inicializa
+        con la hora actual para no repetir versiones anteriores si la caché pierde la clave.
+        """
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, int(time.time() * 1000), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            # La clave no existe todavía: cualquier valor nuevo deja vencidas las copias cargadas
+            cache.add(self.version_key, int(time.time() * 1000), None)
+
+    def _fresh(self, state, version):
+        return state[0] == version and time.monotonic() - state[1] <= self.max_age
+
+    def get(self):
+        """Los datos vigentes (o, en segundo plano, los anteriores mientras se reconstruyen)."""
+        started = time.monotonic()
+        version = self.version()
+        state = self._state
+        if self._fresh(state, version):
+            return state[2]
+
+        if self.background and state[2] is not None:
+            self._rebuild_in_background()
+            return state[2]
+
+        with self._lock:
+            state = self._state
+            # Si otro hilo la cargó mientras esperábamos el lock, esa copia ya es posterior a esta lectura
+            if state[1] < started:
+                state = self._load(version)
+            return state[2]
+
+    def _load(self, version):
+        # La versión se lee antes de construir: una escritura durante la construcción deja la copia ya vencida
+        data = self.build()
+        self._state = (version, time.monotonic(), data)
+        return self._state
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._rebuild, daemon=True)
+            self._worker.start()
+
+    def _rebuild(self):
+        try:
+            self._load(self.version())
+        except Exception:
+            logger.exception("Error al reconstruir %s", self.version_key)
+        finally:
+            # El hilo abrió su propia conexión
+            connection.close()
+
+    def wait(self, timeout=None):
+        """Espera a que termine la reconstrucción en segundo plano en curso, si la hay."""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
@@ -1,19 +1,34 @@
+import logging
+
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
-from .serializers import SessionSerializer,UserDataSerializer,UserSerializer, GetCourses ,CourseSerializer  ,GetStudentsClass
+from .serializers import SessionSerializer,UserDataSerializer,UserSerializer, GetCourses, GetCoursesValues ,CourseSerializer  ,GetStudentsClass
 from django.contrib.auth.models import User
 from rest_framework.authtoken.models import Token
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.authentication import TokenAuthentication
+from .authentication import CachedTokenAuthentication
+from .authorization import AuthorizationSnapshot
 from rest_framework.decorators import action
 from django.utils import timezone
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import  Class ,Volunteers ,VolunteerClass ,Students , AttendanceStudent, Session , AuthUserRoles, AuthUser
+from .models import  Class ,Volunteers ,VolunteerClass ,Students , AttendanceStudent, Session , AuthUser, StudentClass, ClassSessionCounter, SyncTombstone
 from django.core.mail import send_mail
 from django.db import transaction, connection
+from django.db.models import Case, CharField, Count, Max, Q, Value, When
+from metricas.services.rollup_service import RollupAsistenciaService
+from metricas.services.cache_service import MetricasCacheService
+from .pagination import PAGINATION_PARAMETERS, paginated_response
+from .conditional import conditional_response
+from .catalog import CLASS_CATALOG
+from .sync import (
+    SYNC_PARAMETERS, SYNC_TOKEN_HEADER, changes_response, deleted_ids,
+    invalid_changes_since_response, next_sync_token, parse_changes_since,
+)
+
+logger = logging.getLogger(__name__)
 
 
 # Esquemas reutilizables para Swagger
@@ -39,9 +54,15 @@ COMMON_RESPONSES = {
     500: "Error del servidor"
 }
 
+# Valores de asistencia aceptados por los endpoints de escritura
+ATTENDANCE_VALUES = ['PRESENT', 'TARDY', 'ABSENT', 'JUSTIFIED', '']
+
+# Máximo de sesiones aceptadas en una sincronización por lote
+BATCH_MAX_SESSIONS = 200
+
 class UserViewSet(ViewSet):
     
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = []
     
     @swagger_auto_schema(
@@ -170,7 +191,7 @@ class UserViewSet(ViewSet):
                    
 class ClassViewSset(ViewSet):
     
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     
     @swagger_auto_schema(
@@ -178,7 +199,7 @@ class ClassViewSset(ViewSet):
         manual_parameters=[
             openapi.Parameter('user_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True),
             openapi.Parameter('role_id', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True)
-        ],
+        ] + SYNC_PARAMETERS,
         responses={200: GetCourses(many=True), 400: COMMON_RESPONSES[400], 500: COMMON_RESPONSES[500]},
         tags=["📚 Cursos"]
     )
@@ -191,6 +212,13 @@ class ClassViewSset(ViewSet):
         if user_id is None or role_id is None:
             return Response({"detail": "user_id and role_id are required."}, status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            since = parse_changes_since(request)
+        except ValueError as e:
+            return invalid_changes_since_response(e)
+        sync_token = next_sync_token()
+        volunteer = None
+
         try:
             # Verificar si el usuario tiene el rol de coordinador (suponiendo que 1 es el ID del coordinador)
             is_coordinator = (role_id == "1")
@@ -216,8 +244,40 @@ class ClassViewSset(ViewSet):
             # Manejar cualquier otra excepción
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        course_serializer = GetCourses(courses, many=True)
-        return Response(course_serializer.data, status=status.HTTP_200_OK)
+        if since is not None:
+            changed = courses.filter(Q(updated_at__gte=since) | Q(created_at__gte=since))
+            deleted = deleted_ids(SyncTombstone.CLASSES, since)
+            if volunteer is not None:
+                # Clases que se le quitaron al voluntario y no se le volvieron a asignar
+                unassigned = set(deleted_ids(SyncTombstone.VOLUNTEER_CLASSES, since, scope_id=volunteer.id))
+                unassigned -= set(courses.filter(id__in=unassigned).values_list('id', flat=True))
+                deleted = sorted(set(deleted) | unassigned)
+            return changes_response(sync_token, GetCoursesValues(GetCoursesValues.queryset(changed), many=True).data, deleted)
+
+        # Los cursos salen del catálogo en memoria: un 304 al coordinador no consulta la tabla class
+        if is_coordinator:
+            rows = CLASS_CATALOG.values()
+        elif volunteer is not None:
+            rows = CLASS_CATALOG.values(
+                VolunteerClass.objects.filter(id_volunteer=volunteer.id).values_list('id_class', flat=True)
+            )
+        else:
+            rows = []
+
+        def build():
+            course_serializer = GetCoursesValues(rows, many=True)
+            response = Response(course_serializer.data, status=status.HTTP_200_OK)
+            response[SYNC_TOKEN_HEADER] = sync_token
+            return response
+
+        version = {
+            "total": len(rows),
+            "last_id": max((row['id'] for row in rows), default=None),
+            "updated": max((row['updated_at'] for row in rows if row['updated_at']), default=None),
+            "created": max((row['created_at'] for row in rows if row['created_at']), default=None),
+        }
+        # Sin Last-Modified: quitar un curso cambia el total pero no el máximo de updated_at
+        return conditional_response(request, version, build)
 
     @swagger_auto_schema(
         operation_summary="Obtener curso por ID",
@@ -233,9 +293,17 @@ class ClassViewSset(ViewSet):
         if not course_id:
             return Response({"detail": "El ID del curso es requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
-        course = get_object_or_404(Class.objects, id=course_id)
-        serializer = CourseSerializer(course)
-        return Response(serializer.data, status=status.HTTP_200_OK) 
+        try:
+            course = CLASS_CATALOG.get(course_id)
+        except Class.DoesNotExist:
+            return Response({"detail": "No Class matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+        # update_color y la asignación de voluntarios marcan updated_at en cada escritura del curso
+        version = {"id": course.id, "updated": course.updated_at, "created": course.created_at}
+        return conditional_response(
+            request, version,
+            lambda: Response(CourseSerializer(course).data, status=status.HTTP_200_OK),
+            last_modified=course.updated_at or course.created_at,
+        )
     
     
     @swagger_auto_schema(
@@ -265,6 +333,7 @@ class ClassViewSset(ViewSet):
             
             # Actualizar el color de la clase
             class_obj.color = color
+            class_obj.updated_at = timezone.now()
             class_obj.save()
 
             return Response({"detail": "Color updated successfully."}, status=status.HTTP_200_OK)
@@ -276,13 +345,14 @@ class ClassViewSset(ViewSet):
         
 class StudentsViewset(ViewSet): 
     
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     @swagger_auto_schema(
         operation_summary="Obtener todos los estudiantes",
         operation_description="Obtener lista completa de estudiantes registrados",
         security=[{'Token': []}],
+        manual_parameters=PAGINATION_PARAMETERS + SYNC_PARAMETERS,
         responses={
             200: openapi.Response(
                 description='Lista de estudiantes obtenida exitosamente',
@@ -295,9 +365,24 @@ class StudentsViewset(ViewSet):
     )
     @action(detail=False, methods=['GET'], url_path='getStudents')
     def get_students(self, request):
+        try:
+            since = parse_changes_since(request)
+        except ValueError as e:
+            return invalid_changes_since_response(e)
+        sync_token = next_sync_token()
+
         course = Students.objects.all()
-        serializer = GetStudentsClass(course,many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if since is not None:
+            changed = course.filter(Q(updated_at__gte=since) | Q(created_at__gte=since))
+            return changes_response(
+                sync_token,
+                GetStudentsClass(changed, many=True).data,
+                deleted_ids(SyncTombstone.STUDENTS, since)
+            )
+
+        response = paginated_response(request, course, GetStudentsClass, view=self)
+        response[SYNC_TOKEN_HEADER] = sync_token
+        return response
 
     @swagger_auto_schema(
         operation_summary="Obtener estudiantes por clase",
@@ -337,12 +422,18 @@ class StudentsViewset(ViewSet):
                 studentclass__id_class=class_id
             )
 
-            if not resultados.exists():
+            # Inscripciones y última modificación de los estudiantes en una sola consulta
+            version = StudentClass.objects.filter(id_class=class_id).aggregate(
+                total=Count('id'), last_id=Max('id'), updated=Max('id_student__updated_at'),
+            )
+            if not version['total']:
                 return Response({"detail": "Estudiantes no encontrados."}, status=status.HTTP_404_NOT_FOUND)
 
-            # Serializar los resultados
-            serializer = GetStudentsClass(resultados, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # Serializar los resultados (sin Last-Modified: sacar a un estudiante de la clase no cambia updated_at)
+            return conditional_response(
+                request, version,
+                lambda: Response(GetStudentsClass(resultados, many=True).data, status=status.HTTP_200_OK)
+            )
         
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -394,6 +485,8 @@ class StudentsViewset(ViewSet):
                 examples={
                     "application/json": {
                         "message": "Attendance statuses updated successfully.",
+                        "updated": [127, 128],
+                        "not_found": [131]
                     }
                 }
             ),
@@ -418,11 +511,10 @@ class StudentsViewset(ViewSet):
             return Response({'error': 'Invalid data format. Expected a list of attendances.'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Validar los valores de asistencia
-        valid_attendance_values = ['PRESENT', 'TARDY', 'ABSENT', 'JUSTIFIED', '']
         for item in attendances_data:
-            if 'attendance' not in item or item['attendance'] not in valid_attendance_values:
+            if 'attendance' not in item or item['attendance'] not in ATTENDANCE_VALUES:
                 return Response(
-                    {'error': f'Valor de asistencia no válido. Valores permitidos: {", ".join(valid_attendance_values)}'},
+                    {'error': f'Valor de asistencia no válido. Valores permitidos: {", ".join(ATTENDANCE_VALUES)}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
@@ -432,27 +524,51 @@ class StudentsViewset(ViewSet):
         if not session_number or not class_id:
             return Response({'error': 'Session number and class ID are required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        updated_attendances = []
-
+        # Último valor recibido por estudiante
+        requested = {}
         for item in attendances_data:
-            # Filtrar por el número de sesión (num_session) y la clase (id_class)
-            attendances = AttendanceStudent.objects.filter(
-                id_student=item['id'],
-                id_session__num_session=session_number,  # Usar la relación con la tabla Session
-                id_session__id_class=class_id  # Asegurarse de que la sesión pertenece a la clase correcta
-            )
-            
-            if attendances.exists():
-                for attendance in attendances:
-                    attendance.attendance = item['attendance']
-                    updated_attendances.append(attendance)
+            try:
+                requested[int(item.get('id'))] = item['attendance']
+            except (TypeError, ValueError):
+                return Response({'error': f"Invalid student ID: {item.get('id')}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if updated_attendances:
-            # Actualizar los registros modificados
-            AttendanceStudent.objects.bulk_update(updated_attendances, ['attendance'])
+        # Resolver las sesiones una sola vez y cargar todos los registros afectados en una consulta
+        session_ids = list(
+            Session.objects.filter(num_session=session_number, id_class=class_id).values_list('id_session', flat=True)
+        )
+        found_students = set(
+            AttendanceStudent.objects.filter(
+                id_session__in=session_ids,
+                id_student__in=requested.keys()
+            ).values_list('id_student', flat=True)
+        )
+
+        updated = sorted(found_students)
+        not_found = sorted(set(requested) - found_students)
+
+        if updated:
+            # Agrupar estudiantes por valor de asistencia y escribir todo en un solo UPDATE ... CASE
+            students_by_value = {}
+            for student_id in updated:
+                students_by_value.setdefault(requested[student_id], []).append(student_id)
+
+            with transaction.atomic():
+                AttendanceStudent.objects.filter(
+                    id_session__in=session_ids,
+                    id_student__in=updated
+                ).update(attendance=Case(
+                    *[When(id_student__in=student_ids, then=Value(value))
+                      for value, student_ids in students_by_value.items()],
+                    output_field=CharField()
+                ))
+                # Refrescar los rollups de métricas de esas sesiones
+                RollupAsistenciaService.refrescar_sesiones(Session.objects.filter(id_session__in=session_ids))
+                transaction.on_commit(lambda: MetricasCacheService.invalidar(class_id))
 
         return Response({
             'message': 'Attendance statuses updated successfully.',
+            'updated': updated,
+            'not_found': not_found,
             'attendance_legend': {
                 'PRESENT': 'Presente',
                 'TARDY': 'Tardanza',
@@ -462,6 +578,158 @@ class StudentsViewset(ViewSet):
             }
         }, status=status.HTTP_200_OK)
     
+    @swagger_auto_schema(
+        operation_summary="Actualizar asistencia de varias sesiones en lote",
+        operation_description="Sincronizar en una sola petición la asistencia registrada sin conexión para varias sesiones. "
+                              "Todos los cambios se aplican en una única transacción y se devuelve el resultado por sesión.",
+        security=[{'Token': []}],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['sessions'],
+            properties={
+                'sessions': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    description=f"Lista de sesiones (máximo {BATCH_MAX_SESSIONS})",
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=['id_class', 'num_session', 'attendances'],
+                        properties={
+                            'id_class': openapi.Schema(type=openapi.TYPE_INTEGER, example=1),
+                            'num_session': openapi.Schema(type=openapi.TYPE_INTEGER, example=2),
+                            'attendances': openapi.Schema(
+                                type=openapi.TYPE_ARRAY,
+                                items=openapi.Schema(
+                                    type=openapi.TYPE_OBJECT,
+                                    required=['id', 'attendance'],
+                                    properties={
+                                        'id': openapi.Schema(type=openapi.TYPE_INTEGER, example=127),
+                                        'attendance': openapi.Schema(
+                                            type=openapi.TYPE_STRING,
+                                            enum=ATTENDANCE_VALUES,
+                                            example="PRESENT"
+                                        ),
+                                    },
+                                )
+                            ),
+                        },
+                    )
+                ),
+            },
+        ),
+        responses={
+            200: openapi.Response(
+                description='Lote procesado',
+                examples={
+                    "application/json": {
+                        "message": "Attendance batch processed.",
+                        "results": [
+                            {"id_class": 1, "num_session": 2, "status": "UPDATED", "updated": [127, 128], "not_found": []},
+                            {"id_class": 1, "num_session": 9, "status": "SESSION_NOT_FOUND", "updated": [], "not_found": [127]}
+                        ]
+                    }
+                }
+            ),
+            400: openapi.Response(
+                description='Datos de entrada inválidos (no se aplica ningún cambio)',
+                examples={
+                    "application/json": {
+                        "error": "sessions[0].attendances[3]: valor de asistencia no válido."
+                    }
+                }
+            ),
+            401: COMMON_RESPONSES[401],
+            403: COMMON_RESPONSES[403]
+        },
+        tags=["👥 Estudiantes"]
+    )
+    @action(detail=False, methods=['PUT'], url_path='update_statuses_students_batch')
+    def update_attendance_statuses_batch(self, request):
+        sessions_data = request.data.get('sessions')
+
+        if not isinstance(sessions_data, list) or not sessions_data:
+            return Response({'error': 'Invalid data format. Expected a non-empty list of sessions.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(sessions_data) > BATCH_MAX_SESSIONS:
+            return Response({'error': f'Se permiten como máximo {BATCH_MAX_SESSIONS} sesiones por lote.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Validar todo el lote antes de escribir: un error en cualquier sesión rechaza la petición completa
+        entries = []
+        for i, item in enumerate(sessions_data):
+            if not isinstance(item, dict) or not isinstance(item.get('attendances'), list):
+                return Response({'error': f'sessions[{i}]: se esperaba un objeto con la lista attendances.'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                key = (int(item.get('id_class')), int(item.get('num_session')))
+            except (TypeError, ValueError):
+                return Response({'error': f'sessions[{i}]: id_class y num_session son obligatorios.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            requested = {}
+            for j, attendance in enumerate(item['attendances']):
+                if not isinstance(attendance, dict) or attendance.get('attendance') not in ATTENDANCE_VALUES:
+                    return Response({'error': f'sessions[{i}].attendances[{j}]: valor de asistencia no válido.'}, status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    requested[int(attendance.get('id'))] = attendance['attendance']
+                except (TypeError, ValueError):
+                    return Response({'error': f"sessions[{i}].attendances[{j}]: Invalid student ID: {attendance.get('id')}"}, status=status.HTTP_400_BAD_REQUEST)
+            entries.append((key, requested))
+
+        # Resolver todas las sesiones del lote en una consulta
+        class_ids = {key[0] for key, _ in entries}
+        session_ids_by_key = {}
+        for session_id, class_id, num_session in Session.objects.filter(
+            id_class__in=class_ids,
+            num_session__in={key[1] for key, _ in entries}
+        ).values_list('id_session', 'id_class', 'num_session'):
+            session_ids_by_key.setdefault((class_id, num_session), []).append(session_id)
+
+        # Cargar todos los registros de asistencia afectados en otra consulta
+        student_ids = set().union(*(requested.keys() for _, requested in entries))
+        rows_by_session = {}
+        for row_id, session_id, student_id in AttendanceStudent.objects.filter(
+            id_session__in=[sid for ids in session_ids_by_key.values() for sid in ids],
+            id_student__in=student_ids
+        ).values_list('id', 'id_session', 'id_student'):
+            rows_by_session.setdefault(session_id, {}).setdefault(student_id, []).append(row_id)
+
+        # Valor final por registro (si una sesión se repite en el lote, gana la última entrada)
+        final_values = {}
+        results = []
+        for (class_id, num_session), requested in entries:
+            session_ids = session_ids_by_key.get((class_id, num_session), [])
+            found = set()
+            for session_id in session_ids:
+                for student_id, row_ids in rows_by_session.get(session_id, {}).items():
+                    if student_id in requested:
+                        found.add(student_id)
+                        for row_id in row_ids:
+                            final_values[row_id] = requested[student_id]
+            results.append({
+                'id_class': class_id,
+                'num_session': num_session,
+                'status': 'UPDATED' if session_ids else 'SESSION_NOT_FOUND',
+                'updated': sorted(found),
+                'not_found': sorted(set(requested) - found),
+            })
+
+        if final_values:
+            rows_by_value = {}
+            for row_id, value in final_values.items():
+                rows_by_value.setdefault(value, []).append(row_id)
+
+            # Un solo UPDATE ... CASE para todo el lote, más el refresco de rollups, en la misma transacción
+            with transaction.atomic():
+                AttendanceStudent.objects.filter(id__in=final_values.keys()).update(attendance=Case(
+                    *[When(id__in=row_ids, then=Value(value)) for value, row_ids in rows_by_value.items()],
+                    output_field=CharField()
+                ))
+                RollupAsistenciaService.refrescar_sesiones(Session.objects.filter(
+                    id_session__in=[sid for ids in session_ids_by_key.values() for sid in ids]
+                ))
+                transaction.on_commit(lambda: MetricasCacheService.invalidar(*class_ids))
+
+        return Response({
+            'message': 'Attendance batch processed.',
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(
         operation_summary="Crear nueva sesión",
         operation_description="Crear una nueva sesión para una clase. Los estudiantes se registran automáticamente con asistencia en blanco.",
@@ -516,17 +784,17 @@ class StudentsViewset(ViewSet):
 
             # 2) Traduzco ese User de Django a mi modelo AuthUser (la tabla real auth_user)
             try:
-                auth_user = AuthUser.objects.get(username=django_user.username)
+                auth_user = AuthUser.objects.get(pk=django_user.pk)
             except AuthUser.DoesNotExist:
                 return Response(
                     {"error": "No se encontró el AuthUser correspondiente a este usuario."},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # 3) Ahora consulto roles usando AuthUserRoles; esto funciona porque AuthUserRoles.user apunta al modelo User de Django
-            user_roles = AuthUserRoles.objects.filter(user=django_user).select_related('role')
-            is_volunteer = user_roles.filter(role__name='Volunteers_Profesor').exists()
-            is_admin     = user_roles.filter(role__name='admin').exists()
+            # 3) Roles del usuario desde la instantánea de autorización (sin consultas si ya está en caché)
+            authorization = AuthorizationSnapshot.for_user(django_user)
+            is_volunteer = authorization.is_volunteer
+            is_admin     = authorization.is_admin
 
             if not (is_volunteer or is_admin):
                 return Response(
@@ -544,7 +812,7 @@ class StudentsViewset(ViewSet):
 
             # 5) Obtener la clase; si no existe, 404
             try:
-                course_class = Class.objects.get(id=class_id)
+                course_class = CLASS_CATALOG.get(class_id)
             except Class.DoesNotExist:
                 return Response({'error': 'Clase no encontrada.'}, status=status.HTTP_404_NOT_FOUND)
 
@@ -582,37 +850,30 @@ class StudentsViewset(ViewSet):
                     )
                 volunteer = vc.id_volunteer
 
-            # 8) Calcular el próximo num_session usando SQL RAW para evitar que ORM lo traduzca mal
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT MAX(num_session) FROM sessions WHERE id_class = %s",
-                    [course_class.id]
-                )
-                result = cursor.fetchone()[0]
-                num_session = (result + 1) if result else 1
-
-            # 9) Crear la sesión y los registros de asistencia dentro de una transacción atómica
+            # 8) Crear la sesión y los registros de asistencia dentro de una transacción atómica
             with transaction.atomic():
+                # Reservar el próximo num_session con el contador de la clase (primera sentencia de la transacción)
+                num_session = ClassSessionCounter.next_num_session(course_class.id)
+
                 session = Session.objects.create(
                     id_class=course_class,
                     num_session=num_session,
                     date=timezone.now(),
                 )
 
-                students = Students.objects.filter(studentclass__id_class=course_class.id)
-                attendance_records = []
-                for student in students:
-                    attendance_records.append(
-                        AttendanceStudent(
-                            id_student=student,
-                            id_volunteer=volunteer,
-                            id_session=session,
-                            created_date=timezone.now(),
-                            attendance=""  
-                        )
+                # Asistencia en blanco para todos los estudiantes de la clase con un solo INSERT ... SELECT
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"INSERT INTO {AttendanceStudent._meta.db_table} "
+                        "(id_student, id_volunteer, id_session, created_date, attendance) "
+                        f"SELECT DISTINCT id_student, %s, %s, %s, '' FROM {StudentClass._meta.db_table} "
+                        "WHERE id_class = %s",
+                        [volunteer.id, session.id_session,
+                         connection.ops.adapt_datetimefield_value(timezone.now()), course_class.id]
                     )
-                if attendance_records:
-                    AttendanceStudent.objects.bulk_create(attendance_records)
+
+                RollupAsistenciaService.refrescar_sesiones([session])
+                transaction.on_commit(lambda: MetricasCacheService.invalidar(course_class.id))
 
                 serializer = SessionSerializer(session)
                 return Response({
@@ -623,7 +884,7 @@ class StudentsViewset(ViewSet):
 
         except Exception as e:
             # Si ocurre algún error inesperado, devuelvo 400 con el mensaje
-            print(f"Error en create_session: {str(e)}")
+            logger.exception("Error en create_session")
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     @swagger_auto_schema(
@@ -695,38 +956,25 @@ class StudentsViewset(ViewSet):
             except Session.DoesNotExist:
                 return Response({"detail": "Sesión no encontrada para esta clase."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Obtener los registros de asistencia filtrados por la sesión
+        # Registros de asistencia de la sesión junto con su estudiante y curso, en una sola consulta
         attendance_records = AttendanceStudent.objects.filter(
             id_session=session.id_session
-        )
+        ).select_related('id_student', 'id_session__id_class').order_by('id_student', 'id')
 
-        if not attendance_records.exists():
+        if not attendance_records:
+            # El JOIN descarta la asistencia de estudiantes que ya no existen: se distingue ese caso como antes
+            if AttendanceStudent.objects.filter(id_session=session.id_session).exists():
+                return Response({"detail": "Estudiantes no encontrados."}, status=status.HTTP_404_NOT_FOUND)
             return Response({"detail": "No se encontraron registros de asistencia para esta sesión y clase."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Obtener los IDs de los estudiantes asociados a esos registros de asistencia
-        student_ids = attendance_records.values_list('id_student', flat=True)
-
-        # Consultar los estudiantes en la tabla Students usando los IDs
-        students = Students.objects.filter(id__in=student_ids)
-
-        if not students.exists():
-            return Response({"detail": "Estudiantes no encontrados."}, status=status.HTTP_404_NOT_FOUND)
-
-        # Obtener la información del curso
-        course = Class.objects.get(id=class_id)
-
-        # Crear la lista de estudiantes con los campos específicos
+        # Crear la lista de estudiantes con los campos específicos (un registro por estudiante)
         student_list = []
-        for student in students:
-            # Buscar el registro de asistencia para este estudiante
-            try:
-                attendance_record = AttendanceStudent.objects.get(
-                    id_student=student.id,
-                    id_session=session.id_session
-                )
-                attendance_value = attendance_record.attendance
-            except AttendanceStudent.DoesNotExist:
-                attendance_value = ""
+        seen_students = set()
+        for attendance_record in attendance_records:
+            student = attendance_record.id_student
+            if student.id in seen_students:
+                continue
+            seen_students.add(student.id)
 
             # Crear nombre completo
             nombre_completo = f"{student.name} {student.last_name}"
@@ -734,10 +982,10 @@ class StudentsViewset(ViewSet):
             student_list.append({
                 "id": student.id,
                 "nombre_completo": nombre_completo,
-                "curso": course.name,
+                "curso": attendance_record.id_session.id_class.name,
                 "sesion": session.num_session,
                 "fecha_nacimiento": student.birthdate,
-                "asistencia": attendance_value
+                "asistencia": attendance_record.attendance
             })
 
         # Respuesta con la información requerida
@@ -760,7 +1008,7 @@ class StudentsViewset(ViewSet):
                 required=True,
                 example=1
             )
-        ],
+        ] + SYNC_PARAMETERS,
         responses={
             200: openapi.Response(
                 description="Lista de sesiones obtenida exitosamente",
@@ -801,32 +1049,55 @@ class StudentsViewset(ViewSet):
             if not class_id:
                 return Response({"detail": "El ID de la clase es requerido."}, status=status.HTTP_400_BAD_REQUEST)
 
+            try:
+                since = parse_changes_since(request)
+            except ValueError as e:
+                return invalid_changes_since_response(e)
+            sync_token = next_sync_token()
+
             # CORREGIDO: Usar el nombre correcto del campo
             sessions = Session.objects.filter(id_class=class_id).values('id_session', 'num_session', 'date')
 
-            if not sessions:
+            def session_list():
+                # Convertir el QuerySet a una lista de diccionarios con la estructura deseada
+                return [
+                    {
+                        "id_session": session['id_session'],
+                        "num_session": session['num_session'],
+                        "date": session['date'].strftime('%Y-%m-%d') if session['date'] else None
+                    }
+                    for session in sessions
+                ]
+
+            if since is not None:
+                # Las sesiones no se editan: basta con las creadas desde la última sincronización
+                sessions = sessions.filter(date__gte=since)
+                return changes_response(
+                    sync_token, session_list(), deleted_ids(SyncTombstone.SESSIONS, since, scope_id=class_id)
+                )
+
+            version = Session.objects.filter(id_class=class_id).aggregate(
+                total=Count('id_session'), last_id=Max('id_session'), last_date=Max('date'),
+            )
+            if not version['total']:
                 return Response({"detail": "No se encontraron sesiones para la clase especificada."}, status=status.HTTP_404_NOT_FOUND)
 
-            # Convertir el QuerySet a una lista de diccionarios con la estructura deseada
-            session_list = [
-                {
-                    "id_session": session['id_session'],
-                    "num_session": session['num_session'],
-                    "date": session['date'].strftime('%Y-%m-%d') if session['date'] else None
-                }
-                for session in sessions
-            ]
+            def build():
+                response = Response({
+                    "sessions": session_list()
+                }, status=status.HTTP_200_OK)
+                response[SYNC_TOKEN_HEADER] = sync_token
+                return response
 
-            return Response({
-                "sessions": session_list
-            }, status=status.HTTP_200_OK)
+            # Sin Last-Modified: borrar una sesión no cambia la fecha máxima
+            return conditional_response(request, version, build)
 
         except Exception as e:
             print(f"Error en get_sessions_class: {str(e)}")  # Para debugging
             return Response({"detail": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
 class SupportViewset(ViewSet):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     
     @swagger_auto_schema(
@@ -866,7 +1137,7 @@ class SupportViewset(ViewSet):
         # Obtener los nombres de los cursos relacionados con el voluntario
         if volunteer_classes.exists():
             course_ids = volunteer_classes.values_list('id_class', flat=True)
-            courses = Class.objects.filter(id__in=course_ids)
+            courses = CLASS_CATALOG.get_many(course_ids).values()
             course_list = ', '.join([course.name for course in courses])
         else:
             course_list = 'Sin cursos asignados'
@@ -4,8 +4,8 @@ set -e
 # Instalar dependencias (por si hay cambios)
 pip install --no-cache-dir -r requirements.txt
 
-# Ejecutar migraciones
-python manage.py migrate
+# Ejecutar migraciones (--run-syncdb crea las tablas nuevas de las apps sin carpeta de migraciones)
+python manage.py migrate --run-syncdb
 
 # Colectar archivos estáticos (opcional si ya se hace en Dockerfile)
 python manage.py collectstatic --noinput
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from metricas.services.reporte_service import ReporteService
+
+
+class Command(BaseCommand):
+    help = "Elimina los reportes Excel generados en segundo plano con más de N días"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=7)
+
+    def handle(self, *args, **options):
+        eliminados = ReporteService.limpiar(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"Reportes eliminados: {eliminados}"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from metricas.services.rollup_service import RollupAsistenciaService
+
+
+class Command(BaseCommand):
+    help = "Reconstruye desde cero los rollups de asistencia usados por las métricas"
+
+    def handle(self, *args, **options):
+        resultado = RollupAsistenciaService.reconstruir()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups reconstruidos: {resultado['asistencia_estudiante']} filas por estudiante, "
+            f"{resultado['sesiones_clase']} filas por clase."
+        ))
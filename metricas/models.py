@@ -0,0 +1,72 @@
+from django.db import models
+
+
+class AsistenciaDiariaEstudiante(models.Model):
+    """
+    Rollup de asistencia: cantidad de registros por estudiante, clase, día y
+    valor de asistencia. Se mantiene desde las vistas que escriben asistencia
+    (ver RollupAsistenciaService) y se reconstruye con `reconstruir_rollups`.
+    """
+    id = models.BigAutoField(primary_key=True)
+    id_student = models.ForeignKey('api.Students', models.CASCADE, db_column='id_student', db_constraint=False)
+    id_class = models.ForeignKey('api.Class', models.CASCADE, db_column='id_class', db_constraint=False)
+    fecha = models.DateField()
+    attendance = models.CharField(max_length=11, blank=True, default='')
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'rollup_asistencia_estudiante'
+        unique_together = (('id_student', 'id_class', 'fecha', 'attendance'),)
+        indexes = [
+            models.Index(fields=['fecha', 'id_class'], name='rollup_est_fecha_clase_idx'),
+        ]
+
+
+class SesionesDiariasClase(models.Model):
+    """
+    Rollup de sesiones: cantidad de sesiones y registros de asistencia por
+    clase y día.
+    """
+    id = models.BigAutoField(primary_key=True)
+    id_class = models.ForeignKey('api.Class', models.CASCADE, db_column='id_class', db_constraint=False)
+    fecha = models.DateField()
+    total_sesiones = models.IntegerField(default=0)
+    total_registros = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'rollup_sesiones_clase'
+        unique_together = (('id_class', 'fecha'),)
+        indexes = [
+            models.Index(fields=['fecha'], name='rollup_ses_fecha_idx'),
+        ]
+
+
+class ReporteExcel(models.Model):
+    """
+    Trabajo de generación de un reporte Excel en segundo plano. La firma combina
+    tipo, parámetros y versión de los datos de asistencia, para reutilizar un
+    archivo ya generado mientras los datos no cambien.
+    """
+    PENDIENTE = 'PENDIENTE'
+    PROCESANDO = 'PROCESANDO'
+    COMPLETADO = 'COMPLETADO'
+    ERROR = 'ERROR'
+    ESTADOS = [
+        (PENDIENTE, 'Pendiente'),
+        (PROCESANDO, 'Procesando'),
+        (COMPLETADO, 'Completado'),
+        (ERROR, 'Error'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    tipo = models.CharField(max_length=20)
+    parametros = models.JSONField(default=dict)
+    firma = models.CharField(max_length=64, db_index=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    archivo = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'reportes_excel'
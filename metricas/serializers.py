@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from .models import ReporteExcel
+
+class ReporteExcelSerializer(serializers.ModelSerializer):
+    reporte_id = serializers.IntegerField(source='id', read_only=True)
+
+    class Meta:
+        model = ReporteExcel
+        fields = ['reporte_id', 'tipo', 'parametros', 'estado', 'error', 'created_at', 'updated_at']
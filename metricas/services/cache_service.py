@@ -0,0 +1,87 @@
+import hashlib
+import json
+import time
+from datetime import date
+from django.core.cache import cache
+
+class MetricasCacheService:
+    """
+    Caché de respuestas de métricas invalidada por versión de datos de asistencia.
+
+    Cada respuesta se guarda bajo una clave que incluye la versión vigente (global,
+    o de la clase si la consulta es de una sola clase). Las vistas que escriben
+    asistencia incrementan la versión, con lo que las entradas anteriores dejan de
+    leerse sin tener que borrarlas una por una.
+    """
+
+    PREFIJO = 'metricas'
+    TIMEOUT = 60 * 60 * 24
+
+    @staticmethod
+    def _clave_version(clase_id=None):
+        if clase_id is None:
+            return f'{MetricasCacheService.PREFIJO}:version'
+        return f'{MetricasCacheService.PREFIJO}:version:clase:{clase_id}'
+
+    @staticmethod
+    def _normalizar_clase(clase_id):
+        try:
+            return int(clase_id) if clase_id not in (None, '') else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def version(clase_id=None):
+        """
+        Versión vigente de los datos de asistencia (global o de una clase).
+        Se inicializa con la hora actual para no repetir versiones anteriores
+        si el backend de caché pierde la clave.
+        """
+        clave = MetricasCacheService._clave_version(clase_id)
+        version = cache.get(clave)
+        if version is None:
+            cache.add(clave, int(time.time() * 1000), None)
+            version = cache.get(clave)
+        return version
+
+    @staticmethod
+    def invalidar(*clase_ids):
+        """Incrementa la versión global y la de cada clase indicada"""
+        claves = [MetricasCacheService._clave_version()]
+        claves += [
+            MetricasCacheService._clave_version(clase_id)
+            for clase_id in {MetricasCacheService._normalizar_clase(c) for c in clase_ids}
+            if clase_id is not None
+        ]
+        for clave in claves:
+            try:
+                cache.incr(clave)
+            except ValueError:
+                # La clave no existe todavía: la siguiente lectura la inicializa
+                cache.add(clave, int(time.time() * 1000), None)
+
+    @staticmethod
+    def obtener(endpoint, parametros, calcular, clase_id=None):
+        """
+        Devuelve la respuesta cacheada de un endpoint para los parámetros dados, o la
+        calcula con `calcular()` y la guarda. Si se indica `clase_id`, la entrada solo
+        depende de la versión de esa clase.
+        """
+        clase_id = MetricasCacheService._normalizar_clase(clase_id)
+        version = MetricasCacheService.version(clase_id)
+
+        # La fecha forma parte de la clave porque los periodos son relativos a hoy
+        normalizados = {k: v for k, v in parametros.items() if v not in (None, '')}
+        normalizados['hoy'] = date.today().isoformat()
+        firma = hashlib.md5(
+            json.dumps(normalizados, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+        alcance = f'clase:{clase_id}' if clase_id is not None else 'global'
+        clave = f'{MetricasCacheService.PREFIJO}:{endpoint}:{alcance}:v{version}:{firma}'
+
+        datos = cache.get(clave)
+        if datos is None:
+            datos = calcular()
+            cache.set(clave, datos, MetricasCacheService.TIMEOUT)
+        return datos
@@ -1,9 +1,13 @@
 # filepath: c:\Users\USUARIO\Desktop\SL_BackEnd\metricas\services\excel_service_fixed.py
 import pandas as pd
 import io
+import tempfile
+import xlsxwriter
 from datetime import datetime, date, timedelta
 from django.db.models import Count, Q
 from api.models import AttendanceStudent, Students, Class, Session
+from .impacto_service import ImpactoService
+from .gestion_service import GestionService
 
 class ExcelService:
     @staticmethod
@@ -16,8 +20,17 @@ class ExcelService:
     
     @staticmethod
     def generar_excel_impacto(periodo='mes', umbral_regular=0.5):
+        """Informe de impacto en memoria (BytesIO posicionado al inicio), para las respuestas síncronas"""
+        output = io.BytesIO()
+        ExcelService.escribir_excel_impacto(output, periodo, umbral_regular)
+        output.seek(0)
+        return output
+
+    @staticmethod
+    def escribir_excel_impacto(destino, periodo='mes', umbral_regular=0.5):
         """
-        Genera un informe Excel con métricas de impacto según requerimientos:
+        Escribe en `destino` (ruta o archivo abierto en modo binario) un informe Excel
+        con métricas de impacto según requerimientos:
         - Tasa de asistencia por clase/día y general
         - Porcentaje de alumnos regulares (≥50%)
         - Frecuencia de asistencia (1-3, 4-5, 6+)
@@ -25,8 +38,7 @@ class ExcelService:
         - Día con mayor asistencia
         - Promedio de sesiones por alumno
         """
-        output = io.BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
+        writer = pd.ExcelWriter(destino, engine='xlsxwriter')
         
         # Determinar período de análisis
         now = date.today()
@@ -238,30 +250,12 @@ class ExcelService:
         df_retencion.to_excel(writer, sheet_name='Retención Mes a Mes', index=False)
         
         # 6. DÍA CON MAYOR ASISTENCIA
-        dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-        asistencias_por_dia = {}
-        
-        for i in range(7):
-            # Django: 1=Domingo, 2=Lunes, 3=Martes, 4=Miércoles, 5=Jueves, 6=Viernes, 7=Sábado
-            # Convertir índice de lista (0=Lunes) a número de Django
-            django_day_mapping = {
-                0: 2,  # Lunes
-                1: 3,  # Martes
-                2: 4,  # Miércoles
-                3: 5,  # Jueves
-                4: 6,  # Viernes
-                5: 7,  # Sábado
-                6: 1   # Domingo
-            }
-            dia_semana_num = django_day_mapping[i]
-            
-            asistencias_dia = AttendanceStudent.objects.filter(
-                id_session__date__gte=start_date,
-                id_session__date__week_day=dia_semana_num,
-                attendance='PRESENT'
-            ).count()
-            
-            asistencias_por_dia[dias_semana[i]] = asistencias_dia
+        # Una sola consulta agrupada; numeración de Django: 1=Domingo, 2=Lunes, ..., 7=Sábado
+        totales_por_dia = ImpactoService.asistencias_por_dia_semana(start_date, valores=['PRESENT'])
+        dias_semana = [2, 3, 4, 5, 6, 7, 1]  # Lunes a Domingo
+        asistencias_por_dia = {
+            ImpactoService.DIAS_SEMANA[dia]: totales_por_dia[dia] for dia in dias_semana
+        }
         
         dia_mayor = max(asistencias_por_dia, key=asistencias_por_dia.get) if asistencias_por_dia else 'N/A'
         
@@ -305,372 +299,263 @@ class ExcelService:
         df_promedio = pd.DataFrame(promedio_data)
         df_promedio.to_excel(writer, sheet_name='Promedio Sesiones Alumno', index=False)
         
-        # Cerrar el writer y devolver el buffer
         writer.close()
+    
+    @staticmethod
+    def generar_excel_gestion(fecha=None, fecha_inicio=None, mes=None, anio=None, clase_id=None, criterio='sexo'):
+        """Informe de gestión en memoria (BytesIO posicionado al inicio), para las respuestas síncronas"""
+        output = io.BytesIO()
+        ExcelService.escribir_excel_gestion(output, fecha=fecha, fecha_inicio=fecha_inicio, mes=mes,
+                                            anio=anio, clase_id=clase_id, criterio=criterio)
         output.seek(0)
-        
         return output
-    
+
+    # Filas que se piden a la base de datos por cada viaje al recorrer asistencias
+    CHUNK_SIZE = 2000
+
+    @staticmethod
+    def _escribir_hoja(workbook, nombre, columnas, filas, formato_encabezado):
+        """Escribe una hoja fila por fila; `filas` puede ser cualquier iterable"""
+        hoja = workbook.add_worksheet(nombre)
+        hoja.write_row(0, 0, columnas, formato_encabezado)
+        for num_fila, fila in enumerate(filas, start=1):
+            hoja.write_row(num_fila, 0, fila)
+
+    @staticmethod
+    def _filas_lista_diaria(fecha_obj, clase_id):
+        query_filter = {'id_session__date__date': fecha_obj}
+        if clase_id:
+            query_filter['id_session__id_class__id'] = clase_id
+
+        asistencias = AttendanceStudent.objects.filter(**query_filter).values_list(
+            'id_student', 'id_student__name', 'id_student__last_name', 'id_student__gender',
+            'id_student__birthdate', 'id_session__id_class__name', 'id_session__num_session', 'attendance'
+        ).order_by('id_session__id_class', 'id_session__num_session', 'id_student')
+
+        for est_id, nombre, apellido, sexo, nacimiento, clase, sesion, asistencia in asistencias.iterator(chunk_size=ExcelService.CHUNK_SIZE):
+            yield [est_id, nombre, apellido, sexo, ExcelService._calcular_edad(nacimiento),
+                   clase, sesion, asistencia or 'No Registrado', fecha_obj]
+
     @staticmethod
-    def generar_excel_gestion(fecha=None, fecha_inicio=None, mes=None, anio=None, 
-                            clase_id=None, umbral_irregular=0.25, criterio='sexo', dias_inactivos=30):
+    def _filas_lista_periodo(query_filter, total_sesiones, es_baja_asistencia):
         """
-        Genera un informe Excel con métricas de gestión según requerimientos:
-        - Lista diaria: nombre, sexo, edad
-        - Lista semanal: nombre, sexo, edad, total asistencias, porcentaje, estatus
-        - Lista mensual: nombre, sexo, edad, total asistencias, porcentaje, estatus
-        - Alumnos irregulares: <25% asistencia
-        - Grupos por sexo/edad
-        - Alumnos con más de 30 faltas seguidas
+        Filas de la lista semanal/mensual, agregadas por estudiante en la base de datos.
+        `es_baja_asistencia(porcentaje)` decide el estatus por debajo de 50%.
         """
-        output = io.BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')        # 1. LISTA DE ASISTENCIA DIARIA (si se especifica fecha)
-        if fecha:
-            try:
-                # Convertir string a objeto date si es necesario
-                if isinstance(fecha, str):
-                    fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date()
-                elif isinstance(fecha, date):
-                    fecha_obj = fecha
-                else:
-                    raise ValueError(f"Tipo de fecha no válido: {type(fecha)}")
-                
-                query_filter = {'id_session__date__date': fecha_obj}
-                if clase_id:
-                    query_filter['id_session__id_class__id'] = clase_id
-                
-                asistencias_diarias = AttendanceStudent.objects.filter(**query_filter).select_related(
-                    'id_student', 'id_session__id_class'
-                )
-                
-                datos_diarios = []
-                for asistencia in asistencias_diarias:
-                    datos_diarios.append({
-                        'ID Estudiante': asistencia.id_student.id,
-                        'Nombre': asistencia.id_student.name,
-                        'Apellido': asistencia.id_student.last_name,
-                        'Sexo': asistencia.id_student.gender,
-                        'Edad': ExcelService._calcular_edad(asistencia.id_student.birthdate),
-                        'Clase': asistencia.id_session.id_class.name,
-                        'Sesión': asistencia.id_session.num_session,
-                        'Asistencia': asistencia.attendance or 'No Registrado',
-                        'Fecha': fecha_obj
-                    })
-                
-                df_diario = pd.DataFrame(datos_diarios)
-                df_diario.to_excel(writer, sheet_name='Lista Asistencia Diaria', index=False)
-                
-            except Exception as e:
-                # Crear hoja con información del error para debugging
-                df_error = pd.DataFrame({
-                    'Error': [f'Error al procesar fecha: {str(e)}'],
-                    'Fecha recibida': [str(fecha)],
-                    'Tipo de fecha': [str(type(fecha))],
-                    'Mensaje': ['Verifique que la fecha esté en formato YYYY-MM-DD']
-                })
-                df_error.to_excel(writer, sheet_name='Lista Asistencia Diaria', index=False)
-        
-        # 2. LISTA DE ASISTENCIA SEMANAL (con estatus)
-        if fecha_inicio:
-            fecha_fin = fecha_inicio + timedelta(days=6)
-            
-            query_filter = {
-                'id_session__date__gte': fecha_inicio,
-                'id_session__date__lte': fecha_fin
-            }
-            if clase_id:
-                query_filter['id_session__id_class__id'] = clase_id
-            
-            # Obtener estudiantes y calcular estadísticas
-            estudiantes_semana = {}
-            asistencias_semana = AttendanceStudent.objects.filter(**query_filter).select_related('id_student')
-            
-            total_sesiones_semana = Session.objects.filter(
-                date__gte=fecha_inicio,
-                date__lte=fecha_fin
-            ).count()
-            
-            for asistencia in asistencias_semana:
-                est_id = asistencia.id_student.id
-                if est_id not in estudiantes_semana:
-                    estudiantes_semana[est_id] = {
-                        'estudiante': asistencia.id_student,
-                        'presentes': 0,
-                        'total_registros': 0
-                    }
-                
-                estudiantes_semana[est_id]['total_registros'] += 1
-                if asistencia.attendance == 'PRESENT':
-                    estudiantes_semana[est_id]['presentes'] += 1
-            
-            datos_semanales = []
-            for est_data in estudiantes_semana.values():
-                porcentaje = (est_data['presentes'] / total_sesiones_semana * 100) if total_sesiones_semana > 0 else 0
-                
-                # Determinar estatus según requerimientos
-                if porcentaje >= 50:
-                    estatus = 'regular'
-                elif porcentaje > 0:
-                    estatus = 'baja asistencia'
-                else:
-                    estatus = 'ausente'
-                
-                datos_semanales.append({
-                    'ID': est_data['estudiante'].id,
-                    'Nombre': est_data['estudiante'].name,
-                    'Apellido': est_data['estudiante'].last_name,
-                    'Sexo': est_data['estudiante'].gender,
-                    'Edad': ExcelService._calcular_edad(est_data['estudiante'].birthdate),
-                    'Total Asistencias': est_data['presentes'],
-                    'Total Sesiones': total_sesiones_semana,
-                    'Porcentaje Asistencia (%)': round(porcentaje, 2),
-                    'Estatus': estatus
-                })
-            
-            df_semanal = pd.DataFrame(datos_semanales)
-            df_semanal.to_excel(writer, sheet_name='Lista Asistencia Semanal', index=False)
-        
-        # 3. LISTA DE ASISTENCIA MENSUAL (con estatus)
-        if mes and anio:
-            query_filter = {
-                'id_session__date__month': mes,
-                'id_session__date__year': anio
-            }
-            if clase_id:
-                query_filter['id_session__id_class__id'] = clase_id
-            
-            # Obtener estudiantes y calcular estadísticas
-            estudiantes_mes = {}
-            asistencias_mes = AttendanceStudent.objects.filter(**query_filter).select_related('id_student')
-            total_sesiones_mes = Session.objects.filter(
-                date__month=mes,
-                date__year=anio
-            ).count()
-            
-            for asistencia in asistencias_mes:
-                est_id = asistencia.id_student.id
-                if est_id not in estudiantes_mes:
-                    estudiantes_mes[est_id] = {
-                        'estudiante': asistencia.id_student,
-                        'presentes': 0,
-                        'total_registros': 0
-                    }
-                
-                estudiantes_mes[est_id]['total_registros'] += 1
-                if asistencia.attendance == 'PRESENT':
-                    estudiantes_mes[est_id]['presentes'] += 1
-            
-            datos_mensuales = []
-            for est_data in estudiantes_mes.values():
-                porcentaje = (est_data['presentes'] / total_sesiones_mes * 100) if total_sesiones_mes > 0 else 0
-                
-                # Determinar estatus según requerimientos
-                if porcentaje >= 50:
-                    estatus = 'regular'
-                elif porcentaje >= 25:
-                    estatus = 'baja asistencia'
-                else:
-                    estatus = 'ausente'
-                
-                datos_mensuales.append({
-                    'ID': est_data['estudiante'].id,
-                    'Nombre': est_data['estudiante'].name,
-                    'Apellido': est_data['estudiante'].last_name,
-                    'Sexo': est_data['estudiante'].gender,
-                    'Edad': ExcelService._calcular_edad(est_data['estudiante'].birthdate),
-                    'Total Asistencias': est_data['presentes'],
-                    'Total Sesiones': total_sesiones_mes,
-                    'Porcentaje Asistencia (%)': round(porcentaje, 2),
-                    'Estatus': estatus
-                })
-            
-            df_mensual = pd.DataFrame(datos_mensuales)
-            df_mensual.to_excel(writer, sheet_name='Lista Asistencia Mensual', index=False)
-          # 4. ALUMNOS CON ASISTENCIA IRREGULAR (<25%)
-        # Optimización: usar las asistencias ya calculadas
-        alumnos_irregulares = []
-        
-        # Obtener todos los estudiantes que han tenido alguna asistencia
-        estudiantes_todos = Students.objects.select_related().prefetch_related('attendancestudent_set')
-        
-        # Obtener conteos de asistencias en una sola consulta
-        asistencias_totales = AttendanceStudent.objects.values('id_student').annotate(
+        estudiantes = AttendanceStudent.objects.filter(**query_filter).values(
+            'id_student', 'id_student__name', 'id_student__last_name',
+            'id_student__gender', 'id_student__birthdate'
+        ).annotate(
+            presentes=Count('id', filter=Q(attendance='PRESENT'))
+        ).order_by('id_student')
+
+        for est in estudiantes.iterator(chunk_size=ExcelService.CHUNK_SIZE):
+            porcentaje = (est['presentes'] / total_sesiones * 100) if total_sesiones > 0 else 0
+
+            if porcentaje >= 50:
+                estatus = 'regular'
+            elif es_baja_asistencia(porcentaje):
+                estatus = 'baja asistencia'
+            else:
+                estatus = 'ausente'
+
+            yield [est['id_student'], est['id_student__name'], est['id_student__last_name'],
+                   est['id_student__gender'], ExcelService._calcular_edad(est['id_student__birthdate']),
+                   est['presentes'], total_sesiones, round(porcentaje, 2), estatus]
+
+    @staticmethod
+    def _filas_irregulares():
+        estudiantes = AttendanceStudent.objects.values(
+            'id_student', 'id_student__name', 'id_student__last_name',
+            'id_student__gender', 'id_student__birthdate'
+        ).annotate(
             total_presentes=Count('id', filter=Q(attendance='PRESENT')),
             total_registros=Count('id')
-        )
-        
-        # Crear diccionario para acceso rápido
-        asistencias_dict = {a['id_student']: a for a in asistencias_totales}
-        
-        for estudiante in estudiantes_todos:
-            if estudiante.id in asistencias_dict:
-                data = asistencias_dict[estudiante.id]
-                total_registros_est = data['total_registros']
-                presentes_est = data['total_presentes']
-                
-                if total_registros_est > 0:
-                    porcentaje = presentes_est / total_registros_est
-                    if porcentaje < 0.25:  # Exactamente <25% según requerimientos
-                        alumnos_irregulares.append({
-                            'ID': estudiante.id,
-                            'Nombre': estudiante.name,
-                            'Apellido': estudiante.last_name,
-                            'Sexo': estudiante.gender,
-                            'Edad': ExcelService._calcular_edad(estudiante.birthdate),
-                            'Porcentaje Asistencia (%)': round(porcentaje * 100, 2),
-                            'Total Presentes': presentes_est,
-                            'Total Registros': total_registros_est
-                        })
-        
-        df_irregulares = pd.DataFrame(alumnos_irregulares)
-        df_irregulares.to_excel(writer, sheet_name='Alumnos Irregulares', index=False)
-          # 5. GRUPOS CON MAYOR O MENOR ASISTENCIA
-        if criterio == 'sexo':
-            grupos_data = []
-            for genero in ['M', 'F']:
-                estudiantes_genero = Students.objects.filter(gender=genero)
-                total_estudiantes = estudiantes_genero.count()
-                
-                if total_estudiantes > 0:
-                    total_asistencias = AttendanceStudent.objects.filter(
-                        id_student__in=estudiantes_genero,
-                        attendance='PRESENT'
-                    ).count()
-                    total_registros = AttendanceStudent.objects.filter(
-                        id_student__in=estudiantes_genero
-                    ).count()
-                    
-                    porcentaje = (total_asistencias / total_registros * 100) if total_registros > 0 else 0
-                    
-                    grupos_data.append({
-                        'Sexo': 'Masculino' if genero == 'M' else 'Femenino',
-                        'Total Estudiantes': total_estudiantes,
-                        'Total Asistencias': total_asistencias,
-                        'Total Registros': total_registros,
-                        'Porcentaje Asistencia (%)': round(porcentaje, 2)
-                    })
-            
-            df_grupos = pd.DataFrame(grupos_data)
-            df_grupos.to_excel(writer, sheet_name='Grupos por Sexo', index=False)
-        
-        else:  # criterio == 'edad'
-            rangos_edad = [
-                (0, 8, '0-8 años'),
-                (9, 12, '9-12 años'),
-                (13, 16, '13-16 años'),
-                (17, 100, '17+ años')
-            ]
-            grupos_data = []
-            
-            # Optimización: obtener todas las edades de una vez
-            estudiantes_con_edad = Students.objects.filter(birthdate__isnull=False).values('id', 'birthdate')
-            estudiantes_por_rango = {label: [] for _, _, label in rangos_edad}
-            
-            today = date.today()
-            for est in estudiantes_con_edad:
-                edad = today.year - est['birthdate'].year - ((today.month, today.day) < (est['birthdate'].month, est['birthdate'].day))
-                for min_edad, max_edad, label in rangos_edad:
-                    if min_edad <= edad <= max_edad:
-                        estudiantes_por_rango[label].append(est['id'])
-                        break
-            
-            for min_edad, max_edad, label in rangos_edad:
-                estudiantes_rango = estudiantes_por_rango[label]
-                total_estudiantes = len(estudiantes_rango)
-                
-                if total_estudiantes > 0:
-                    total_asistencias = AttendanceStudent.objects.filter(
-                        id_student__in=estudiantes_rango,
-                        attendance='PRESENT'
-                    ).count()
-                    total_registros = AttendanceStudent.objects.filter(
-                        id_student__in=estudiantes_rango
-                    ).count()
-                    
-                    porcentaje = (total_asistencias / total_registros * 100) if total_registros > 0 else 0
-                    
-                    grupos_data.append({
-                        'Rango Edad': label,
-                        'Total Estudiantes': total_estudiantes,
-                        'Total Asistencias': total_asistencias,
-                        'Total Registros': total_registros,
-                        'Porcentaje Asistencia (%)': round(porcentaje, 2)
-                    })
-            
-            df_grupos = pd.DataFrame(grupos_data)
-            df_grupos.to_excel(writer, sheet_name='Grupos por Edad', index=False)
-          # 6. LISTA DE ALUMNOS CON MÁS DE 30 FALTAS SEGUIDAS
-        # Optimización: una sola consulta para obtener todas las asistencias ordenadas
-        asistencias_ordenadas = AttendanceStudent.objects.select_related('id_student').order_by('id_student', 'id_session__date')
-        
-        # Procesar por estudiante
-        alumnos_faltas_seguidas = []
+        ).order_by('id_student')
+
+        for est in estudiantes.iterator(chunk_size=ExcelService.CHUNK_SIZE):
+            porcentaje = est['total_presentes'] / est['total_registros']
+            if porcentaje < 0.25:
+                yield [est['id_student'], est['id_student__name'], est['id_student__last_name'],
+                       est['id_student__gender'], ExcelService._calcular_edad(est['id_student__birthdate']),
+                       round(porcentaje * 100, 2), est['total_presentes'], est['total_registros']]
+
+    @staticmethod
+    def _filas_grupos(grupos):
+        """Una fila por grupo (etiqueta -> Q sobre Students) con una sola consulta agregada"""
+        agregados = {}
+        for indice, filtro in enumerate(grupos.values()):
+            agregados[f'estudiantes_{indice}'] = Count('id', filter=filtro, distinct=True)
+            agregados[f'asistencias_{indice}'] = Count(
+                'attendancestudent', filter=filtro & Q(attendancestudent__attendance='PRESENT')
+            )
+            agregados[f'registros_{indice}'] = Count('attendancestudent', filter=filtro)
+        totales = Students.objects.aggregate(**agregados)
+
+        for indice, etiqueta in enumerate(grupos):
+            total_estudiantes = totales[f'estudiantes_{indice}']
+            if total_estudiantes > 0:
+                total_asistencias = totales[f'asistencias_{indice}']
+                total_registros = totales[f'registros_{indice}']
+                porcentaje = (total_asistencias / total_registros * 100) if total_registros > 0 else 0
+                yield [etiqueta, total_estudiantes, total_asistencias, total_registros, round(porcentaje, 2)]
+
+    @staticmethod
+    def _filas_faltas_seguidas():
+        """Recorre las asistencias ordenadas por estudiante y fecha sin cargarlas en memoria"""
+        asistencias = AttendanceStudent.objects.values_list(
+            'id_student', 'id_student__name', 'id_student__last_name',
+            'id_student__gender', 'id_student__birthdate', 'attendance'
+        ).order_by('id_student', 'id_session__date')
+
         estudiante_actual = None
         faltas_consecutivas = 0
         max_faltas_consecutivas = 0
-        
-        for asistencia in asistencias_ordenadas:
-            if estudiante_actual != asistencia.id_student:
-                # Nuevo estudiante - procesar el anterior si existe
+
+        for asistencia in asistencias.iterator(chunk_size=ExcelService.CHUNK_SIZE):
+            if estudiante_actual is None or estudiante_actual[0] != asistencia[0]:
                 if estudiante_actual and max_faltas_consecutivas > 30:
-                    alumnos_faltas_seguidas.append({
-                        'ID': estudiante_actual.id,
-                        'Nombre': estudiante_actual.name,
-                        'Apellido': estudiante_actual.last_name,
-                        'Sexo': estudiante_actual.gender,
-                        'Edad': ExcelService._calcular_edad(estudiante_actual.birthdate),
-                        'Máximo Faltas Consecutivas': max_faltas_consecutivas,
-                        'Estado': 'Requiere Seguimiento'
-                    })
-                
-                # Reiniciar contadores para el nuevo estudiante
-                estudiante_actual = asistencia.id_student
+                    yield list(estudiante_actual[:4]) + [
+                        ExcelService._calcular_edad(estudiante_actual[4]),
+                        max_faltas_consecutivas, 'Requiere Seguimiento'
+                    ]
+                estudiante_actual = asistencia
                 faltas_consecutivas = 0
                 max_faltas_consecutivas = 0
-            
-            # Procesar asistencia actual
-            if asistencia.attendance == 'ABSENT':
+
+            if asistencia[5] == 'ABSENT':
                 faltas_consecutivas += 1
                 max_faltas_consecutivas = max(max_faltas_consecutivas, faltas_consecutivas)
             else:
                 faltas_consecutivas = 0
-        
-        # Procesar el último estudiante
+
         if estudiante_actual and max_faltas_consecutivas > 30:
-            alumnos_faltas_seguidas.append({
-                'ID': estudiante_actual.id,
-                'Nombre': estudiante_actual.name,
-                'Apellido': estudiante_actual.last_name,
-                'Sexo': estudiante_actual.gender,
-                'Edad': ExcelService._calcular_edad(estudiante_actual.birthdate),
-                'Máximo Faltas Consecutivas': max_faltas_consecutivas,
-                'Estado': 'Requiere Seguimiento'
-            })
-        
-        df_faltas_seguidas = pd.DataFrame(alumnos_faltas_seguidas)
-        df_faltas_seguidas.to_excel(writer, sheet_name='Más de 30 Faltas Seguidas', index=False)
-        
-        # 7. RESUMEN POR CLASES
-        estudiantes_por_clase = []
-        for clase in Class.objects.all():
-            estudiantes_clase = Students.objects.filter(
-                attendancestudent__id_session__id_class=clase
-            ).distinct()
-            
-            estudiantes_por_clase.append({
-                'ID Clase': clase.id,
-                'Nombre Clase': clase.name,
-                'Día': clase.day,
-                'Hora': f"{clase.start_time} - {clase.end_time}",
-                'Total Estudiantes': estudiantes_clase.count(),
-                'Total Sesiones': Session.objects.filter(id_class=clase).count()
-            })
-        
-        df_clases_est = pd.DataFrame(estudiantes_por_clase)
-        df_clases_est.to_excel(writer, sheet_name='Resumen por Clases', index=False)
-        
-        # Cerrar el writer y devolver el buffer
-        writer.close()
-        output.seek(0)
-        
-        return output
\ No newline at end of file
+            yield list(estudiante_actual[:4]) + [
+                ExcelService._calcular_edad(estudiante_actual[4]),
+                max_faltas_consecutivas, 'Requiere Seguimiento'
+            ]
+
+    @staticmethod
+    def _filas_resumen_clases():
+        clases = Class.objects.annotate(
+            total_estudiantes=Count('session__attendancestudent__id_student', distinct=True),
+            total_sesiones=Count('session', distinct=True)
+        ).values_list('id', 'name', 'day', 'start_time', 'end_time', 'total_estudiantes', 'total_sesiones')
+
+        for clase_id, nombre, dia, inicio, fin, total_estudiantes, total_sesiones in clases.iterator():
+            yield [clase_id, nombre, dia, f"{inicio} - {fin}", total_estudiantes, total_sesiones]
+
+    @staticmethod
+    def escribir_excel_gestion(destino, fecha=None, fecha_inicio=None, mes=None, anio=None,
+                               clase_id=None, criterio='sexo'):
+        """
+        Escribe el informe de gestión en `destino` (ruta o archivo abierto en modo binario):
+        - Lista diaria: nombre, sexo, edad
+        - Lista semanal y mensual: nombre, sexo, edad, total asistencias, porcentaje, estatus
+        - Alumnos irregulares: <25% asistencia
+        - Grupos por sexo/edad
+        - Alumnos con más de 30 faltas seguidas
+        - Resumen por clases
+
+        Sin DataFrames: las asistencias se recorren con .iterator() y xlsxwriter escribe en
+        modo constant_memory, así que la memoria usada no crece con el historial.
+        """
+        workbook = xlsxwriter.Workbook(destino, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd'
+        })
+        encabezado = workbook.add_format({'bold': True, 'border': 1})
+        columnas_lista = ['ID', 'Nombre', 'Apellido', 'Sexo', 'Edad', 'Total Asistencias',
+                          'Total Sesiones', 'Porcentaje Asistencia (%)', 'Estatus']
+
+        try:
+            # 1. LISTA DE ASISTENCIA DIARIA (si se especifica fecha)
+            if fecha:
+                try:
+                    fecha_obj = datetime.strptime(fecha, '%Y-%m-%d').date() if isinstance(fecha, str) else fecha
+                    if not isinstance(fecha_obj, date):
+                        raise ValueError(f"Tipo de fecha no válido: {type(fecha)}")
+                    filas_diarias = ExcelService._filas_lista_diaria(fecha_obj, clase_id)
+                    columnas_diarias = ['ID Estudiante', 'Nombre', 'Apellido', 'Sexo', 'Edad',
+                                        'Clase', 'Sesión', 'Asistencia', 'Fecha']
+                except Exception as e:
+                    columnas_diarias = ['Error', 'Fecha recibida', 'Tipo de fecha', 'Mensaje']
+                    filas_diarias = [[f'Error al procesar fecha: {str(e)}', str(fecha), str(type(fecha)),
+                                      'Verifique que la fecha esté en formato YYYY-MM-DD']]
+                ExcelService._escribir_hoja(workbook, 'Lista Asistencia Diaria', columnas_diarias,
+                                            filas_diarias, encabezado)
+
+            # 2. LISTA DE ASISTENCIA SEMANAL (con estatus)
+            if fecha_inicio:
+                fecha_fin = fecha_inicio + timedelta(days=6)
+                query_filter = {'id_session__date__gte': fecha_inicio, 'id_session__date__lte': fecha_fin}
+                if clase_id:
+                    query_filter['id_session__id_class__id'] = clase_id
+                total_sesiones = Session.objects.filter(date__gte=fecha_inicio, date__lte=fecha_fin).count()
+                ExcelService._escribir_hoja(workbook, 'Lista Asistencia Semanal', columnas_lista,
+                                            ExcelService._filas_lista_periodo(query_filter, total_sesiones, lambda p: p > 0),
+                                            encabezado)
+
+            # 3. LISTA DE ASISTENCIA MENSUAL (con estatus)
+            if mes and anio:
+                query_filter = {'id_session__date__month': mes, 'id_session__date__year': anio}
+                if clase_id:
+                    query_filter['id_session__id_class__id'] = clase_id
+                total_sesiones = Session.objects.filter(date__month=mes, date__year=anio).count()
+                ExcelService._escribir_hoja(workbook, 'Lista Asistencia Mensual', columnas_lista,
+                                            ExcelService._filas_lista_periodo(query_filter, total_sesiones, lambda p: p >= 25),
+                                            encabezado)
+
+            # 4. ALUMNOS CON ASISTENCIA IRREGULAR (<25%)
+            ExcelService._escribir_hoja(workbook, 'Alumnos Irregulares',
+                                        ['ID', 'Nombre', 'Apellido', 'Sexo', 'Edad', 'Porcentaje Asistencia (%)',
+                                         'Total Presentes', 'Total Registros'],
+                                        ExcelService._filas_irregulares(), encabezado)
+
+            # 5. GRUPOS CON MAYOR O MENOR ASISTENCIA
+            columnas_grupos = ['Total Estudiantes', 'Total Asistencias', 'Total Registros', 'Porcentaje Asistencia (%)']
+            if criterio == 'sexo':
+                grupos = {'Masculino': Q(gender='M'), 'Femenino': Q(gender='F')}
+                ExcelService._escribir_hoja(workbook, 'Grupos por Sexo', ['Sexo'] + columnas_grupos,
+                                            ExcelService._filas_grupos(grupos), encabezado)
+            else:
+                hoy = date.today()
+                grupos = {
+                    label: Q(
+                        birthdate__gt=GestionService._restar_anios(hoy, max_edad + 1),
+                        birthdate__lte=GestionService._restar_anios(hoy, min_edad)
+                    )
+                    for min_edad, max_edad, label in [
+                        (0, 8, '0-8 años'), (9, 12, '9-12 años'), (13, 16, '13-16 años'), (17, 100, '17+ años')
+                    ]
+                }
+                ExcelService._escribir_hoja(workbook, 'Grupos por Edad', ['Rango Edad'] + columnas_grupos,
+                                            ExcelService._filas_grupos(grupos), encabezado)
+
+            # 6. LISTA DE ALUMNOS CON MÁS DE 30 FALTAS SEGUIDAS
+            ExcelService._escribir_hoja(workbook, 'Más de 30 Faltas Seguidas',
+                                        ['ID', 'Nombre', 'Apellido', 'Sexo', 'Edad',
+                                         'Máximo Faltas Consecutivas', 'Estado'],
+                                        ExcelService._filas_faltas_seguidas(), encabezado)
+
+            # 7. RESUMEN POR CLASES
+            ExcelService._escribir_hoja(workbook, 'Resumen por Clases',
+                                        ['ID Clase', 'Nombre Clase', 'Día', 'Hora', 'Total Estudiantes', 'Total Sesiones'],
+                                        ExcelService._filas_resumen_clases(), encabezado)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def generar_excel_gestion_archivo(**parametros):
+        """
+        Genera el informe de gestión en un archivo temporal y lo devuelve abierto y
+        posicionado al inicio, listo para un FileResponse. El archivo se elimina al cerrarse.
+        """
+        archivo = tempfile.TemporaryFile(suffix='.xlsx')
+        try:
+            ExcelService.escribir_excel_gestion(archivo, **parametros)
+        except Exception:
+            archivo.close()
+            raise
+        archivo.seek(0)
+        return archivo
@@ -1,6 +1,11 @@
+import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta, date
-from django.db.models import Count, Q
-from api.models import AttendanceStudent, Session, Students, Class
+from django.db.models import Count, Q, Max, Sum
+from django.db.models.functions import Coalesce
+from api.models import AttendanceStudent, Session, Students
+from api.catalog import CLASS_CATALOG
+from metricas.models import AsistenciaDiariaEstudiante, SesionesDiariasClase
 
 class GestionService:
     """Servicio para cálculo de métricas de gestión"""
@@ -28,7 +33,7 @@ class GestionService:
             sesiones_query = sesiones_query.filter(id_class=clase_id)
         
         if not sesiones_query.exists():
-            clase_nombre = "Todas las clases" if not clase_id else Class.objects.get(id=clase_id).name
+            clase_nombre = "Todas las clases" if not clase_id else CLASS_CATALOG.get(clase_id).name
             return {
                 'fecha': fecha,
                 'clase': clase_nombre,
@@ -39,10 +44,10 @@ class GestionService:
         # Si no se especifica clase, usar la primera sesión encontrada
         if not clase_id and sesiones_query.exists():
             sesion = sesiones_query.first()
-            clase_id = sesion.id_class.id
-            clase_nombre = sesion.id_class.name
+            clase_id = sesion.id_class_id
+            clase_nombre = CLASS_CATALOG.get(clase_id).name
         else:
-            clase_nombre = Class.objects.get(id=clase_id).name
+            clase_nombre = CLASS_CATALOG.get(clase_id).name
         
         # Obtener la asistencia para esas sesiones
         asistencias = AttendanceStudent.objects.filter(
@@ -68,6 +73,70 @@ class GestionService:
             'alumnos': alumnos
         }
 
+    @staticmethod
+    def _asistencia_por_estudiante(fecha_inicio, fecha_fin, clase_id=None):
+        """
+        Total de sesiones del rango y asistencias (ONTIME/LATE) por estudiante,
+        leídos de los rollups con una consulta agrupada que ya trae los datos del estudiante
+        """
+        sesiones_query = SesionesDiariasClase.objects.filter(
+            fecha__gte=fecha_inicio,
+            fecha__lte=fecha_fin
+        )
+        asistencia_query = AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=fecha_inicio,
+            fecha__lte=fecha_fin
+        )
+        
+        if clase_id:
+            sesiones_query = sesiones_query.filter(id_class=clase_id)
+            asistencia_query = asistencia_query.filter(id_class=clase_id)
+        
+        total_sesiones = sesiones_query.aggregate(total=Sum('total_sesiones'))['total'] or 0
+        if total_sesiones == 0:
+            return 0, []
+        
+        estudiantes = asistencia_query.values(
+            'id_student', 'id_student__name', 'id_student__last_name',
+            'id_student__gender', 'id_student__birthdate'
+        ).annotate(
+            total_asistencias=Coalesce(Sum('total', filter=Q(attendance__in=['ONTIME', 'LATE'])), 0)
+        ).order_by('id_student')
+        
+        return total_sesiones, list(estudiantes)
+
+    @staticmethod
+    def _lista_alumnos_con_estatus(estudiantes, total_sesiones, umbral_baja):
+        """
+        Arma la lista de alumnos con porcentaje y estatus calculados de forma vectorizada:
+        'regular' desde 50%, 'baja asistencia' por encima de umbral_baja y 'ausente' en otro caso
+        """
+        if not estudiantes:
+            return []
+        
+        asistencias = pd.Series([est['total_asistencias'] for est in estudiantes], dtype='int64')
+        porcentajes = asistencias / total_sesiones * 100
+        estatus = np.select(
+            [porcentajes >= 50, porcentajes > umbral_baja],
+            ['regular', 'baja asistencia'],
+            default='ausente'
+        )
+        
+        return [
+            {
+                'id': est['id_student'],
+                'nombre': est['id_student__name'],
+                'apellido': est['id_student__last_name'],
+                'genero': est['id_student__gender'] or 'No especificado',
+                'edad': GestionService._calcular_edad(est['id_student__birthdate']),
+                'total_asistencias': est['total_asistencias'],
+                'total_sesiones': total_sesiones,
+                'porcentaje_asistencia': round(porcentaje, 2),
+                'estatus': estatus_alumno
+            }
+            for est, porcentaje, estatus_alumno in zip(estudiantes, porcentajes.tolist(), estatus.tolist())
+        ]
+
     @staticmethod
     def lista_asistencia_semanal(fecha_inicio=None, clase_id=None):
         """
@@ -81,17 +150,10 @@ class GestionService:
             
         fecha_fin = fecha_inicio + timedelta(days=6)
         
-        # Filtro base para sesiones en el rango de fechas
-        sesiones_query = Session.objects.filter(
-            date__date__gte=fecha_inicio,
-            date__date__lte=fecha_fin
-        )
-        
-        if clase_id:
-            sesiones_query = sesiones_query.filter(id_class=clase_id)
+        total_sesiones, estudiantes = GestionService._asistencia_por_estudiante(fecha_inicio, fecha_fin, clase_id)
             
         # Si no hay sesiones en la fecha, retornar resultado vacío
-        if not sesiones_query.exists():
+        if total_sesiones == 0:
             return {
                 'semana_inicio': fecha_inicio,
                 'semana_fin': fecha_fin,
@@ -99,46 +161,8 @@ class GestionService:
                 'total_sesiones': 0,
                 'alumnos': []
             }
-            
-        # IDs de estudiantes con asistencia registrada
-        estudiantes_ids = AttendanceStudent.objects.filter(
-            id_session__in=sesiones_query
-        ).values_list('id_student', flat=True).distinct()
         
-        estudiantes = Students.objects.filter(id__in=estudiantes_ids)
-        total_sesiones = sesiones_query.count()
-        
-        alumnos_data = []
-        for estudiante in estudiantes:
-            # Contar asistencias del estudiante
-            asistencias = AttendanceStudent.objects.filter(
-                id_student=estudiante.id,
-                id_session__in=sesiones_query,
-                attendance__in=['ONTIME', 'LATE']
-            ).count()
-            
-            # Calcular porcentaje de asistencia
-            porcentaje = (asistencias / total_sesiones * 100) if total_sesiones > 0 else 0
-            
-            # Determinar estatus
-            if porcentaje >= 50:
-                estatus = 'regular'
-            elif porcentaje > 0:
-                estatus = 'baja asistencia'
-            else:
-                estatus = 'ausente'
-                
-            alumnos_data.append({
-                'id': estudiante.id,
-                'nombre': estudiante.name,
-                'apellido': estudiante.last_name,
-                'genero': estudiante.gender or 'No especificado',
-                'edad': GestionService._calcular_edad(estudiante.birthdate),
-                'total_asistencias': asistencias,
-                'total_sesiones': total_sesiones,
-                'porcentaje_asistencia': round(porcentaje, 2),
-                'estatus': estatus
-            })
+        alumnos_data = GestionService._lista_alumnos_con_estatus(estudiantes, total_sesiones, umbral_baja=0)
             
         return {
             'semana_inicio': fecha_inicio,
@@ -167,18 +191,11 @@ class GestionService:
             fecha_fin = datetime(anio + 1, 1, 1).date() - timedelta(days=1)
         else:
             fecha_fin = datetime(anio, mes + 1, 1).date() - timedelta(days=1)
-            
-        # Filtro base para sesiones en el mes
-        sesiones_query = Session.objects.filter(
-            date__date__gte=fecha_inicio,
-            date__date__lte=fecha_fin
-        )
         
-        if clase_id:
-            sesiones_query = sesiones_query.filter(id_class=clase_id)
+        total_sesiones, estudiantes = GestionService._asistencia_por_estudiante(fecha_inicio, fecha_fin, clase_id)
             
         # Si no hay sesiones en el mes, retornar resultado vacío
-        if not sesiones_query.exists():
+        if total_sesiones == 0:
             return {
                 'mes': fecha_inicio.strftime('%B'),
                 'anio': anio,
@@ -186,46 +203,8 @@ class GestionService:
                 'total_sesiones': 0,
                 'alumnos': []
             }
-            
-        # IDs de estudiantes con asistencia registrada
-        estudiantes_ids = AttendanceStudent.objects.filter(
-            id_session__in=sesiones_query
-        ).values_list('id_student', flat=True).distinct()
-        
-        estudiantes = Students.objects.filter(id__in=estudiantes_ids)
-        total_sesiones = sesiones_query.count()
         
-        alumnos_data = []
-        for estudiante in estudiantes:
-            # Contar asistencias del estudiante
-            asistencias = AttendanceStudent.objects.filter(
-                id_student=estudiante.id,
-                id_session__in=sesiones_query,
-                attendance__in=['ONTIME', 'LATE']
-            ).count()
-            
-            # Calcular porcentaje de asistencia
-            porcentaje = (asistencias / total_sesiones * 100) if total_sesiones > 0 else 0
-            
-            # Determinar estatus
-            if porcentaje >= 50:
-                estatus = 'regular'
-            elif porcentaje > 25:
-                estatus = 'baja asistencia'
-            else:
-                estatus = 'ausente'
-                
-            alumnos_data.append({
-                'id': estudiante.id,
-                'nombre': estudiante.name,
-                'apellido': estudiante.last_name,
-                'genero': estudiante.gender or 'No especificado',
-                'edad': GestionService._calcular_edad(estudiante.birthdate),
-                'total_asistencias': asistencias,
-                'total_sesiones': total_sesiones,
-                'porcentaje_asistencia': round(porcentaje, 2),
-                'estatus': estatus
-            })
+        alumnos_data = GestionService._lista_alumnos_con_estatus(estudiantes, total_sesiones, umbral_baja=25)
             
         return {
             'mes': fecha_inicio.strftime('%B'),
@@ -252,7 +231,9 @@ class GestionService:
             fecha_inicio = now - timedelta(days=30)  # Default: último mes
         
         # Obtener sesiones en el periodo
-        total_sesiones = Session.objects.filter(date__date__gte=fecha_inicio).count()
+        total_sesiones = SesionesDiariasClase.objects.filter(
+            fecha__gte=fecha_inicio
+        ).aggregate(total=Sum('total_sesiones'))['total'] or 0
         
         if total_sesiones == 0:
             return {
@@ -263,15 +244,15 @@ class GestionService:
                 'alumnos': []
             }
         
-        # Optimización: obtener asistencias con datos de estudiante en una sola consulta
-        asistencias_por_estudiante = AttendanceStudent.objects.filter(
-            id_session__date__gte=fecha_inicio
-        ).select_related('id_student').values(
+        # Asistencias por estudiante desde el rollup, con los datos del estudiante en la misma consulta
+        asistencias_por_estudiante = AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=fecha_inicio
+        ).values(
             'id_student__id', 'id_student__name', 'id_student__last_name',
             'id_student__gender', 'id_student__birthdate'
         ).annotate(
-            total_asistencias=Count('id', filter=Q(attendance__in=['ONTIME', 'LATE'])),
-            total_registros=Count('id')
+            total_asistencias=Coalesce(Sum('total', filter=Q(attendance__in=['ONTIME', 'LATE'])), 0),
+            total_registros=Sum('total')
         )
         
         total_estudiantes = asistencias_por_estudiante.count()
@@ -306,6 +287,88 @@ class GestionService:
             'alumnos': alumnos_irregulares
         }
     
+    # Rangos de edad (en años cumplidos, ambos extremos incluidos)
+    RANGOS_EDAD = {
+        '0-5': {'min': 0, 'max': 5},
+        '6-12': {'min': 6, 'max': 12},
+        '13-17': {'min': 13, 'max': 17},
+        '18+': {'min': 18, 'max': 150}
+    }
+
+    @staticmethod
+    def _restar_anios(fecha, anios):
+        """Resta años a una fecha; el 29 de febrero pasa a 28 en años no bisiestos"""
+        try:
+            return fecha.replace(year=fecha.year - anios)
+        except ValueError:
+            return fecha.replace(year=fecha.year - anios, day=28)
+
+    @staticmethod
+    def _grupos_por_edad(hoy):
+        """
+        Traduce cada rango de edad a un rango de fechas de nacimiento, de modo que
+        la edad se filtre en la base de datos en lugar de calcularse por estudiante
+        """
+        grupos = {}
+        for rango_nombre, rango_valores in GestionService.RANGOS_EDAD.items():
+            # edad >= min  <=>  nació en o antes de hoy - min años
+            # edad <= max  <=>  nació después de hoy - (max + 1) años
+            nacimiento_hasta = GestionService._restar_anios(hoy, rango_valores['min'])
+            nacimiento_desde = GestionService._restar_anios(hoy, rango_valores['max'] + 1)
+            grupos[rango_nombre] = Q(birthdate__gt=nacimiento_desde, birthdate__lte=nacimiento_hasta)
+        return grupos
+
+    @staticmethod
+    def _a_traves_de(filtro, prefijo):
+        """Copia de un Q sobre Students con cada búsqueda hecha a través de `prefijo` (p. ej. 'id_student__')"""
+        return Q(
+            *[
+                GestionService._a_traves_de(hijo, prefijo) if isinstance(hijo, Q) else (prefijo + hijo[0], hijo[1])
+                for hijo in filtro.children
+            ],
+            _connector=filtro.connector, _negated=filtro.negated
+        )
+
+    @staticmethod
+    def _asistencia_por_grupos(grupos, fecha_inicio):
+        """
+        Calcula estudiantes, asistencias y porcentaje para cada grupo de estudiantes
+        (nombre -> Q sobre Students) con una agregación condicional sobre Students y
+        otra sobre las filas del rollup del periodo, para no recorrer el historial completo
+        """
+        total_sesiones = SesionesDiariasClase.objects.filter(
+            fecha__gte=fecha_inicio
+        ).aggregate(total=Sum('total_sesiones'))['total'] or 0
+
+        estudiantes = Students.objects.aggregate(**{
+            f'estudiantes_{indice}': Count('id', filter=filtro)
+            for indice, filtro in enumerate(grupos.values())
+        })
+        asistencias = AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=fecha_inicio,
+            attendance__in=['ONTIME', 'LATE']
+        ).aggregate(**{
+            f'asistencias_{indice}': Coalesce(
+                Sum('total', filter=GestionService._a_traves_de(filtro, 'id_student__')), 0
+            )
+            for indice, filtro in enumerate(grupos.values())
+        })
+        totales = {**estudiantes, **asistencias}
+
+        resultado = {}
+        for indice, nombre in enumerate(grupos):
+            total_estudiantes = totales[f'estudiantes_{indice}']
+            asistencias = totales[f'asistencias_{indice}']
+            total_posible = total_estudiantes * total_sesiones
+            porcentaje = (asistencias / total_posible * 100) if total_posible > 0 else 0
+
+            resultado[nombre] = {
+                'total_estudiantes': total_estudiantes,
+                'asistencias': asistencias,
+                'porcentaje': round(porcentaje, 2)
+            }
+        return resultado
+
     @staticmethod
     def analisis_grupos_asistencia(criterio='sexo', periodo='mes'):
         """
@@ -323,98 +386,18 @@ class GestionService:
         else:
             fecha_inicio = now - timedelta(days=30)  # Default: último mes
             
-        # Obtener sesiones y asistencias en el periodo
-        sesiones = Session.objects.filter(date__date__gte=fecha_inicio)
-        
         if criterio == 'sexo':
-            # Agrupar estudiantes por género
-            estudiantes_masculino = Students.objects.filter(gender='Masculino')
-            estudiantes_femenino = Students.objects.filter(gender='Femenino')
-            estudiantes_otro = Students.objects.exclude(gender__in=['Masculino', 'Femenino'])
-            
-            # Para cada grupo, calcular asistencia
-            asistencia_masculino = AttendanceStudent.objects.filter(
-                id_student__in=estudiantes_masculino,
-                id_session__in=sesiones,
-                attendance__in=['ONTIME', 'LATE']
-            ).count()
-            
-            asistencia_femenino = AttendanceStudent.objects.filter(
-                id_student__in=estudiantes_femenino,
-                id_session__in=sesiones,
-                attendance__in=['ONTIME', 'LATE']
-            ).count()
-            
-            asistencia_otro = AttendanceStudent.objects.filter(
-                id_student__in=estudiantes_otro,
-                id_session__in=sesiones,
-                attendance__in=['ONTIME', 'LATE']
-            ).count()
-            
-            # Calcular totales posibles
-            total_posible_masculino = len(estudiantes_masculino) * sesiones.count()
-            total_posible_femenino = len(estudiantes_femenino) * sesiones.count()
-            total_posible_otro = len(estudiantes_otro) * sesiones.count()
-            
-            # Calcular porcentajes
-            porcentaje_masculino = (asistencia_masculino / total_posible_masculino * 100) if total_posible_masculino > 0 else 0
-            porcentaje_femenino = (asistencia_femenino / total_posible_femenino * 100) if total_posible_femenino > 0 else 0
-            porcentaje_otro = (asistencia_otro / total_posible_otro * 100) if total_posible_otro > 0 else 0
-            
-            grupos = {
-                'Masculino': {
-                    'total_estudiantes': len(estudiantes_masculino),
-                    'asistencias': asistencia_masculino,
-                    'porcentaje': round(porcentaje_masculino, 2)
-                },
-                'Femenino': {
-                    'total_estudiantes': len(estudiantes_femenino),
-                    'asistencias': asistencia_femenino,
-                    'porcentaje': round(porcentaje_femenino, 2)
-                },
-                'Otro': {
-                    'total_estudiantes': len(estudiantes_otro),
-                    'asistencias': asistencia_otro,
-                    'porcentaje': round(porcentaje_otro, 2)
-                }
-            }
+            grupos = GestionService._asistencia_por_grupos({
+                'Masculino': Q(gender='Masculino'),
+                'Femenino': Q(gender='Femenino'),
+                # El género sin registrar (NULL) también es 'Otro'
+                'Otro': ~Q(gender__in=['Masculino', 'Femenino']) | Q(gender__isnull=True)
+            }, fecha_inicio)
             
         elif criterio == 'edad':
-            # Definir rangos de edad
-            rangos_edad = {
-                '0-5': {'min': 0, 'max': 5},
-                '6-12': {'min': 6, 'max': 12},
-                '13-17': {'min': 13, 'max': 17},
-                '18+': {'min': 18, 'max': 150}
-            }
-            
-            grupos = {}
-            for rango_nombre, rango_valores in rangos_edad.items():
-                # Filtrar estudiantes por edad
-                estudiantes_rango = []
-                for estudiante in Students.objects.all():
-                    edad = GestionService._calcular_edad(estudiante.birthdate)
-                    if edad and rango_valores['min'] <= edad <= rango_valores['max']:
-                        estudiantes_rango.append(estudiante.id)
-                
-                # Contar asistencias para este rango
-                asistencias_rango = AttendanceStudent.objects.filter(
-                    id_student__in=estudiantes_rango,
-                    id_session__in=sesiones,
-                    attendance__in=['ONTIME', 'LATE']
-                ).count()
-                
-                # Calcular total posible
-                total_posible = len(estudiantes_rango) * sesiones.count()
-                
-                # Calcular porcentaje
-                porcentaje = (asistencias_rango / total_posible * 100) if total_posible > 0 else 0
-                
-                grupos[rango_nombre] = {
-                    'total_estudiantes': len(estudiantes_rango),
-                    'asistencias': asistencias_rango,
-                    'porcentaje': round(porcentaje, 2)
-                }
+            grupos = GestionService._asistencia_por_grupos(
+                GestionService._grupos_por_edad(now), fecha_inicio
+            )
                 
         else:
             grupos = {}
@@ -429,17 +412,17 @@ class GestionService:
         """
         Lista de alumnos que no han asistido en los últimos X días
         """
-        fecha_limite = datetime.now().date() - timedelta(dias=dias)
+        fecha_limite = datetime.now().date() - timedelta(days=dias)
         
-        # Optimización: usar una sola consulta para obtener última asistencia por estudiante
-        estudiantes_con_ultima_asistencia = AttendanceStudent.objects.filter(
+        # Última fecha con asistencia por estudiante, leída del rollup en una sola consulta
+        estudiantes_con_ultima_asistencia = AsistenciaDiariaEstudiante.objects.filter(
             attendance__in=['ONTIME', 'LATE']
         ).values('id_student').annotate(
-            ultima_fecha=max('id_session__date')
-        ).select_related('id_student')
+            ultima_fecha=Max('fecha')
+        )
         
         # Estudiantes activos
-        estudiantes_activos = Students.objects.filter(status=1)
+        estudiantes_activos = Students.objects.filter(status=1).prefetch_related('studentclass_set__id_class')
         
         alumnos_inactivos = []
         estudiantes_dict = {est['id_student']: est['ultima_fecha'] for est in estudiantes_con_ultima_asistencia}
@@ -1,48 +1,60 @@
-from django.db.models import Count, Q
+from collections import Counter
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, ExtractWeekDay
 from datetime import datetime, timedelta
-from api.models import AttendanceStudent, Session, Class
+from api.catalog import CLASS_CATALOG
+from metricas.models import AsistenciaDiariaEstudiante, SesionesDiariasClase
 
 class ImpactoService:
     """Servicio para cálculo de métricas de impacto"""
+
+    ASISTENCIAS = ['ONTIME', 'LATE']
+
     @staticmethod
-    def calcular_tasa_asistencia(periodo, clase_id=None):
-        """
-        Calcula la tasa de asistencia según el periodo y opcionalmente para una clase específica
-        """
+    def _fecha_inicio(periodo):
+        """Fecha desde la que se consideran las sesiones del periodo"""
         now = datetime.now().date()
-        
+
         if periodo == 'semana':
-            start_date = now - timedelta(days=now.weekday())
+            return now - timedelta(days=now.weekday())
         elif periodo == 'mes':
-            start_date = datetime(now.year, now.month, 1).date()
+            return datetime(now.year, now.month, 1).date()
         elif periodo == 'año' or periodo == 'anio':
-            start_date = datetime(now.year, 1, 1).date()
-        else:
-            start_date = now - timedelta(days=30)  # Default: último mes
-            
-        # Base query con filtro de fecha
-        sessions_query = Session.objects.filter(date__gte=start_date)
-        attendance_query = AttendanceStudent.objects.filter(id_session__date__gte=start_date)
-        
-        # Filtrar por clase si se especifica
-        if clase_id:
-            sessions_query = sessions_query.filter(id_class=clase_id)
-            attendance_query = attendance_query.filter(id_session__id_class=clase_id)
-        
-        # Contar sesiones y asistencias con optimización
-        total_sesiones = sessions_query.count()
-        total_asistencias = attendance_query.filter(attendance__in=['ONTIME', 'LATE']).count()
-        
-        # Calcular estudiantes únicos solo una vez
-        estudiantes_unicos = attendance_query.values('id_student').distinct().count()
-        
-        # Calcular tasa
+            return datetime(now.year, 1, 1).date()
+        return now - timedelta(days=30)  # Default: último mes
+
+    @staticmethod
+    def _tasa(total_asistencias, total_sesiones, estudiantes_unicos):
+        """Asistencias sobre asistencias esperadas (sesiones × estudiantes), en porcentaje"""
         if total_sesiones > 0 and estudiantes_unicos > 0:
             asistencias_esperadas = total_sesiones * estudiantes_unicos
-            tasa_asistencia = (total_asistencias / asistencias_esperadas) * 100
-        else:
-            tasa_asistencia = 0
-            
+            return (total_asistencias / asistencias_esperadas) * 100
+        return 0
+
+    @staticmethod
+    def calcular_tasa_asistencia(periodo, clase_id=None):
+        """
+        Calcula la tasa de asistencia según el periodo y opcionalmente para una clase específica
+        """
+        start_date = ImpactoService._fecha_inicio(periodo)
+
+        # Base query sobre los rollups con filtro de fecha
+        sesiones_query = SesionesDiariasClase.objects.filter(fecha__gte=start_date)
+        asistencia_query = AsistenciaDiariaEstudiante.objects.filter(fecha__gte=start_date)
+
+        # Filtrar por clase si se especifica
+        if clase_id:
+            sesiones_query = sesiones_query.filter(id_class=clase_id)
+            asistencia_query = asistencia_query.filter(id_class=clase_id)
+
+        total_sesiones = sesiones_query.aggregate(total=Sum('total_sesiones'))['total'] or 0
+        total_asistencias = asistencia_query.filter(
+            attendance__in=ImpactoService.ASISTENCIAS
+        ).aggregate(total=Sum('total'))['total'] or 0
+        estudiantes_unicos = asistencia_query.values('id_student').distinct().count()
+
+        tasa_asistencia = ImpactoService._tasa(total_asistencias, total_sesiones, estudiantes_unicos)
+
         return {
             'tasa_asistencia': round(tasa_asistencia, 2),
             'total_sesiones': total_sesiones,
@@ -50,52 +62,69 @@ class ImpactoService:
             'estudiantes_unicos': estudiantes_unicos,
             'periodo': periodo
         }
-    
+
     @staticmethod
     def calcular_asistencia_por_clase(periodo):
-        """Calcula tasas de asistencia por clase"""
-        clases = Class.objects.all()
+        """
+        Calcula tasas de asistencia por clase con una agregación agrupada por id_class
+        sobre cada rollup, sin importar cuántas clases existan
+        """
+        start_date = ImpactoService._fecha_inicio(periodo)
+
+        sesiones_por_clase = dict(
+            SesionesDiariasClase.objects.filter(
+                fecha__gte=start_date
+            ).values('id_class').annotate(
+                total=Sum('total_sesiones')
+            ).values_list('id_class', 'total')
+        )
+
+        asistencias_por_clase = {
+            item['id_class']: item
+            for item in AsistenciaDiariaEstudiante.objects.filter(
+                fecha__gte=start_date
+            ).values('id_class').annotate(
+                total_asistencias=Coalesce(Sum('total', filter=Q(attendance__in=ImpactoService.ASISTENCIAS)), 0),
+                estudiantes_unicos=Count('id_student', distinct=True)
+            )
+        }
+
         resultados = []
-        
-        for clase in clases:
-            data = ImpactoService.calcular_tasa_asistencia(periodo, clase.id)
+        for clase in CLASS_CATALOG.values():
+            total_sesiones = sesiones_por_clase.get(clase['id'], 0)
+            asistencias = asistencias_por_clase.get(clase['id'], {})
+            total_asistencias = asistencias.get('total_asistencias', 0)
+            estudiantes_unicos = asistencias.get('estudiantes_unicos', 0)
+            tasa_asistencia = ImpactoService._tasa(total_asistencias, total_sesiones, estudiantes_unicos)
+
             resultados.append({
-                'clase_id': clase.id,
-                'clase_nombre': clase.name,
-                'tasa_asistencia': data['tasa_asistencia'],
-                'total_sesiones': data['total_sesiones'],
-                'total_asistencias': data['total_asistencias'],
-                'estudiantes_unicos': data['estudiantes_unicos']
+                'clase_id': clase['id'],
+                'clase_nombre': clase['name'],
+                'tasa_asistencia': round(tasa_asistencia, 2),
+                'total_sesiones': total_sesiones,
+                'total_asistencias': total_asistencias,
+                'estudiantes_unicos': estudiantes_unicos
             })
-        
+
         return resultados
-    
+
     @staticmethod
     def calcular_alumnos_asistencia_regular(periodo, umbral=0.5):
         """Calcula alumnos con asistencia regular"""
-        now = datetime.now().date()
-        
-        if periodo == 'semana':
-            start_date = now - timedelta(days=now.weekday())
-        elif periodo == 'mes':
-            start_date = datetime(now.year, now.month, 1).date()
-        elif periodo == 'año' or periodo == 'anio':
-            start_date = datetime(now.year, 1, 1).date()
-        else:
-            start_date = now - timedelta(days=30)
-        
-        # Obtener asistencias por estudiante
-        attendance_data = AttendanceStudent.objects.filter(
-            id_session__date__gte=start_date
+        start_date = ImpactoService._fecha_inicio(periodo)
+
+        # Obtener asistencias por estudiante desde el rollup
+        attendance_data = AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=start_date
         ).values(
-            'id_student__id', 
-            'id_student__name', 
+            'id_student__id',
+            'id_student__name',
             'id_student__last_name'
         ).annotate(
-            total_asistencias=Count('id', filter=Q(attendance__in=['ONTIME', 'LATE'])),
-            total_registros=Count('id')
+            total_asistencias=Coalesce(Sum('total', filter=Q(attendance__in=ImpactoService.ASISTENCIAS)), 0),
+            total_registros=Sum('total')
         )
-        
+
         alumnos_regulares = []
         for data in attendance_data:
             if data['total_registros'] > 0:
@@ -108,95 +137,291 @@ class ImpactoService:
                         'total_sesiones': data['total_registros'],
                         'tasa_asistencia': round(tasa * 100, 2)
                     })
-        
+
         return {
             'alumnos_regulares': alumnos_regulares,
             'total_alumnos_regulares': len(alumnos_regulares),
             'umbral_usado': umbral * 100
         }
-    
+
     @staticmethod
     def calcular_frecuencia_asistencia(periodo):
         """Calcula distribución de alumnos según número de asistencias"""
-        now = datetime.now().date()
-        
-        if periodo == 'semana':
-            start_date = now - timedelta(days=now.weekday())
-        elif periodo == 'mes':
-            start_date = datetime(now.year, now.month, 1).date()
-        elif periodo == 'año' or periodo == 'anio':
-            start_date = datetime(now.year, 1, 1).date()
-        else:
-            start_date = now - timedelta(days=30)
-        
+        start_date = ImpactoService._fecha_inicio(periodo)
+
         # Contar asistencias por estudiante
-        frecuencias = AttendanceStudent.objects.filter(
-            id_session__date__gte=start_date,
-            attendance__in=['ONTIME', 'LATE']
+        asistencias_por_estudiante = AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=start_date,
+            attendance__in=ImpactoService.ASISTENCIAS
         ).values('id_student').annotate(
-            num_asistencias=Count('id')
-        ).values('num_asistencias').annotate(
-            num_estudiantes=Count('id_student')
-        ).order_by('num_asistencias')
-        
-        return list(frecuencias)
-    
+            num_asistencias=Sum('total')
+        ).values_list('num_asistencias', flat=True)
+
+        frecuencias = Counter(asistencias_por_estudiante)
+
+        return [
+            {'num_asistencias': num_asistencias, 'num_estudiantes': frecuencias[num_asistencias]}
+            for num_asistencias in sorted(frecuencias)
+        ]
+
     @staticmethod
-    def calcular_retencion_alumnos(meses=6):
-        """Calcula retención de alumnos mes a mes"""
+    def _meses_retencion(meses):
+        """Rangos (inicio, fin) de los últimos `meses` meses, del más reciente al más antiguo"""
         now = datetime.now().date()
-        resultados = []
-        
+        rangos = []
         for i in range(meses):
             mes_inicio = (now.replace(day=1) - timedelta(days=i*30)).replace(day=1)
             mes_fin = (mes_inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            
-            estudiantes_activos = AttendanceStudent.objects.filter(
-                id_session__date__range=[mes_inicio, mes_fin]
+            rangos.append((mes_inicio, mes_fin))
+        return rangos
+
+    @staticmethod
+    def calcular_retencion_alumnos(meses=6):
+        """Calcula retención de alumnos mes a mes"""
+        resultados = []
+
+        for mes_inicio, mes_fin in ImpactoService._meses_retencion(meses):
+            estudiantes_activos = AsistenciaDiariaEstudiante.objects.filter(
+                fecha__range=[mes_inicio, mes_fin]
             ).values('id_student').distinct().count()
-            
+
             resultados.append({
                 'mes': mes_inicio.strftime('%Y-%m'),
                 'estudiantes_activos': estudiantes_activos
             })
-        
+
         return list(reversed(resultados))
-    
+
+    # Numeración de ExtractWeekDay, igual en MySQL y SQLite
+    DIAS_SEMANA = {
+        1: 'Domingo', 2: 'Lunes', 3: 'Martes', 4: 'Miércoles',
+        5: 'Jueves', 6: 'Viernes', 7: 'Sábado'
+    }
+
+    @staticmethod
+    def asistencias_por_dia_semana(start_date, valores=None):
+        """
+        Total de asistencias por día de la semana desde start_date en una sola consulta.
+        Retorna un diccionario con los siete días (1=Domingo ... 7=Sábado), con 0 si no hubo asistencias.
+        """
+        valores = valores or ImpactoService.ASISTENCIAS
+
+        totales = AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=start_date,
+            attendance__in=valores
+        ).annotate(
+            dia_semana=ExtractWeekDay('fecha')
+        ).values('dia_semana').annotate(
+            total_asistencias=Sum('total')
+        ).order_by()
+
+        por_dia = {dia: 0 for dia in ImpactoService.DIAS_SEMANA}
+        for item in totales:
+            por_dia[item['dia_semana']] = item['total_asistencias']
+        return por_dia
+
     @staticmethod
     def calcular_dia_mayor_asistencia(periodo):
         """Calcula días con mayor participación"""
-        now = datetime.now().date()
-        
-        if periodo == 'semana':
-            start_date = now - timedelta(days=now.weekday())
-        elif periodo == 'mes':
-            start_date = datetime(now.year, now.month, 1).date()
-        elif periodo == 'año' or periodo == 'anio':
-            start_date = datetime(now.year, 1, 1).date()
-        else:
-            start_date = now - timedelta(days=30)
-        
-        # Agrupar por día de la semana
-        asistencias_por_dia = AttendanceStudent.objects.filter(
-            id_session__date__gte=start_date,
-            attendance__in=['ONTIME', 'LATE']
-        ).extra(
-            select={'dia_semana': 'DAYOFWEEK(id_session.date)'
-        }).values('dia_semana').annotate(
-            total_asistencias=Count('id')
-        ).order_by('-total_asistencias')
-        
-        # Mapear números a nombres de días
-        dias_nombres = {
-            1: 'Domingo', 2: 'Lunes', 3: 'Martes', 4: 'Miércoles',
-            5: 'Jueves', 6: 'Viernes', 7: 'Sábado'
+        start_date = ImpactoService._fecha_inicio(periodo)
+
+        por_dia = ImpactoService.asistencias_por_dia_semana(start_date)
+
+        asistencias_por_dia = [
+            {
+                'dia_semana': dia,
+                'total_asistencias': total,
+                'nombre_dia': ImpactoService.DIAS_SEMANA[dia]
+            }
+            for dia, total in por_dia.items()
+            if total > 0
+        ]
+
+        return sorted(asistencias_por_dia, key=lambda item: item['total_asistencias'], reverse=True)
+
+    @staticmethod
+    def promedio_sesiones(periodo):
+        """Promedio de sesiones asistidas por alumno en el periodo"""
+        start_date = ImpactoService._fecha_inicio(periodo)
+
+        asistencia_query = AsistenciaDiariaEstudiante.objects.filter(fecha__gte=start_date)
+        total_asistencias = asistencia_query.filter(
+            attendance__in=ImpactoService.ASISTENCIAS
+        ).aggregate(total=Sum('total'))['total'] or 0
+        estudiantes_unicos = asistencia_query.values('id_student').distinct().count()
+
+        promedio = total_asistencias / estudiantes_unicos if estudiantes_unicos > 0 else 0
+
+        return {
+            'promedio_sesiones': round(promedio, 2),
+            'total_asistencias': total_asistencias,
+            'estudiantes_unicos': estudiantes_unicos,
+            'periodo': periodo
         }
-        
-        for item in asistencias_por_dia:
-            item['nombre_dia'] = dias_nombres.get(item['dia_semana'], 'Desconocido')
-        
-        return list(asistencias_por_dia)
-    
+
+    # Métricas disponibles en el resumen, en el orden en que se devuelven
+    METRICAS_RESUMEN = [
+        'tasa_asistencia',
+        'asistencia_por_clase',
+        'alumnos_asistencia_regular',
+        'frecuencia_asistencia',
+        'retencion_alumnos',
+        'dia_mayor_asistencia',
+        'promedio_sesiones'
+    ]
+
+    @staticmethod
+    def calcular_resumen(periodo, include=None, umbral=0.5, meses=6):
+        """
+        Calcula todas las métricas de impacto (o las indicadas en `include`) a partir de
+        una sola lectura del rollup de asistencia, en lugar de una consulta por métrica.
+        Cada métrica devuelve lo mismo que su endpoint individual.
+        """
+        include = include or ImpactoService.METRICAS_RESUMEN
+        start_date = ImpactoService._fecha_inicio(periodo)
+
+        # La retención mira meses completos hacia atrás, que pueden empezar antes del periodo
+        rangos_retencion = ImpactoService._meses_retencion(meses) if 'retencion_alumnos' in include else []
+        lectura_desde = min([start_date] + [inicio for inicio, _ in rangos_retencion])
+
+        filas = list(AsistenciaDiariaEstudiante.objects.filter(
+            fecha__gte=lectura_desde
+        ).values(
+            'id_student', 'id_student__name', 'id_student__last_name',
+            'id_class', 'fecha', 'attendance', 'total'
+        ))
+        filas_periodo = [fila for fila in filas if fila['fecha'] >= start_date]
+
+        # Acumulados compartidos por las métricas del periodo
+        asistencias_total = 0
+        estudiantes = set()
+        por_clase = {}
+        por_estudiante = {}
+        por_dia = {dia: 0 for dia in ImpactoService.DIAS_SEMANA}
+        for fila in filas_periodo:
+            asistio = fila['attendance'] in ImpactoService.ASISTENCIAS
+            asistencias = fila['total'] if asistio else 0
+
+            asistencias_total += asistencias
+            estudiantes.add(fila['id_student'])
+
+            clase = por_clase.setdefault(fila['id_class'], {'asistencias': 0, 'estudiantes': set()})
+            clase['asistencias'] += asistencias
+            clase['estudiantes'].add(fila['id_student'])
+
+            estudiante = por_estudiante.setdefault(fila['id_student'], {
+                'nombre': f"{fila['id_student__name']} {fila['id_student__last_name']}",
+                'asistencias': 0,
+                'registros': 0,
+                'asistio': False
+            })
+            estudiante['asistencias'] += asistencias
+            estudiante['registros'] += fila['total']
+            estudiante['asistio'] = estudiante['asistio'] or asistio
+
+            if asistio:
+                # Misma numeración que ExtractWeekDay: 1=Domingo ... 7=Sábado
+                por_dia[fila['fecha'].isoweekday() % 7 + 1] += fila['total']
+
+        sesiones_por_clase = {}
+        if 'tasa_asistencia' in include or 'asistencia_por_clase' in include:
+            sesiones_por_clase = dict(
+                SesionesDiariasClase.objects.filter(
+                    fecha__gte=start_date
+                ).values('id_class').annotate(
+                    total=Sum('total_sesiones')
+                ).values_list('id_class', 'total')
+            )
+
+        resumen = {'periodo': periodo}
+
+        if 'tasa_asistencia' in include:
+            total_sesiones = sum(sesiones_por_clase.values())
+            resumen['tasa_asistencia'] = {
+                'tasa_asistencia': round(ImpactoService._tasa(asistencias_total, total_sesiones, len(estudiantes)), 2),
+                'total_sesiones': total_sesiones,
+                'total_asistencias': asistencias_total,
+                'estudiantes_unicos': len(estudiantes),
+                'periodo': periodo
+            }
+
+        if 'asistencia_por_clase' in include:
+            resultados = []
+            for clase in CLASS_CATALOG.values():
+                total_sesiones = sesiones_por_clase.get(clase['id'], 0)
+                datos_clase = por_clase.get(clase['id'], {'asistencias': 0, 'estudiantes': set()})
+                estudiantes_unicos = len(datos_clase['estudiantes'])
+                resultados.append({
+                    'clase_id': clase['id'],
+                    'clase_nombre': clase['name'],
+                    'tasa_asistencia': round(ImpactoService._tasa(datos_clase['asistencias'], total_sesiones, estudiantes_unicos), 2),
+                    'total_sesiones': total_sesiones,
+                    'total_asistencias': datos_clase['asistencias'],
+                    'estudiantes_unicos': estudiantes_unicos
+                })
+            resumen['asistencia_por_clase'] = resultados
+
+        if 'alumnos_asistencia_regular' in include:
+            alumnos_regulares = []
+            for estudiante_id in sorted(por_estudiante):
+                datos = por_estudiante[estudiante_id]
+                if datos['registros'] > 0:
+                    tasa = datos['asistencias'] / datos['registros']
+                    if tasa >= umbral:
+                        alumnos_regulares.append({
+                            'estudiante_id': estudiante_id,
+                            'nombre': datos['nombre'],
+                            'asistencias': datos['asistencias'],
+                            'total_sesiones': datos['registros'],
+                            'tasa_asistencia': round(tasa * 100, 2)
+                        })
+            resumen['alumnos_asistencia_regular'] = {
+                'alumnos_regulares': alumnos_regulares,
+                'total_alumnos_regulares': len(alumnos_regulares),
+                'umbral_usado': umbral * 100
+            }
+
+        if 'frecuencia_asistencia' in include:
+            frecuencias = Counter(
+                datos['asistencias'] for datos in por_estudiante.values() if datos['asistio']
+            )
+            resumen['frecuencia_asistencia'] = [
+                {'num_asistencias': num_asistencias, 'num_estudiantes': frecuencias[num_asistencias]}
+                for num_asistencias in sorted(frecuencias)
+            ]
+
+        if 'retencion_alumnos' in include:
+            resultados = []
+            for mes_inicio, mes_fin in rangos_retencion:
+                activos = {fila['id_student'] for fila in filas if mes_inicio <= fila['fecha'] <= mes_fin}
+                resultados.append({
+                    'mes': mes_inicio.strftime('%Y-%m'),
+                    'estudiantes_activos': len(activos)
+                })
+            resumen['retencion_alumnos'] = list(reversed(resultados))
+
+        if 'dia_mayor_asistencia' in include:
+            resumen['dia_mayor_asistencia'] = sorted([
+                {
+                    'dia_semana': dia,
+                    'total_asistencias': total,
+                    'nombre_dia': ImpactoService.DIAS_SEMANA[dia]
+                }
+                for dia, total in por_dia.items()
+                if total > 0
+            ], key=lambda item: item['total_asistencias'], reverse=True)
+
+        if 'promedio_sesiones' in include:
+            promedio = asistencias_total / len(estudiantes) if estudiantes else 0
+            resumen['promedio_sesiones'] = {
+                'promedio_sesiones': round(promedio, 2),
+                'total_asistencias': asistencias_total,
+                'estudiantes_unicos': len(estudiantes),
+                'periodo': periodo
+            }
+
+        return resumen
+
 
 class GestionService:
     """Servicio para cálculo de métricas de gestión"""
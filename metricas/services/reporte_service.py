@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from metricas.models import ReporteExcel
+from .cache_service import MetricasCacheService
+from .excel_service import ExcelService
+
+logger = logging.getLogger(__name__)
+
+class ReporteService:
+    """
+    Generación de reportes Excel fuera del ciclo request/response. Los trabajos se
+    registran en ReporteExcel y un pool de hilos del proceso los escribe en disco.
+    """
+
+    TIPOS = ['impacto', 'gestion']
+
+    # Un trabajo pendiente o en proceso que no avanza en este tiempo se considera
+    # abandonado (p. ej. el worker que lo tenía se reinició) y no se reutiliza
+    TIEMPO_MAXIMO = timedelta(minutes=15)
+
+    _executor = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _pool():
+        with ReporteService._lock:
+            if ReporteService._executor is None:
+                ReporteService._executor = ThreadPoolExecutor(
+                    max_workers=settings.REPORTES_MAX_WORKERS,
+                    thread_name_prefix='reportes'
+                )
+            return ReporteService._executor
+
+    @staticmethod
+    def _firma(tipo, parametros):
+        """Tipo, parámetros y versión de datos vigente; la fecha porque los periodos son relativos a hoy"""
+        contenido = json.dumps({
+            'tipo': tipo,
+            'parametros': parametros,
+            'version': MetricasCacheService.version(),
+            'hoy': date.today().isoformat()
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(contenido.encode()).hexdigest()
+
+    @staticmethod
+    def _reutilizable(reporte):
+        if reporte.estado == ReporteExcel.COMPLETADO:
+            return bool(reporte.archivo) and os.path.exists(reporte.archivo)
+        if reporte.estado in (ReporteExcel.PENDIENTE, ReporteExcel.PROCESANDO):
+            return reporte.updated_at >= datetime.now() - ReporteService.TIEMPO_MAXIMO
+        return False
+
+    @staticmethod
+    def solicitar(tipo, parametros):
+        """
+        Registra un trabajo para el reporte pedido, o devuelve uno existente con la misma
+        firma si sigue vigente. Retorna (reporte, reutilizado).
+        """
+        firma = ReporteService._firma(tipo, parametros)
+
+        existente = ReporteExcel.objects.filter(firma=firma).exclude(
+            estado=ReporteExcel.ERROR
+        ).order_by('-id').first()
+        if existente and ReporteService._reutilizable(existente):
+            return existente, True
+
+        reporte = ReporteExcel.objects.create(tipo=tipo, parametros=parametros, firma=firma)
+        transaction.on_commit(lambda: ReporteService._pool().submit(ReporteService.procesar, reporte.id))
+        return reporte, False
+
+    @staticmethod
+    def _generar(tipo, parametros, ruta):
+        # Ambos informes se escriben directo en el archivo, sin armar el libro completo en memoria
+        if tipo == 'impacto':
+            # Archivo abierto y no ruta: pandas rechaza rutas que no terminan en .xlsx
+            with open(ruta, 'wb') as archivo:
+                ExcelService.escribir_excel_impacto(
+                    archivo,
+                    parametros.get('periodo', 'mes'),
+                    parametros.get('umbral', 0.5)
+                )
+        else:
+            fecha_inicio = parametros.get('fecha_inicio')
+            ExcelService.escribir_excel_gestion(
+                ruta,
+                fecha=parametros.get('fecha'),
+                fecha_inicio=datetime.strptime(fecha_inicio, '%Y-%m-%d').date() if fecha_inicio else None,
+                mes=parametros.get('mes'),
+                anio=parametros.get('anio'),
+                clase_id=parametros.get('clase_id')
+            )
+
+    @staticmethod
+    def procesar(reporte_id):
+        """Genera el archivo de un trabajo. Se ejecuta en un hilo del pool"""
+        close_old_connections()
+        try:
+            reporte = ReporteExcel.objects.get(id=reporte_id)
+            reporte.estado = ReporteExcel.PROCESANDO
+            reporte.save(update_fields=['estado', 'updated_at'])
+
+            os.makedirs(settings.REPORTES_DIR, exist_ok=True)
+            destino = os.path.join(settings.REPORTES_DIR, f'{reporte.tipo}_{reporte.id}_{reporte.firma[:12]}.xlsx')
+            temporal = f'{destino}.tmp'
+
+            ReporteService._generar(reporte.tipo, reporte.parametros, temporal)
+            # Renombrar al final para que nunca se sirva un archivo a medio escribir
+            os.replace(temporal, destino)
+
+            reporte.archivo = destino
+            reporte.estado = ReporteExcel.COMPLETADO
+            reporte.save(update_fields=['archivo', 'estado', 'updated_at'])
+
+        except Exception as e:
+            logger.exception("Error al generar el reporte %s", reporte_id)
+            ReporteExcel.objects.filter(id=reporte_id).update(
+                estado=ReporteExcel.ERROR,
+                error=str(e),
+                updated_at=datetime.now()
+            )
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def limpiar(dias=7):
+        """
+        Elimina los trabajos, y sus archivos, con más de `dias` días de antigüedad.
+        Los pendientes o en proceso se conservan: su hilo todavía puede escribir el archivo.
+        """
+        antiguos = ReporteExcel.objects.filter(
+            created_at__lt=datetime.now() - timedelta(days=dias)
+        ).exclude(
+            estado__in=[ReporteExcel.PENDIENTE, ReporteExcel.PROCESANDO]
+        )
+        for ruta in antiguos.exclude(archivo='').values_list('archivo', flat=True):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+        eliminados, _ = antiguos.delete()
+        return eliminados
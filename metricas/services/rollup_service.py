@@ -0,0 +1,133 @@
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce, TruncDate
+from api.models import AttendanceStudent, Session
+from metricas.models import AsistenciaDiariaEstudiante, SesionesDiariasClase
+
+class RollupAsistenciaService:
+    """Mantenimiento de los rollups de asistencia que leen las métricas"""
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def refrescar_clase_dia(clase_id, fecha):
+        """
+        Recalcula los rollups de una clase para un día a partir de attendance_student.
+        Solo recorre las asistencias de ese día, por lo que el costo no depende del historial.
+        """
+        inicio = datetime.combine(fecha, time.min)
+        fin = inicio + timedelta(days=1)
+
+        with transaction.atomic():
+            registros = AttendanceStudent.objects.filter(
+                id_session__id_class=clase_id,
+                id_session__date__gte=inicio,
+                id_session__date__lt=fin
+            ).annotate(
+                valor=Coalesce('attendance', Value(''))
+            ).values('id_student', 'valor').annotate(
+                total=Count('id')
+            ).order_by()
+
+            total_sesiones = Session.objects.filter(
+                id_class=clase_id,
+                date__gte=inicio,
+                date__lt=fin
+            ).count()
+
+            AsistenciaDiariaEstudiante.objects.filter(id_class=clase_id, fecha=fecha).delete()
+            SesionesDiariasClase.objects.filter(id_class=clase_id, fecha=fecha).delete()
+
+            filas = [
+                AsistenciaDiariaEstudiante(
+                    id_student_id=registro['id_student'],
+                    id_class_id=clase_id,
+                    fecha=fecha,
+                    attendance=registro['valor'],
+                    total=registro['total']
+                )
+                for registro in registros
+            ]
+            AsistenciaDiariaEstudiante.objects.bulk_create(filas, batch_size=RollupAsistenciaService.BATCH_SIZE)
+
+            if total_sesiones:
+                SesionesDiariasClase.objects.create(
+                    id_class_id=clase_id,
+                    fecha=fecha,
+                    total_sesiones=total_sesiones,
+                    total_registros=sum(fila.total for fila in filas)
+                )
+
+    @staticmethod
+    def refrescar_sesiones(sesiones):
+        """Recalcula los rollups de los días (clase, fecha) a los que pertenecen las sesiones"""
+        dias = {(sesion.id_class_id, sesion.date.date()) for sesion in sesiones if sesion.date}
+        for clase_id, fecha in dias:
+            RollupAsistenciaService.refrescar_clase_dia(clase_id, fecha)
+
+    @staticmethod
+    def reconstruir():
+        """
+        Reconstruye ambos rollups desde cero recorriendo todo attendance_student.
+        Retorna la cantidad de filas generadas en cada tabla.
+        """
+        batch_size = RollupAsistenciaService.BATCH_SIZE
+
+        with transaction.atomic():
+            AsistenciaDiariaEstudiante.objects.all().delete()
+            SesionesDiariasClase.objects.all().delete()
+
+            registros = AttendanceStudent.objects.filter(
+                id_session__date__isnull=False
+            ).annotate(
+                fecha=TruncDate('id_session__date'),
+                valor=Coalesce('attendance', Value(''))
+            ).values('id_student', 'id_session__id_class', 'fecha', 'valor').annotate(
+                total=Count('id')
+            ).order_by()
+
+            registros_por_dia = {}
+            total_filas = 0
+            lote = []
+            for registro in registros.iterator(chunk_size=batch_size):
+                clave = (registro['id_session__id_class'], registro['fecha'])
+                registros_por_dia[clave] = registros_por_dia.get(clave, 0) + registro['total']
+                lote.append(AsistenciaDiariaEstudiante(
+                    id_student_id=registro['id_student'],
+                    id_class_id=registro['id_session__id_class'],
+                    fecha=registro['fecha'],
+                    attendance=registro['valor'],
+                    total=registro['total']
+                ))
+                if len(lote) >= batch_size:
+                    AsistenciaDiariaEstudiante.objects.bulk_create(lote)
+                    total_filas += len(lote)
+                    lote = []
+            if lote:
+                AsistenciaDiariaEstudiante.objects.bulk_create(lote)
+                total_filas += len(lote)
+
+            sesiones = Session.objects.filter(
+                date__isnull=False
+            ).annotate(
+                fecha=TruncDate('date')
+            ).values('id_class', 'fecha').annotate(
+                total=Count('id_session')
+            ).order_by()
+
+            filas_sesiones = [
+                SesionesDiariasClase(
+                    id_class_id=sesion['id_class'],
+                    fecha=sesion['fecha'],
+                    total_sesiones=sesion['total'],
+                    total_registros=registros_por_dia.get((sesion['id_class'], sesion['fecha']), 0)
+                )
+                for sesion in sesiones
+            ]
+            SesionesDiariasClase.objects.bulk_create(filas_sesiones, batch_size=batch_size)
+
+        return {
+            'asistencia_estudiante': total_filas,
+            'sesiones_clase': len(filas_sesiones)
+        }
@@ -0,0 +1,609 @@
+import datetime
+import io
+import os
+import shutil
+import tempfile
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import AttendanceStudent, Class, Session, StudentClass, Students, Volunteers
+from api.tests import UnmanagedTablesTestCase
+from .models import AsistenciaDiariaEstudiante, ReporteExcel
+from .services.cache_service import MetricasCacheService
+from .services.excel_service import ExcelService
+from .services.gestion_service import GestionService
+from .services.impacto_service import ImpactoService
+from .services.reporte_service import ReporteService
+from .services.rollup_service import RollupAsistenciaService
+
+ASISTENCIAS = ['ONTIME', 'LATE']
+PERIODOS = ['semana', 'mes', 'anio', 'otro']
+
+
+def _fecha_inicio(periodo):
+    return ImpactoService._fecha_inicio(periodo)
+
+
+def _raw_tasa_asistencia(periodo, clase_id=None):
+    """Tasa de asistencia calculada directamente sobre sessions y attendance_student"""
+    start_date = _fecha_inicio(periodo)
+    sesiones = Session.objects.filter(date__gte=start_date)
+    asistencia = AttendanceStudent.objects.filter(id_session__date__gte=start_date)
+    if clase_id:
+        sesiones = sesiones.filter(id_class=clase_id)
+        asistencia = asistencia.filter(id_session__id_class=clase_id)
+
+    total_sesiones = sesiones.count()
+    total_asistencias = asistencia.filter(attendance__in=ASISTENCIAS).count()
+    estudiantes_unicos = asistencia.values('id_student').distinct().count()
+    tasa = ImpactoService._tasa(total_asistencias, total_sesiones, estudiantes_unicos)
+    return {
+        'tasa_asistencia': round(tasa, 2),
+        'total_sesiones': total_sesiones,
+        'total_asistencias': total_asistencias,
+        'estudiantes_unicos': estudiantes_unicos,
+        'periodo': periodo
+    }
+
+
+def _raw_asistencia_por_clase(periodo):
+    resultados = []
+    for clase in Class.objects.order_by('id'):
+        datos = _raw_tasa_asistencia(periodo, clase.id)
+        resultados.append({
+            'clase_id': clase.id,
+            'clase_nombre': clase.name,
+            'tasa_asistencia': datos['tasa_asistencia'],
+            'total_sesiones': datos['total_sesiones'],
+            'total_asistencias': datos['total_asistencias'],
+            'estudiantes_unicos': datos['estudiantes_unicos']
+        })
+    return resultados
+
+
+def _raw_alumnos_asistencia_regular(periodo, umbral):
+    por_estudiante = AttendanceStudent.objects.filter(
+        id_session__date__gte=_fecha_inicio(periodo)
+    ).values('id_student', 'id_student__name', 'id_student__last_name').annotate(
+        asistencias=Count('id', filter=Q(attendance__in=ASISTENCIAS)),
+        registros=Count('id')
+    ).order_by('id_student')
+
+    alumnos = []
+    for fila in por_estudiante:
+        tasa = fila['asistencias'] / fila['registros']
+        if tasa >= umbral:
+            alumnos.append({
+                'estudiante_id': fila['id_student'],
+                'nombre': f"{fila['id_student__name']} {fila['id_student__last_name']}",
+                'asistencias': fila['asistencias'],
+                'total_sesiones': fila['registros'],
+                'tasa_asistencia': round(tasa * 100, 2)
+            })
+    return {'alumnos_regulares': alumnos, 'total_alumnos_regulares': len(alumnos), 'umbral_usado': umbral * 100}
+
+
+def _raw_frecuencia_asistencia(periodo):
+    frecuencias = Counter(Counter(AttendanceStudent.objects.filter(
+        id_session__date__gte=_fecha_inicio(periodo),
+        attendance__in=ASISTENCIAS
+    ).values_list('id_student', flat=True)).values())
+    return [{'num_asistencias': num, 'num_estudiantes': frecuencias[num]} for num in sorted(frecuencias)]
+
+
+def _raw_retencion_alumnos(meses):
+    return list(reversed([
+        {
+            'mes': inicio.strftime('%Y-%m'),
+            'estudiantes_activos': AttendanceStudent.objects.filter(
+                id_session__date__date__range=[inicio, fin]
+            ).values('id_student').distinct().count()
+        }
+        for inicio, fin in ImpactoService._meses_retencion(meses)
+    ]))
+
+
+def _raw_dia_mayor_asistencia(periodo):
+    por_dia = Counter(
+        fecha.isoweekday() % 7 + 1
+        for fecha in AttendanceStudent.objects.filter(
+            id_session__date__gte=_fecha_inicio(periodo),
+            attendance__in=ASISTENCIAS
+        ).values_list('id_session__date', flat=True)
+    )
+    return sorted([
+        {'dia_semana': dia, 'total_asistencias': por_dia[dia], 'nombre_dia': ImpactoService.DIAS_SEMANA[dia]}
+        for dia in sorted(por_dia)
+    ], key=lambda item: item['total_asistencias'], reverse=True)
+
+
+def _raw_promedio_sesiones(periodo):
+    asistencia = AttendanceStudent.objects.filter(id_session__date__gte=_fecha_inicio(periodo))
+    total_asistencias = asistencia.filter(attendance__in=ASISTENCIAS).count()
+    estudiantes_unicos = asistencia.values('id_student').distinct().count()
+    promedio = total_asistencias / estudiantes_unicos if estudiantes_unicos else 0
+    return {
+        'promedio_sesiones': round(promedio, 2),
+        'total_asistencias': total_asistencias,
+        'estudiantes_unicos': estudiantes_unicos,
+        'periodo': periodo
+    }
+
+
+def _raw_asistencia_por_estudiante(fecha_inicio, fecha_fin, clase_id=None):
+    """(total de sesiones, {id_student: asistencias}) del rango, como lo leían las listas de gestión"""
+    sesiones = Session.objects.filter(date__date__gte=fecha_inicio, date__date__lte=fecha_fin)
+    if clase_id:
+        sesiones = sesiones.filter(id_class=clase_id)
+    asistencias = dict(
+        AttendanceStudent.objects.filter(id_session__in=sesiones).values('id_student').annotate(
+            total=Count('id', filter=Q(attendance__in=ASISTENCIAS))
+        ).values_list('id_student', 'total')
+    )
+    return sesiones.count(), asistencias
+
+
+class RollupEquivalenceTest(UnmanagedTablesTestCase):
+    """
+    Las métricas leídas de los rollups deben coincidir con las mismas métricas
+    calculadas directamente sobre attendance_student y sessions.
+    """
+
+    # Valores que se reparten entre las asistencias; None se guarda como '' en el rollup
+    VALORES = ['ONTIME', 'LATE', 'ABSENT', '', None, 'ONTIME', 'JUSTIFIED']
+
+    def setUp(self):
+        cache.clear()
+        hoy = datetime.date.today()
+        self.hoy = hoy
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1)
+
+        self.ingles = Class.objects.create(name='Inglés')
+        self.arte = Class.objects.create(name='Arte')
+        # Sin sesiones: aparece en las métricas por clase con ceros
+        self.musica = Class.objects.create(name='Música')
+
+        def nacido_hace(anios):
+            return GestionService._restar_anios(hoy, anios) - datetime.timedelta(days=10)
+
+        self.students = [
+            Students.objects.create(name='Ana', last_name='Pérez', document_id='S1', gender='Femenino',
+                                    birthdate=nacido_hace(8), status=1),
+            Students.objects.create(name='Beto', last_name='Quispe', document_id='S2', gender='Masculino',
+                                    birthdate=nacido_hace(15), status=1),
+            Students.objects.create(name='Caro', last_name='Ríos', document_id='S3', gender=None,
+                                    birthdate=nacido_hace(20), status=1),
+            Students.objects.create(name='Dani', last_name=None, document_id='S4', gender='No binario',
+                                    birthdate=None, status=1),
+        ]
+        for student in self.students:
+            StudentClass.objects.create(id_class=self.ingles, id_student=student)
+        arte = [self.students[0], self.students[2]]
+        for student in arte:
+            StudentClass.objects.create(id_class=self.arte, id_student=student)
+
+        def en(fecha, hora):
+            return datetime.datetime.combine(fecha, datetime.time(hora, 0))
+
+        # Dos sesiones de la misma clase el mismo día, días de otras semanas y meses, y una sesión de hace más de un año
+        sesiones = [
+            (self.ingles, en(hoy, 9), self.students),
+            (self.ingles, en(hoy, 16), self.students),
+            (self.ingles, en(hoy.replace(day=1), 10), self.students),
+            (self.ingles, en(hoy - datetime.timedelta(days=3), 10), self.students),
+            (self.ingles, en(hoy - datetime.timedelta(days=45), 10), self.students[:3]),
+            (self.arte, en(hoy, 11), arte),
+            (self.arte, en(hoy - datetime.timedelta(days=20), 11), arte),
+            (self.arte, en(hoy - datetime.timedelta(days=400), 11), arte),
+        ]
+        indice = 0
+        for num, (clase, fecha, estudiantes) in enumerate(sesiones, start=1):
+            session = Session.objects.create(id_class=clase, num_session=num, date=fecha)
+            for student in estudiantes:
+                AttendanceStudent.objects.create(
+                    id_session=session, id_student=student, id_volunteer=volunteer,
+                    attendance=self.VALORES[indice % len(self.VALORES)]
+                )
+                indice += 1
+        # Una sesión sin asistencia cuenta como sesión pero no agrega estudiantes
+        Session.objects.create(id_class=self.arte, num_session=len(sesiones) + 1, date=en(hoy, 18))
+
+        RollupAsistenciaService.reconstruir()
+
+    def test_impacto_matches_raw_queries(self):
+        for periodo in PERIODOS:
+            with self.subTest(periodo=periodo):
+                self.assertEqual(ImpactoService.calcular_tasa_asistencia(periodo), _raw_tasa_asistencia(periodo))
+                for clase in (self.ingles, self.arte, self.musica):
+                    self.assertEqual(
+                        ImpactoService.calcular_tasa_asistencia(periodo, clase.id),
+                        _raw_tasa_asistencia(periodo, clase.id)
+                    )
+                self.assertEqual(ImpactoService.calcular_asistencia_por_clase(periodo), _raw_asistencia_por_clase(periodo))
+                for umbral in (0, 0.5, 1):
+                    regulares = ImpactoService.calcular_alumnos_asistencia_regular(periodo, umbral)
+                    regulares['alumnos_regulares'].sort(key=lambda alumno: alumno['estudiante_id'])
+                    self.assertEqual(regulares, _raw_alumnos_asistencia_regular(periodo, umbral))
+                self.assertEqual(ImpactoService.calcular_frecuencia_asistencia(periodo), _raw_frecuencia_asistencia(periodo))
+                self.assertEqual(ImpactoService.calcular_dia_mayor_asistencia(periodo), _raw_dia_mayor_asistencia(periodo))
+                self.assertEqual(ImpactoService.promedio_sesiones(periodo), _raw_promedio_sesiones(periodo))
+        for meses in (1, 3, 15):
+            self.assertEqual(ImpactoService.calcular_retencion_alumnos(meses), _raw_retencion_alumnos(meses))
+
+    def test_resumen_matches_individual_metrics(self):
+        for periodo in PERIODOS:
+            with self.subTest(periodo=periodo):
+                resumen = ImpactoService.calcular_resumen(periodo, umbral=0.4, meses=15)
+                regulares = ImpactoService.calcular_alumnos_asistencia_regular(periodo, 0.4)
+                regulares['alumnos_regulares'].sort(key=lambda alumno: alumno['estudiante_id'])
+                self.assertEqual(resumen, {
+                    'periodo': periodo,
+                    'tasa_asistencia': ImpactoService.calcular_tasa_asistencia(periodo),
+                    'asistencia_por_clase': ImpactoService.calcular_asistencia_por_clase(periodo),
+                    'alumnos_asistencia_regular': regulares,
+                    'frecuencia_asistencia': ImpactoService.calcular_frecuencia_asistencia(periodo),
+                    'retencion_alumnos': ImpactoService.calcular_retencion_alumnos(15),
+                    'dia_mayor_asistencia': ImpactoService.calcular_dia_mayor_asistencia(periodo),
+                    'promedio_sesiones': ImpactoService.promedio_sesiones(periodo),
+                })
+        parcial = ImpactoService.calcular_resumen('mes', include=['promedio_sesiones'])
+        self.assertEqual(parcial, {'periodo': 'mes', 'promedio_sesiones': ImpactoService.promedio_sesiones('mes')})
+
+    def test_listas_de_gestion_match_raw_queries(self):
+        lunes = self.hoy - datetime.timedelta(days=self.hoy.weekday())
+        for fecha_inicio in (lunes, lunes - datetime.timedelta(days=7), lunes - datetime.timedelta(days=42)):
+            for clase_id in (None, self.ingles.id, self.arte.id, self.musica.id):
+                with self.subTest(semana=fecha_inicio, clase_id=clase_id):
+                    lista = GestionService.lista_asistencia_semanal(fecha_inicio, clase_id)
+                    total, asistencias = _raw_asistencia_por_estudiante(
+                        fecha_inicio, fecha_inicio + datetime.timedelta(days=6), clase_id
+                    )
+                    self.assertEqual(lista['total_sesiones'], total)
+                    self.assertEqual({a['id']: a['total_asistencias'] for a in lista['alumnos']}, asistencias)
+                    for alumno in lista['alumnos']:
+                        self.assertEqual(alumno['porcentaje_asistencia'], round(alumno['total_asistencias'] / total * 100, 2))
+
+        for fecha in (self.hoy, self.hoy - datetime.timedelta(days=45), self.hoy - datetime.timedelta(days=400)):
+            inicio = fecha.replace(day=1)
+            fin = (inicio + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+            for clase_id in (None, self.ingles.id, self.arte.id):
+                with self.subTest(mes=inicio, clase_id=clase_id):
+                    lista = GestionService.lista_asistencia_mensual(fecha.month, fecha.year, clase_id)
+                    total, asistencias = _raw_asistencia_por_estudiante(inicio, fin, clase_id)
+                    self.assertEqual(lista['total_sesiones'], total)
+                    self.assertEqual({a['id']: a['total_asistencias'] for a in lista['alumnos']}, asistencias)
+                    porcentajes = [a['porcentaje_asistencia'] for a in lista['alumnos']]
+                    self.assertEqual(porcentajes, sorted(porcentajes, reverse=True))
+
+    def test_irregulares_e_inactivos_match_raw_queries(self):
+        for periodo in ['semana', 'mes', 'año', 'otro']:
+            with self.subTest(periodo=periodo):
+                inicio = _fecha_inicio(periodo)
+                total = Session.objects.filter(date__date__gte=inicio).count()
+                asistencias = dict(
+                    AttendanceStudent.objects.filter(id_session__date__gte=inicio).values('id_student').annotate(
+                        total=Count('id', filter=Q(attendance__in=ASISTENCIAS))
+                    ).values_list('id_student', 'total')
+                )
+                irregulares = {sid for sid, num in asistencias.items() if num / total < 0.25}
+
+                resultado = GestionService.alumnos_asistencia_irregular(periodo, 0.25)
+                self.assertEqual({a['id'] for a in resultado['alumnos']}, irregulares)
+                self.assertEqual(
+                    {a['id']: a['asistencias'] for a in resultado['alumnos']},
+                    {sid: asistencias[sid] for sid in irregulares}
+                )
+                self.assertEqual(resultado['porcentaje'], round(len(irregulares) / len(asistencias) * 100, 2))
+
+        ultimas = {}
+        for sid, fecha in AttendanceStudent.objects.filter(
+            attendance__in=ASISTENCIAS
+        ).values_list('id_student', 'id_session__date'):
+            ultimas[sid] = max(ultimas.get(sid, fecha.date()), fecha.date())
+        for dias in (0, 2, 30, 500):
+            with self.subTest(dias=dias):
+                limite = self.hoy - datetime.timedelta(days=dias)
+                esperados = {s.id for s in self.students if s.id not in ultimas or ultimas[s.id] < limite}
+                resultado = GestionService.alumnos_inactivos(dias)
+                self.assertEqual({a['id']: a['ultima_asistencia'] for a in resultado['alumnos']},
+                                 {sid: ultimas.get(sid) for sid in esperados})
+
+    def test_grupos_por_edad_match_raw_queries(self):
+        for periodo in ['semana', 'mes', 'año', 'otro']:
+            with self.subTest(periodo=periodo):
+                sesiones = Session.objects.filter(date__date__gte=_fecha_inicio(periodo))
+                grupos = GestionService.analisis_grupos_asistencia('edad', periodo)['grupos']
+                for nombre, rango in GestionService.RANGOS_EDAD.items():
+                    ids = [
+                        s.id for s in self.students
+                        if s.birthdate and rango['min'] <= GestionService._calcular_edad(s.birthdate) <= rango['max']
+                    ]
+                    asistencias = AttendanceStudent.objects.filter(
+                        id_student__in=ids, id_session__in=sesiones, attendance__in=ASISTENCIAS
+                    ).count()
+                    posible = len(ids) * sesiones.count()
+                    self.assertEqual(grupos[nombre], {
+                        'total_estudiantes': len(ids),
+                        'asistencias': asistencias,
+                        'porcentaje': round(asistencias / posible * 100, 2) if posible else 0
+                    })
+
+    def test_incremental_refresh_matches_rebuild(self):
+        # Editar asistencia y refrescar solo los días tocados deja los rollups igual que una reconstrucción completa
+        editadas = list(AttendanceStudent.objects.filter(id_session__id_class=self.ingles).select_related('id_session')[:5])
+        for registro, valor in zip(editadas, ['ABSENT', 'ONTIME', None, 'LATE', '']):
+            registro.attendance = valor
+            registro.save()
+        RollupAsistenciaService.refrescar_sesiones([registro.id_session for registro in editadas])
+        incremental = ImpactoService.calcular_resumen('anio', meses=15)
+
+        RollupAsistenciaService.reconstruir()
+        self.assertEqual(incremental, ImpactoService.calcular_resumen('anio', meses=15))
+        self.assertEqual(incremental['tasa_asistencia'], _raw_tasa_asistencia('anio'))
+
+    def test_grupos_por_sexo_include_missing_gender(self):
+        for periodo in ['semana', 'mes', 'año', 'otro']:
+            with self.subTest(periodo=periodo):
+                sesiones = Session.objects.filter(date__date__gte=_fecha_inicio(periodo))
+                grupos = GestionService.analisis_grupos_asistencia('sexo', periodo)['grupos']
+                # 'Otro' es todo lo que no es Masculino ni Femenino, incluido el género sin registrar (NULL)
+                for nombre, ids in [
+                    ('Masculino', [self.students[1].id]),
+                    ('Femenino', [self.students[0].id]),
+                    ('Otro', [self.students[2].id, self.students[3].id]),
+                ]:
+                    asistencias = AttendanceStudent.objects.filter(
+                        id_student__in=ids, id_session__in=sesiones, attendance__in=ASISTENCIAS
+                    ).count()
+                    posible = len(ids) * sesiones.count()
+                    self.assertEqual(grupos[nombre], {
+                        'total_estudiantes': len(ids),
+                        'asistencias': asistencias,
+                        'porcentaje': round(asistencias / posible * 100, 2) if posible else 0
+                    })
+
+    def test_grupos_read_only_the_period_from_the_rollup(self):
+        rollup = AsistenciaDiariaEstudiante._meta.db_table
+        for criterio in ['sexo', 'edad']:
+            with self.subTest(criterio=criterio), CaptureQueriesContext(connection) as consultas:
+                GestionService.analisis_grupos_asistencia(criterio, 'semana')
+
+            sql = [consulta['sql'] for consulta in consultas.captured_queries]
+            self.assertEqual(len(sql), 3)
+            # La fecha del periodo limita las filas del rollup en el WHERE, no solo dentro de cada SUM
+            por_rollup = [consulta for consulta in sql if f'FROM "{rollup}"' in consulta]
+            self.assertEqual(len(por_rollup), 1)
+            self.assertIn(f'"{rollup}"."fecha" >=', por_rollup[0].split(' WHERE ', 1)[1])
+            # Los estudiantes se cuentan sin unirlos con su historial de asistencia
+            por_estudiantes = [consulta for consulta in sql if f'FROM "{Students._meta.db_table}"' in consulta]
+            self.assertEqual(len(por_estudiantes), 1)
+            self.assertNotIn('JOIN', por_estudiantes[0])
+
+
+class _EjecutorInmediato:
+    """Reemplaza el pool de hilos: genera el reporte en el mismo hilo, dentro del test"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class _EjecutorDetenido:
+    """Reemplaza el pool de hilos: los trabajos quedan pendientes"""
+
+    def submit(self, fn, *args):
+        pass
+
+
+class ResumenEndpointTest(UnmanagedTablesTestCase):
+    URL = '/metricas/impact/resumen/'
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+    def test_valid_parameters(self):
+        response = self.client.get(self.URL, {'periodo': 'anio', 'umbral': '0.4', 'meses': '3',
+                                              'include': 'tasa_asistencia,retencion_alumnos'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ['periodo', 'tasa_asistencia', 'retencion_alumnos'])
+
+    def test_malformed_parameters_are_rejected(self):
+        for parametros in [{'umbral': 'alto'}, {'umbral': 'nan'}, {'umbral': 'inf'}, {'umbral': ''},
+                           {'meses': 'seis'}, {'meses': '1.5'}, {'meses': ''}, {'include': 'desconocida'}]:
+            with self.subTest(parametros=parametros):
+                response = self.client.get(self.URL, parametros)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class ReportesTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = override_settings(REPORTES_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        user = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        course = Class.objects.create(name='Inglés')
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1)
+        student = Students.objects.create(name='Ana', document_id='S1')
+        session = Session.objects.create(id_class=course, num_session=1, date=datetime.datetime.now())
+        AttendanceStudent.objects.create(id_session=session, id_student=student, id_volunteer=volunteer, attendance='PRESENT')
+
+    def pool(self, ejecutor):
+        return mock.patch.object(ReporteService, '_pool', return_value=ejecutor)
+
+    def solicitar(self, **datos):
+        return self.client.post('/metricas/reportes/solicitar/', datos, format='json')
+
+    def test_solicitar_generates_and_reuses_report(self):
+        with self.pool(_EjecutorInmediato()):
+            response = self.solicitar(tipo='impacto', periodo='mes')
+            self.assertEqual(response.status_code, 202)
+            self.assertFalse(response.json()['reutilizado'])
+            reporte = ReporteExcel.objects.get(id=response.json()['reporte_id'])
+            self.assertEqual(reporte.estado, ReporteExcel.COMPLETADO)
+            self.assertTrue(reporte.archivo.startswith(self.directorio))
+            self.assertIn('Tasa Asistencia General', load_workbook(reporte.archivo, read_only=True).sheetnames)
+
+            # Mismos parámetros y datos: el archivo está listo
+            response = self.solicitar(tipo='impacto', periodo='mes')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.json()['reporte_id'], response.json()['reutilizado']), (reporte.id, True))
+
+            # Otros parámetros, datos nuevos o un archivo que ya no existe generan otro trabajo
+            self.assertNotEqual(self.solicitar(tipo='impacto', periodo='semana').json()['reporte_id'], reporte.id)
+            MetricasCacheService.invalidar()
+            nuevo = self.solicitar(tipo='impacto', periodo='mes').json()['reporte_id']
+            self.assertNotEqual(nuevo, reporte.id)
+            os.remove(ReporteExcel.objects.get(id=nuevo).archivo)
+            self.assertNotEqual(self.solicitar(tipo='impacto', periodo='mes').json()['reporte_id'], nuevo)
+
+    def test_solicitar_reuses_pending_jobs_until_abandoned(self):
+        with self.pool(_EjecutorDetenido()):
+            primero = self.solicitar(tipo='gestion', mes=3, anio=2025).json()
+            segundo = self.solicitar(tipo='gestion', mes=3, anio=2025).json()
+            self.assertEqual((segundo['reporte_id'], segundo['reutilizado']), (primero['reporte_id'], True))
+
+            ReporteExcel.objects.filter(id=primero['reporte_id']).update(
+                updated_at=datetime.datetime.now() - ReporteService.TIEMPO_MAXIMO - datetime.timedelta(minutes=1)
+            )
+            self.assertNotEqual(self.solicitar(tipo='gestion', mes=3, anio=2025).json()['reporte_id'], primero['reporte_id'])
+
+        self.assertEqual(self.solicitar(tipo='otro').status_code, 400)
+        self.assertEqual(self.solicitar(tipo='impacto', umbral='alto').status_code, 400)
+        self.assertEqual(self.solicitar(tipo='gestion', fecha='03/03/2025').status_code, 400)
+
+    def test_estado(self):
+        reporte = ReporteExcel.objects.create(tipo='impacto', parametros={}, firma='x')
+        response = self.client.get('/metricas/reportes/estado/', {'reporte_id': reporte.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['reporte_id'], response.json()['estado']), (reporte.id, ReporteExcel.PENDIENTE))
+
+        self.assertEqual(self.client.get('/metricas/reportes/estado/').status_code, 400)
+        for reporte_id in (reporte.id + 1, 'abc'):
+            self.assertEqual(self.client.get('/metricas/reportes/estado/', {'reporte_id': reporte_id}).status_code, 404)
+
+    def test_descargar(self):
+        url = '/metricas/reportes/descargar/'
+        with self.pool(_EjecutorDetenido()):
+            reporte_id = self.solicitar(tipo='gestion').json()['reporte_id']
+        # Todavía no está listo
+        self.assertEqual(self.client.get(url, {'reporte_id': reporte_id}).status_code, 409)
+
+        ReporteService.procesar(reporte_id)
+        response = self.client.get(url, {'reporte_id': reporte_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('Resumen por Clases', load_workbook(io.BytesIO(b''.join(response.streaming_content))).sheetnames)
+
+        # El archivo se borró del disco
+        os.remove(ReporteExcel.objects.get(id=reporte_id).archivo)
+        self.assertEqual(self.client.get(url, {'reporte_id': reporte_id}).status_code, 410)
+        self.assertEqual(self.client.get(url, {'reporte_id': reporte_id + 1}).status_code, 404)
+
+    def test_procesar_logs_errors(self):
+        reporte = ReporteExcel.objects.create(tipo='impacto', parametros={}, firma='x')
+        with mock.patch.object(ExcelService, 'escribir_excel_impacto', side_effect=RuntimeError('fallo')):
+            with self.assertLogs('metricas.services.reporte_service', level='ERROR') as logs:
+                ReporteService.procesar(reporte.id)
+
+        reporte.refresh_from_db()
+        self.assertEqual((reporte.estado, reporte.error), (ReporteExcel.ERROR, 'fallo'))
+        self.assertIn(str(reporte.id), logs.output[0])
+
+    def test_limpiar_keeps_recent_and_in_flight_jobs(self):
+        antiguos = {}
+        for estado in (ReporteExcel.PENDIENTE, ReporteExcel.PROCESANDO, ReporteExcel.COMPLETADO, ReporteExcel.ERROR):
+            ruta = os.path.join(self.directorio, f'{estado}.xlsx')
+            open(ruta, 'wb').close()
+            antiguos[estado] = ReporteExcel.objects.create(tipo='impacto', parametros={}, firma=estado, estado=estado, archivo=ruta)
+        ReporteExcel.objects.update(created_at=datetime.datetime.now() - datetime.timedelta(days=8))
+        reciente = ReporteExcel.objects.create(tipo='impacto', parametros={}, firma='r', estado=ReporteExcel.COMPLETADO)
+
+        self.assertEqual(ReporteService.limpiar(7), 2)
+        self.assertEqual(
+            set(ReporteExcel.objects.values_list('id', flat=True)),
+            {antiguos[ReporteExcel.PENDIENTE].id, antiguos[ReporteExcel.PROCESANDO].id, reciente.id}
+        )
+        self.assertFalse(os.path.exists(antiguos[ReporteExcel.COMPLETADO].archivo))
+        self.assertTrue(os.path.exists(antiguos[ReporteExcel.PROCESANDO].archivo))
+
+
+def _hojas(archivo):
+    """{hoja: [filas]} de un .xlsx, con las celdas como las lee openpyxl"""
+    libro = load_workbook(archivo, read_only=True)
+    return {hoja.title: [list(fila) for fila in hoja.iter_rows(values_only=True)] for hoja in libro.worksheets}
+
+
+class ExcelGestionTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        hoy = datetime.date.today()
+        self.inicio = datetime.date(2025, 3, 3)
+        self.ingles = Class.objects.create(name='Inglés', day='Lunes')
+        self.arte = Class.objects.create(name='Arte')
+        volunteer = Volunteers.objects.create(name='Voluntario', status=1)
+        self.students = [
+            Students.objects.create(name='Ana', last_name='Pérez', document_id='S1', gender='F',
+                                    birthdate=GestionService._restar_anios(hoy, 7)),
+            Students.objects.create(name='Beto', last_name='Quispe', document_id='S2', gender='M',
+                                    birthdate=GestionService._restar_anios(hoy, 14)),
+            Students.objects.create(name='Caro', document_id='S3', gender=None, birthdate=None),
+        ]
+        # 35 sesiones diarias de Inglés desde el 3 de marzo: Beto falta a todas
+        valores = ['PRESENT', 'ABSENT', None, 'PRESENT', 'LATE']
+        for num in range(35):
+            session = Session.objects.create(
+                id_class=self.ingles, num_session=num + 1,
+                date=datetime.datetime.combine(self.inicio + datetime.timedelta(days=num), datetime.time(15, 0))
+            )
+            for indice, student in enumerate(self.students):
+                valor = 'ABSENT' if indice == 1 else valores[(num + indice) % len(valores)]
+                AttendanceStudent.objects.create(id_session=session, id_student=student, id_volunteer=volunteer, attendance=valor)
+        session = Session.objects.create(id_class=self.arte, num_session=1, date=datetime.datetime(2025, 3, 4, 10, 0))
+        AttendanceStudent.objects.create(id_session=session, id_student=self.students[0], id_volunteer=volunteer, attendance='PRESENT')
+
+    def test_in_memory_and_streaming_reports_match(self):
+        for parametros in [
+            {'fecha': '2025-03-04', 'fecha_inicio': self.inicio, 'mes': 3, 'anio': 2025},
+            {'fecha': '2025-03-04', 'clase_id': self.ingles.id, 'criterio': 'edad'},
+            {'fecha': '04/03/2025', 'mes': 4, 'anio': 2025, 'clase_id': self.arte.id},
+            {},
+        ]:
+            with self.subTest(parametros=parametros):
+                en_memoria = _hojas(ExcelService.generar_excel_gestion(**parametros))
+                with ExcelService.generar_excel_gestion_archivo(**parametros) as archivo:
+                    en_disco = _hojas(archivo)
+                self.assertEqual(en_memoria, en_disco)
+
+        hojas = _hojas(ExcelService.generar_excel_gestion(fecha='2025-03-04', fecha_inicio=self.inicio, mes=3, anio=2025))
+        self.assertEqual(list(hojas), [
+            'Lista Asistencia Diaria', 'Lista Asistencia Semanal', 'Lista Asistencia Mensual', 'Alumnos Irregulares',
+            'Grupos por Sexo', 'Más de 30 Faltas Seguidas', 'Resumen por Clases',
+        ])
+        self.assertEqual(len(hojas['Lista Asistencia Diaria']), 1 + 4)
+        self.assertEqual([fila[0] for fila in hojas['Más de 30 Faltas Seguidas'][1:]], [self.students[1].id])
+        self.assertEqual(hojas['Resumen por Clases'][1:], [
+            [self.ingles.id, 'Inglés', 'Lunes', 'None - None', 3, 35],
+            [self.arte.id, 'Arte', None, 'None - None', 1, 1],
+        ])
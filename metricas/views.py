@@ -1,10 +1,16 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
 from .services.impacto_service import ImpactoService
 from .services.gestion_service import GestionService
 from .services.excel_service import ExcelService
+from .services.cache_service import MetricasCacheService
+from .services.reporte_service import ReporteService
+from .serializers import ReporteExcelSerializer
+from .models import ReporteExcel
+import math
+import os
 from datetime import datetime
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -29,7 +35,11 @@ class ImpactoViewSet(viewsets.ViewSet):
             except ValueError:
                 return Response({"error": "clase_id debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
         
-        datos = ImpactoService.calcular_tasa_asistencia(periodo, clase_id)
+        datos = MetricasCacheService.obtener(
+            'tasa-asistencia', {'periodo': periodo, 'clase_id': clase_id},
+            lambda: ImpactoService.calcular_tasa_asistencia(periodo, clase_id),
+            clase_id=clase_id
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -42,7 +52,10 @@ class ImpactoViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["GET"], url_path="asistencia-por-clase")
     def asistencia_por_clase(self, request):
         periodo = request.query_params.get("periodo", "mes")
-        datos = ImpactoService.calcular_asistencia_por_clase(periodo)
+        datos = MetricasCacheService.obtener(
+            'asistencia-por-clase', {'periodo': periodo},
+            lambda: ImpactoService.calcular_asistencia_por_clase(periodo)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -57,7 +70,10 @@ class ImpactoViewSet(viewsets.ViewSet):
     def alumnos_asistencia_regular(self, request):
         periodo = request.query_params.get("periodo", "mes")
         umbral = float(request.query_params.get("umbral", 0.5))
-        datos = ImpactoService.calcular_alumnos_asistencia_regular(periodo, umbral)
+        datos = MetricasCacheService.obtener(
+            'alumnos-asistencia-regular', {'periodo': periodo, 'umbral': umbral},
+            lambda: ImpactoService.calcular_alumnos_asistencia_regular(periodo, umbral)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -70,7 +86,10 @@ class ImpactoViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["GET"], url_path="frecuencia-asistencia")
     def frecuencia_asistencia(self, request):
         periodo = request.query_params.get("periodo", "mes")
-        datos = ImpactoService.calcular_frecuencia_asistencia(periodo)
+        datos = MetricasCacheService.obtener(
+            'frecuencia-asistencia', {'periodo': periodo},
+            lambda: ImpactoService.calcular_frecuencia_asistencia(periodo)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -83,7 +102,10 @@ class ImpactoViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["GET"], url_path="retencion-alumnos")
     def retencion_alumnos(self, request):
         periodo_meses = int(request.query_params.get("meses", 6))
-        datos = ImpactoService.calcular_retencion_alumnos(periodo_meses)
+        datos = MetricasCacheService.obtener(
+            'retencion-alumnos', {'periodo_meses': periodo_meses},
+            lambda: ImpactoService.calcular_retencion_alumnos(periodo_meses)
+        )
         return Response(datos, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
@@ -96,7 +118,10 @@ class ImpactoViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["GET"], url_path="dia-mayor-asistencia")
     def dia_mayor_asistencia(self, request):
         periodo = request.query_params.get("periodo", "mes")
-        datos = ImpactoService.calcular_dia_mayor_asistencia(periodo)
+        datos = MetricasCacheService.obtener(
+            'dia-mayor-asistencia', {'periodo': periodo},
+            lambda: ImpactoService.calcular_dia_mayor_asistencia(periodo)
+        )
         return Response(datos, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
@@ -109,9 +134,55 @@ class ImpactoViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["GET"], url_path="promedio-sesiones")
     def promedio_sesiones(self, request):
         periodo = request.query_params.get("periodo", "mes")
-        datos = ImpactoService.promedio_sesiones(periodo)
+        datos = MetricasCacheService.obtener(
+            'promedio-sesiones', {'periodo': periodo},
+            lambda: ImpactoService.promedio_sesiones(periodo)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
+    @swagger_auto_schema(
+        operation_description="Todas las métricas de impacto del periodo en una sola respuesta",
+        manual_parameters=[
+            openapi.Parameter('periodo', openapi.IN_QUERY, type=openapi.TYPE_STRING, default='mes'),
+            openapi.Parameter('include', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description="Métricas separadas por coma: " + ", ".join(ImpactoService.METRICAS_RESUMEN)),
+            openapi.Parameter('umbral', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, default=0.5),
+            openapi.Parameter('meses', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, default=6)
+        ],
+        tags=['📊 Métricas de Impacto']
+    )
+    @action(detail=False, methods=["GET"], url_path="resumen")
+    def resumen(self, request):
+        periodo = request.query_params.get("periodo", "mes")
+        include = request.query_params.get("include")
+        try:
+            umbral = float(request.query_params.get("umbral", 0.5))
+        except ValueError:
+            return Response({"error": "El umbral debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+        if not math.isfinite(umbral):
+            return Response({"error": "El umbral debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            meses = int(request.query_params.get("meses", 6))
+        except ValueError:
+            return Response({"error": "meses debe ser un número entero"}, status=status.HTTP_400_BAD_REQUEST)
+
+        metricas = ImpactoService.METRICAS_RESUMEN
+        if include:
+            metricas = [metrica.strip() for metrica in include.split(",") if metrica.strip()]
+            invalidas = [metrica for metrica in metricas if metrica not in ImpactoService.METRICAS_RESUMEN]
+            if invalidas:
+                return Response(
+                    {"error": f"Métricas no válidas: {', '.join(invalidas)}. Valores permitidos: {', '.join(ImpactoService.METRICAS_RESUMEN)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            metricas = [metrica for metrica in ImpactoService.METRICAS_RESUMEN if metrica in metricas]
+
+        datos = MetricasCacheService.obtener(
+            'resumen', {'periodo': periodo, 'include': metricas, 'umbral': umbral, 'meses': meses},
+            lambda: ImpactoService.calcular_resumen(periodo, metricas, umbral, meses)
+        )
+        return Response(datos, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(
         operation_description="Genera y descarga Excel con métricas de impacto",
         manual_parameters=[
@@ -160,7 +231,11 @@ class GestionViewSet(viewsets.ViewSet):
     def asistencia_diaria(self, request):
         fecha = request.query_params.get("fecha")
         clase_id = request.query_params.get("clase_id")
-        datos = GestionService.lista_asistencia_diaria(fecha, clase_id)
+        datos = MetricasCacheService.obtener(
+            'asistencia-diaria', {'fecha': fecha, 'clase_id': clase_id},
+            lambda: GestionService.lista_asistencia_diaria(fecha, clase_id),
+            clase_id=clase_id
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -175,7 +250,11 @@ class GestionViewSet(viewsets.ViewSet):
     def asistencia_semanal(self, request):
         fecha_inicio = request.query_params.get("fecha_inicio")
         clase_id = request.query_params.get("clase_id")
-        datos = GestionService.lista_asistencia_semanal(fecha_inicio, clase_id)
+        datos = MetricasCacheService.obtener(
+            'asistencia-semanal', {'fecha_inicio': fecha_inicio, 'clase_id': clase_id},
+            lambda: GestionService.lista_asistencia_semanal(fecha_inicio, clase_id),
+            clase_id=clase_id
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -192,7 +271,11 @@ class GestionViewSet(viewsets.ViewSet):
         mes = request.query_params.get("mes")
         anio = request.query_params.get("anio")
         clase_id = request.query_params.get("clase_id")
-        datos = GestionService.lista_asistencia_mensual(mes, anio, clase_id)
+        datos = MetricasCacheService.obtener(
+            'asistencia-mensual', {'mes': mes, 'anio': anio, 'clase_id': clase_id},
+            lambda: GestionService.lista_asistencia_mensual(mes, anio, clase_id),
+            clase_id=clase_id
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -207,7 +290,10 @@ class GestionViewSet(viewsets.ViewSet):
     def asistencia_irregular(self, request):
         periodo = request.query_params.get("periodo", "mes")
         umbral = float(request.query_params.get("umbral", 0.25))
-        datos = GestionService.alumnos_asistencia_irregular(periodo, umbral)
+        datos = MetricasCacheService.obtener(
+            'asistencia-irregular', {'periodo': periodo, 'umbral': umbral},
+            lambda: GestionService.alumnos_asistencia_irregular(periodo, umbral)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -222,7 +308,10 @@ class GestionViewSet(viewsets.ViewSet):
     def grupos_asistencia(self, request):
         criterio = request.query_params.get("criterio", "sexo")
         periodo = request.query_params.get("periodo", "mes")
-        datos = GestionService.analisis_grupos_asistencia(criterio, periodo)
+        datos = MetricasCacheService.obtener(
+            'grupos-asistencia', {'criterio': criterio, 'periodo': periodo},
+            lambda: GestionService.analisis_grupos_asistencia(criterio, periodo)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -235,7 +324,10 @@ class GestionViewSet(viewsets.ViewSet):
     @action(detail=False, methods=["GET"], url_path="alumnos-inactivos")
     def alumnos_inactivos(self, request):
         dias = int(request.query_params.get("dias", 30))
-        datos = GestionService.alumnos_inactivos(dias)
+        datos = MetricasCacheService.obtener(
+            'alumnos-inactivos', {'dias': dias},
+            lambda: GestionService.alumnos_inactivos(dias)
+        )
         return Response(datos, status=status.HTTP_200_OK)
     
     @swagger_auto_schema(
@@ -246,7 +338,9 @@ class GestionViewSet(viewsets.ViewSet):
             openapi.Parameter('fecha_inicio', openapi.IN_QUERY, type=openapi.TYPE_STRING),
             openapi.Parameter('mes', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
             openapi.Parameter('anio', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
-            openapi.Parameter('clase_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER)
+            openapi.Parameter('clase_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('streaming', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN, default=False,
+                              description="Genera el archivo fila por fila con memoria acotada (recomendado para historiales largos)")
         ],
         responses={
             200: openapi.Response(
@@ -309,6 +403,29 @@ class GestionViewSet(viewsets.ViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
+        streaming = request.query_params.get('streaming', 'false').lower() in ('true', '1')
+        if streaming:
+            try:
+                archivo = ExcelService.generar_excel_gestion_archivo(
+                    fecha=fecha,
+                    fecha_inicio=fecha_inicio_obj,
+                    mes=mes_int,
+                    anio=anio_int,
+                    clase_id=clase_id_int
+                )
+            except Exception as e:
+                return Response(
+                    {"error": f"Error al generar el Excel: {str(e)}"}, 
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+
+            return FileResponse(
+                archivo,
+                as_attachment=True,
+                filename=f"gestion_asistencia_{tipo}_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+
         try:
             # Llamar al servicio con parámetros individuales
             excel_data = ExcelService.generar_excel_gestion(
@@ -358,4 +475,144 @@ class MetricasViewSet(viewsets.ViewSet):
             # Aquí implementarías la lógica para obtener estadísticas de usuarios
             return Response({"message": "Endpoint en desarrollo"}, status=status.HTTP_200_OK)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ReportesViewSet(viewsets.ViewSet):
+    @staticmethod
+    def _parametros_reporte(tipo, datos):
+        """Valida y normaliza los parámetros del reporte. Retorna (parametros, error)"""
+        if tipo == 'impacto':
+            try:
+                umbral = float(datos.get('umbral', 0.5))
+            except (TypeError, ValueError):
+                return None, "El umbral debe ser un número"
+            return {'periodo': datos.get('periodo', 'mes'), 'umbral': umbral}, None
+
+        parametros = {}
+        for campo in ['fecha', 'fecha_inicio']:
+            valor = datos.get(campo)
+            if valor:
+                try:
+                    datetime.strptime(valor, '%Y-%m-%d')
+                except (TypeError, ValueError):
+                    return None, f"Formato de {campo} inválido. Use YYYY-MM-DD"
+                parametros[campo] = valor
+
+        for campo, mensaje in [
+            ('mes', "El mes debe ser un número entero entre 1 y 12"),
+            ('anio', "El año debe ser un número entero"),
+            ('clase_id', "El clase_id debe ser un número entero")
+        ]:
+            valor = datos.get(campo)
+            if valor not in (None, ''):
+                try:
+                    parametros[campo] = int(valor)
+                except (TypeError, ValueError):
+                    return None, mensaje
+
+        return parametros, None
+
+    @swagger_auto_schema(
+        operation_description="Solicita un reporte Excel que se genera en segundo plano. "
+                              "Si ya existe uno con los mismos parámetros y datos, se reutiliza.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['tipo'],
+            properties={
+                'tipo': openapi.Schema(type=openapi.TYPE_STRING, enum=ReporteService.TIPOS),
+                'periodo': openapi.Schema(type=openapi.TYPE_STRING, description="Solo impacto"),
+                'umbral': openapi.Schema(type=openapi.TYPE_NUMBER, description="Solo impacto"),
+                'fecha': openapi.Schema(type=openapi.TYPE_STRING, description="Solo gestión, YYYY-MM-DD"),
+                'fecha_inicio': openapi.Schema(type=openapi.TYPE_STRING, description="Solo gestión, YYYY-MM-DD"),
+                'mes': openapi.Schema(type=openapi.TYPE_INTEGER, description="Solo gestión"),
+                'anio': openapi.Schema(type=openapi.TYPE_INTEGER, description="Solo gestión"),
+                'clase_id': openapi.Schema(type=openapi.TYPE_INTEGER, description="Solo gestión")
+            }
+        ),
+        responses={202: ReporteExcelSerializer(), 200: ReporteExcelSerializer(), 400: "Datos inválidos"},
+        tags=['📑 Reportes en Segundo Plano']
+    )
+    @action(detail=False, methods=["POST"], url_path="solicitar")
+    def solicitar(self, request):
+        tipo = request.data.get('tipo')
+        if tipo not in ReporteService.TIPOS:
+            return Response(
+                {"error": f"tipo debe ser uno de: {', '.join(ReporteService.TIPOS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        parametros, error = self._parametros_reporte(tipo, request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        reporte, reutilizado = ReporteService.solicitar(tipo, parametros)
+        datos = ReporteExcelSerializer(reporte).data
+        datos['reutilizado'] = reutilizado
+        # 200 si el archivo ya está listo, 202 si hay que esperar al trabajo
+        listo = reporte.estado == ReporteExcel.COMPLETADO
+        return Response(datos, status=status.HTTP_200_OK if listo else status.HTTP_202_ACCEPTED)
+
+    @swagger_auto_schema(
+        operation_description="Consulta el estado de un reporte en segundo plano",
+        manual_parameters=[
+            openapi.Parameter('reporte_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True)
+        ],
+        responses={200: ReporteExcelSerializer(), 400: "Parámetro requerido", 404: "No encontrado"},
+        tags=['📑 Reportes en Segundo Plano']
+    )
+    @action(detail=False, methods=["GET"], url_path="estado")
+    def estado(self, request):
+        reporte_id = request.query_params.get("reporte_id")
+        if not reporte_id:
+            return Response({"error": "El parámetro 'reporte_id' es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+
+        reporte = ReporteExcel.objects.filter(id=reporte_id).first() if reporte_id.isdigit() else None
+        if not reporte:
+            return Response({"error": "Reporte no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(ReporteExcelSerializer(reporte).data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_description="Descarga el archivo de un reporte completado",
+        manual_parameters=[
+            openapi.Parameter('reporte_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True)
+        ],
+        responses={
+            200: openapi.Response(
+                description="Archivo Excel generado",
+                content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            ),
+            404: "No encontrado",
+            409: "El reporte aún no está listo",
+            410: "El archivo ya no está disponible"
+        },
+        tags=['📑 Reportes en Segundo Plano']
+    )
+    @action(detail=False, methods=["GET"], url_path="descargar")
+    def descargar(self, request):
+        reporte_id = request.query_params.get("reporte_id")
+        if not reporte_id:
+            return Response({"error": "El parámetro 'reporte_id' es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+
+        reporte = ReporteExcel.objects.filter(id=reporte_id).first() if reporte_id.isdigit() else None
+        if not reporte:
+            return Response({"error": "Reporte no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        if reporte.estado != ReporteExcel.COMPLETADO:
+            return Response(
+                {"error": f"El reporte aún no está listo (estado: {reporte.estado})."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        if not os.path.exists(reporte.archivo):
+            return Response(
+                {"error": "El archivo ya no está disponible. Solicite el reporte nuevamente."},
+                status=status.HTTP_410_GONE
+            )
+
+        return FileResponse(
+            open(reporte.archivo, 'rb'),
+            as_attachment=True,
+            filename=f"metricas_{reporte.tipo}_{reporte.created_at.strftime('%Y%m%d')}.xlsx",
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
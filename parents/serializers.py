@@ -1,5 +1,6 @@
 from rest_framework import serializers 
 from api.models import Parents
+from api.fieldsets import SparseFieldsMixin
 
 class ParentSerializer(serializers.ModelSerializer): 
     class Meta: 
@@ -17,7 +18,7 @@ class ParentSerializer(serializers.ModelSerializer):
             return None
         return value
 
-class ParentDetailsSerializer(serializers.ModelSerializer):
+class ParentDetailsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Parents
@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import Parents
+from api.tests import UnmanagedTablesTestCase, selected_columns
+
+LIST_URL = '/api/parents/get/'
+
+
+class ParentsSparseFieldsTest(UnmanagedTablesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        self.parents = [
+            Parents.objects.create(name=f'Padre {i}', last_name='Núñez', document_id=f'P{i}', email=f'p{i}@x.com')
+            for i in range(3)
+        ]
+
+    def test_fields_trim_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(LIST_URL, {'fields': 'email,name'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [
+            {'name': parent.name, 'email': parent.email} for parent in reversed(self.parents)
+        ])
+        self.assertEqual(selected_columns(consultas.captured_queries[-1]['sql'], 'parents'), ['id', 'name', 'email'])
+
+        # Sin fields, todas las columnas
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(LIST_URL)
+        self.assertIn('last_name', response.json()['results'][0])
+        self.assertIn('last_name', selected_columns(consultas.captured_queries[-1]['sql'], 'parents'))
+
+    def test_id_is_always_loaded_for_the_cursor(self):
+        names, url, params = [], LIST_URL, {'fields': 'name', 'page_size': 2}
+        while url:
+            page = self.client.get(url, params).json()
+            self.assertTrue(all(list(item) == ['name'] for item in page['results']))
+            names += [item['name'] for item in page['results']]
+            url, params = page['next'], None
+        self.assertEqual(names, ['Padre 2', 'Padre 1', 'Padre 0'])
+
+        # También en la lista sin paginar
+        response = self.client.get(LIST_URL, {'fields': 'document_id', 'paginate': 'false'})
+        self.assertEqual(response.json(), [{'document_id': f'P{i}'} for i in (2, 1, 0)])
+
+    def test_unknown_fields_are_rejected(self):
+        for value in ['name,password', 'clave', '', ' , ']:
+            with self.subTest(fields=value):
+                response = self.client.get(LIST_URL, {'fields': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Campos no válidos', response.json()['detail'])
+        self.assertIn('password', self.client.get(LIST_URL, {'fields': 'name,password'}).json()['detail'])
@@ -5,22 +5,73 @@ from rest_framework.exceptions import NotFound
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from api.models import Parents 
+from django.db.models import Q
+
+from api.models import Parents, SyncTombstone
+from api.fieldsets import FIELDS_PARAMETER, requested_fields
+from api.pagination import PAGINATION_PARAMETERS, paginated_response
+from api.search import PARENT_INDEX, SEARCH_PARAMETERS, SEARCH_QUERY_PARAM, parse_limit
+from api.sync import (
+    SYNC_PARAMETERS, SYNC_TOKEN_HEADER, changes_response, deleted_ids,
+    invalid_changes_since_response, next_sync_token, parse_changes_since,
+)
 from .serializers import ParentSerializer, ParentDetailsSerializer
 
 class ParentsViewSet(viewsets.ViewSet): 
     
     @swagger_auto_schema(
         operation_description="Obtener lista de todos los padres",
-        responses={200: ParentDetailsSerializer(many=True), 500: "Error interno"},
+        manual_parameters=PAGINATION_PARAMETERS + SYNC_PARAMETERS + [FIELDS_PARAMETER],
+        responses={200: ParentDetailsSerializer(many=True), 400: "changes_since o fields inválido", 500: "Error interno"},
         tags=['👨‍👩‍👧‍👦 Gestión de Padres']
     )
     @action(detail=False, methods=["GET"], url_path="get") 
     def list_parents(self, request): 
+        try:
+            since = parse_changes_since(request)
+        except ValueError as e:
+            return invalid_changes_since_response(e)
+        try:
+            fields = requested_fields(request, ParentDetailsSerializer.Meta.fields)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        sync_token = next_sync_token()
+
         parents = Parents.objects.all().order_by('-id') 
-        serializer = ParentDetailsSerializer(parents, many=True) 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        if fields is not None:
+            # Solo las columnas pedidas (id siempre, para la paginación por cursor)
+            parents = parents.only('id', *fields)
+        if since is not None:
+            changed = parents.filter(Q(updated_at__gte=since) | Q(created_at__gte=since))
+            return changes_response(
+                sync_token,
+                ParentDetailsSerializer(changed, many=True, fields=fields).data,
+                deleted_ids(SyncTombstone.PARENTS, since)
+            )
+
+        response = paginated_response(request, parents, ParentDetailsSerializer, view=self, fields=fields)
+        response[SYNC_TOKEN_HEADER] = sync_token
+        return response
     
+    @swagger_auto_schema(
+        operation_description="Buscar padres por nombre, apellido o documento (por prefijo y sin distinguir tildes). "
+                              "Devuelve los mejores resultados primero.",
+        manual_parameters=SEARCH_PARAMETERS,
+        responses={200: "Resultados de la búsqueda", 400: "Parámetros inválidos"},
+        tags=['👨‍👩‍👧‍👦 Gestión de Padres']
+    )
+    @action(detail=False, methods=["GET"], url_path="search")
+    def search_parents(self, request):
+        query = request.query_params.get(SEARCH_QUERY_PARAM, "").strip()
+        if not query:
+            return Response({"detail": "El parámetro 'q' es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = parse_limit(request)
+        except ValueError:
+            return Response({"detail": "El parámetro 'limit' debe ser un número entero."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": PARENT_INDEX.search(query, limit)}, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(
         operation_description="Crear un nuevo padre",
         request_body=ParentSerializer,
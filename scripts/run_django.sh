@@ -14,7 +14,7 @@ done
 
 # Realizar migraciones
 echo "Realizando migraciones..."
-python manage.py migrate
+python manage.py migrate --run-syncdb
 
 # Iniciar el servidor de desarrollo
 echo "Iniciando el servidor en el puerto $PORT..."
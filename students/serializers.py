@@ -1,7 +1,8 @@
 from rest_framework import serializers
 
 
-from api.models import Students ,Class
+from api.models import BirthStudents, Students ,Class, StudentClass
+from api.values_serializers import ValuesSerializer
 
 class StudentSerializer(serializers.ModelSerializer): 
 
@@ -104,4 +105,93 @@ class StudentCourseInfoSerializer(serializers.ModelSerializer):
         return CourseInfoSerializer(
             [sc.id_class for sc in obj.studentclass_set.all()], 
             many=True
-        ).data
\ No newline at end of file
+        ).data
+
+
+class StudentDetailsValuesSerializer(ValuesSerializer):
+    """
+    Misma salida que StudentDetailsSerializer para listados: una consulta por página
+    (con el padre en un JOIN) más una para cursos y otra para la información de nacimiento.
+    Con `fields` solo se hacen el JOIN y las consultas de los campos pedidos.
+    """
+    model_serializer = StudentDetailsSerializer
+    columns = ['id', 'name', 'last_name', 'parent', 'nationality', 'document_type', 'document_id',
+               'birthdate', 'gender', 'status']
+    parent_columns = ['parent__id', 'parent__document_id', 'parent__name', 'parent__last_name', 'parent__email']
+    values = columns + parent_columns
+
+    @classmethod
+    def queryset(cls, queryset, fields=None):
+        if fields is None:
+            return queryset.values(*cls.values)
+        # id siempre: lo usan la paginación por cursor y las consultas de cursos y nacimiento
+        values = ['id'] + [column for column in cls.columns[1:] if column in fields]
+        if 'parent_info' in fields:
+            values += cls.parent_columns
+        return queryset.values(*values)
+
+    def related(self, rows):
+        ids = [row['id'] for row in rows]
+
+        courses = {}
+        if self.wants('courses'):
+            for student_id, class_id, name, category in StudentClass.objects.filter(
+                id_student__in=ids
+            ).order_by('id').values_list('id_student', 'id_class', 'id_class__name', 'id_class__category'):
+                courses.setdefault(student_id, []).append({
+                    "class_id": class_id,
+                    "course_name": name,
+                    "category": category,
+                })
+
+        # Igual que birth_prefetched[0]: el primer registro de nacimiento de cada estudiante
+        births = {}
+        if self.wants('birth_info'):
+            for student_id, city, country in BirthStudents.objects.filter(
+                id_student__in=ids
+            ).order_by('id').values_list('id_student', 'city', 'country'):
+                births.setdefault(student_id, {"city": city, "country": country})
+
+        return courses, births
+
+    def get_parent_info(self, row, related):
+        if row['parent__id'] is None:
+            return None
+        return {
+            "dni": row['parent__document_id'],
+            "parent_name": row['parent__name'],
+            "parent_last_name": row['parent__last_name'],
+            "parent_email": row['parent__email']
+        }
+
+    def get_courses(self, row, related):
+        courses, births = related
+        return courses.get(row['id'], [])
+
+    def get_birth_info(self, row, related):
+        courses, births = related
+        return births.get(row['id'])
+
+
+class StudentCourseInfoValuesSerializer(ValuesSerializer):
+    """Misma salida que StudentCourseInfoSerializer, sin un CourseInfoSerializer anidado por estudiante."""
+    model_serializer = StudentCourseInfoSerializer
+    values = ['id', 'name', 'last_name', 'document_id']
+
+    def related(self, rows):
+        courses = {}
+        for student_id, class_id, name, start_time, end_time, day in StudentClass.objects.filter(
+            id_student__in=[row['id'] for row in rows]
+        ).order_by('id').values_list(
+            'id_student', 'id_class', 'id_class__name', 'id_class__start_time', 'id_class__end_time', 'id_class__day'
+        ):
+            courses.setdefault(student_id, []).append({
+                'id': class_id,
+                'name': name,
+                'horario': f"{start_time} - {end_time}",
+                'dia': day,
+            })
+        return courses
+
+    def get_courses_info(self, row, related):
+        return related.get(row['id'], [])
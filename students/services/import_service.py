@@ -0,0 +1,214 @@
+import csv
+import io
+import os
+from datetime import date, datetime
+
+from django.db import transaction
+from openpyxl import load_workbook
+
+from api.models import BirthStudents, Parents, Students
+
+
+class StudentImportError(Exception):
+    """El archivo no se puede leer (formato, cabeceras o tamaño); no es un error de fila."""
+
+
+class StudentImportService:
+    """
+    Alta masiva de estudiantes desde un archivo CSV o XLSX.
+
+    Todas las filas se validan antes de escribir: los DNI de los padres y los
+    documentos ya registrados se resuelven con una consulta cada uno, y si alguna
+    fila tiene errores no se inserta ninguna. Los estudiantes y su información de
+    nacimiento se insertan con bulk_create por bloques dentro de una transacción.
+    """
+
+    CHUNK_SIZE = 500
+    MAX_ROWS = 5000
+
+    REQUIRED_COLUMNS = ['parent_dni', 'name', 'last_name', 'document_id']
+    STUDENT_COLUMNS = ['name', 'last_name', 'nationality', 'document_type', 'document_id', 'gender']
+    BIRTH_COLUMNS = ['city', 'country']
+
+    MAX_LENGTH = 255
+
+    @staticmethod
+    def _normalizar_cabecera(valor):
+        return str(valor or '').strip().lower().replace(' ', '_')
+
+    @staticmethod
+    def _leer_csv(archivo):
+        contenido = archivo.read()
+        try:
+            texto = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            texto = contenido.decode('latin-1')
+        try:
+            dialecto = csv.Sniffer().sniff(texto[:2048], delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(io.StringIO(texto), dialecto)
+        return next(lector, []), lector
+
+    @staticmethod
+    def _leer_xlsx(archivo):
+        try:
+            libro = load_workbook(archivo, read_only=True, data_only=True)
+        except Exception as e:
+            raise StudentImportError(f'No se pudo leer el archivo XLSX: {e}')
+        filas = libro.worksheets[0].iter_rows(values_only=True)
+        return list(next(filas, [])), filas
+
+    @staticmethod
+    def leer_filas(archivo):
+        """
+        Devuelve la lista de filas como diccionarios {columna: valor}, con el número
+        de fila de la hoja (la cabecera es la fila 1). Las filas vacías se omiten.
+        """
+        extension = os.path.splitext(archivo.name or '')[1].lower()
+        if extension == '.csv':
+            cabecera, filas = StudentImportService._leer_csv(archivo)
+        elif extension in ('.xlsx', '.xlsm'):
+            cabecera, filas = StudentImportService._leer_xlsx(archivo)
+        else:
+            raise StudentImportError('Formato no soportado. Envíe un archivo .csv o .xlsx.')
+
+        columnas = [StudentImportService._normalizar_cabecera(c) for c in cabecera]
+        faltantes = [c for c in StudentImportService.REQUIRED_COLUMNS if c not in columnas]
+        if faltantes:
+            raise StudentImportError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+
+        resultado = []
+        for numero, valores in enumerate(filas, start=2):
+            if not any(v not in (None, '') and str(v).strip() for v in valores):
+                continue
+            if len(resultado) >= StudentImportService.MAX_ROWS:
+                raise StudentImportError(f'El archivo supera el máximo de {StudentImportService.MAX_ROWS} filas.')
+            resultado.append((numero, dict(zip(columnas, valores))))
+        return resultado
+
+    @staticmethod
+    def _texto(valor):
+        if valor is None:
+            return None
+        if isinstance(valor, float) and valor.is_integer():
+            # Excel guarda los DNI numéricos como float
+            valor = int(valor)
+        texto = str(valor).strip()
+        return texto or None
+
+    @staticmethod
+    def _fecha(valor):
+        if valor in (None, ''):
+            return None
+        if isinstance(valor, datetime):
+            return valor.date()
+        if isinstance(valor, date):
+            return valor
+        texto = str(valor).strip()
+        for formato in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+            try:
+                return datetime.strptime(texto, formato).date()
+            except ValueError:
+                continue
+        raise ValueError(texto)
+
+    @staticmethod
+    def _limpiar_fila(fila):
+        """Normaliza una fila y devuelve (datos, errores por campo)."""
+        datos, errores = {}, {}
+
+        columnas = dict.fromkeys(
+            StudentImportService.REQUIRED_COLUMNS + StudentImportService.STUDENT_COLUMNS + StudentImportService.BIRTH_COLUMNS
+        )
+        for columna in columnas:
+            valor = StudentImportService._texto(fila.get(columna))
+            if valor and len(valor) > StudentImportService.MAX_LENGTH:
+                errores[columna] = f'Máximo {StudentImportService.MAX_LENGTH} caracteres.'
+            datos[columna] = valor
+
+        for columna in StudentImportService.REQUIRED_COLUMNS:
+            if not datos[columna]:
+                errores[columna] = 'Campo obligatorio.'
+
+        try:
+            datos['birthdate'] = StudentImportService._fecha(fila.get('birthdate'))
+        except ValueError:
+            errores['birthdate'] = 'Fecha no válida (use AAAA-MM-DD o DD/MM/AAAA).'
+
+        status = StudentImportService._texto(fila.get('status'))
+        try:
+            datos['status'] = int(status) if status is not None else None
+        except ValueError:
+            errores['status'] = 'Debe ser un número entero.'
+
+        return datos, errores
+
+    @staticmethod
+    def validar(filas):
+        """
+        Valida todas las filas con dos consultas en total (padres y documentos existentes).
+        Devuelve (filas válidas con parent_id resuelto, errores por fila).
+        """
+        limpias = [(numero,) + StudentImportService._limpiar_fila(fila) for numero, fila in filas]
+
+        dnis = {datos['parent_dni'] for _, datos, _ in limpias if datos['parent_dni']}
+        padres = dict(Parents.objects.filter(document_id__in=dnis).values_list('document_id', 'id'))
+
+        documentos = [datos['document_id'] for _, datos, _ in limpias if datos['document_id']]
+        registrados = set(Students.objects.filter(document_id__in=set(documentos)).values_list('document_id', flat=True))
+
+        vistos = {}
+        validas, errores = [], []
+        for numero, datos, errores_fila in limpias:
+            dni = datos['parent_dni']
+            if dni and dni not in padres:
+                errores_fila['parent_dni'] = 'No existe un padre con el DNI proporcionado.'
+
+            documento = datos['document_id']
+            if documento in registrados:
+                errores_fila['document_id'] = 'Ya existe un estudiante con este documento.'
+            elif documento in vistos:
+                errores_fila['document_id'] = f'Documento repetido en la fila {vistos[documento]}.'
+            elif documento:
+                vistos[documento] = numero
+
+            if errores_fila:
+                errores.append({'row': numero, 'errors': errores_fila})
+            else:
+                datos['parent_id'] = padres[dni]
+                validas.append(datos)
+        return validas, errores
+
+    @staticmethod
+    def importar(validas):
+        """Inserta estudiantes e información de nacimiento por bloques. Devuelve los ids creados."""
+        ids = []
+        with transaction.atomic():
+            for inicio in range(0, len(validas), StudentImportService.CHUNK_SIZE):
+                bloque = validas[inicio:inicio + StudentImportService.CHUNK_SIZE]
+                Students.objects.bulk_create([
+                    Students(
+                        parent_id=datos['parent_id'],
+                        birthdate=datos['birthdate'],
+                        status=datos['status'],
+                        **{c: datos[c] for c in StudentImportService.STUDENT_COLUMNS}
+                    )
+                    for datos in bloque
+                ])
+
+                # MySQL no devuelve las claves generadas en bulk_create: se recuperan por documento
+                id_por_documento = dict(Students.objects.filter(
+                    document_id__in=[datos['document_id'] for datos in bloque]
+                ).values_list('document_id', 'id'))
+
+                BirthStudents.objects.bulk_create([
+                    BirthStudents(
+                        id_student_id=id_por_documento[datos['document_id']],
+                        city=datos['city'],
+                        country=datos['country']
+                    )
+                    for datos in bloque
+                ])
+                ids.extend(id_por_documento[datos['document_id']] for datos in bloque)
+        return ids
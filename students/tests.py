@@ -1,3 +1,301 @@
-from django.test import TestCase
+import datetime
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from openpyxl import Workbook
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import BirthStudents, Class, Parents, StudentClass, Students
+from api.tests import UnmanagedTablesTestCase
+from metricas.services.cache_service import MetricasCacheService
+
+IMPORT_URL = '/api/students/import/'
+HEADER = ['parent_dni', 'name', 'last_name', 'document_id', 'birthdate', 'gender', 'status', 'city', 'country']
+
+
+def csv_file(rows, name='estudiantes.csv', delimiter=','):
+    lines = [delimiter.join(HEADER)] + [delimiter.join(str(value) for value in row) for row in rows]
+    return SimpleUploadedFile(name, '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+
+
+def xlsx_file(rows, name='estudiantes.xlsx'):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(HEADER)
+    for row in rows:
+        sheet.append(list(row))
+    content = io.BytesIO()
+    workbook.save(content)
+    return SimpleUploadedFile(
+        name, content.getvalue(),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+class StudentsApiTestCase(UnmanagedTablesTestCase):
+    """Cliente autenticado y caché vacía para los endpoints de /api/students/"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='coordinador', password='clave')
+        self.token = Token.objects.create(user=user).key
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+
+class StudentImportTest(StudentsApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.parent = Parents.objects.create(name='María', last_name='Núñez', document_id='40123456')
+        self.existing = Students.objects.create(name='Ya', last_name='Registrado', document_id='70000001')
+
+    def upload(self, archivo):
+        return self.client.post(IMPORT_URL, {'file': archivo}, format='multipart')
+
+    def imported(self):
+        return Students.objects.exclude(pk=self.existing.pk)
+
+    def test_valid_csv_creates_students_and_birth_info(self):
+        response = self.upload(csv_file([
+            ['40123456', 'Ana', 'Pérez', '70000010', '2015-04-20', 'Femenino', '1', 'Lima', 'Perú'],
+            ['40123456', 'Luis', 'Quispe', '70000011', '03/02/2012', '', '', '', ''],
+        ], delimiter=';'))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['errors'], [])
+        ana = Students.objects.get(document_id='70000010')
+        luis = Students.objects.get(document_id='70000011')
+        self.assertEqual(sorted(response.json()['student_ids']), sorted([ana.id, luis.id]))
+        self.assertEqual((ana.parent_id, ana.birthdate, ana.gender, ana.status),
+                         (self.parent.id, datetime.date(2015, 4, 20), 'Femenino', 1))
+        self.assertEqual((luis.birthdate, luis.gender, luis.status), (datetime.date(2012, 2, 3), None, None))
+        self.assertEqual(
+            set(BirthStudents.objects.values_list('id_student', 'city', 'country')),
+            {(ana.id, 'Lima', 'Perú'), (luis.id, None, None)}
+        )
+
+    def test_valid_xlsx_creates_students(self):
+        # Excel guarda los DNI como números y las fechas como datetime
+        response = self.upload(xlsx_file([
+            [40123456, 'Ana', 'Pérez', 70000010, datetime.datetime(2015, 4, 20), 'Femenino', 1, 'Cusco', 'Perú'],
+            [None, None, None, None, None, None, None, None, None],
+            ['40123456', 'José', 'Rojas', 'CE-123', '2014-01-31', None, None, None, None],
+        ]))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        ana = Students.objects.get(document_id='70000010')
+        self.assertEqual((ana.parent_id, ana.birthdate, ana.status), (self.parent.id, datetime.date(2015, 4, 20), 1))
+        self.assertTrue(Students.objects.filter(document_id='CE-123', birthdate=datetime.date(2014, 1, 31)).exists())
+        self.assertEqual(BirthStudents.objects.get(id_student=ana).city, 'Cusco')
+
+    def test_row_errors_are_reported_and_nothing_is_inserted(self):
+        response = self.upload(csv_file([
+            ['40123456', 'Ana', 'Pérez', '70000010', '2015-04-20', '', '1', '', ''],
+            ['40123456', '', 'Quispe', '70000011', '31/31/2012', '', 'activo', '', ''],
+            ['40123456', 'José', 'Rojas', '70000012', '', '', '', 'x' * 300, ''],
+        ]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+        # Números de fila de la hoja: la cabecera es la fila 1
+        errors = {error['row']: error['errors'] for error in response.json()['errors']}
+        self.assertEqual(set(errors), {3, 4})
+        self.assertEqual(set(errors[3]), {'name', 'birthdate', 'status'})
+        self.assertEqual(set(errors[4]), {'city'})
+        self.assertFalse(self.imported().exists())
+        self.assertFalse(BirthStudents.objects.exists())
+
+    def test_unknown_parent_dni(self):
+        response = self.upload(csv_file([
+            ['40123456', 'Ana', 'Pérez', '70000010', '', '', '', '', ''],
+            ['99999999', 'Luis', 'Quispe', '70000011', '', '', '', '', ''],
+        ]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            {'row': 3, 'errors': {'parent_dni': 'No existe un padre con el DNI proporcionado.'}}
+        ])
+        self.assertFalse(self.imported().exists())
+
+    def test_duplicate_documents(self):
+        response = self.upload(csv_file([
+            ['40123456', 'Ana', 'Pérez', '70000010', '', '', '', '', ''],
+            ['40123456', 'Ana', 'Pérez', '70000010', '', '', '', '', ''],
+            ['40123456', 'Otro', 'Alumno', self.existing.document_id, '', '', '', '', ''],
+        ]))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [
+            {'row': 3, 'errors': {'document_id': 'Documento repetido en la fila 2.'}},
+            {'row': 4, 'errors': {'document_id': 'Ya existe un estudiante con este documento.'}},
+        ])
+        self.assertFalse(self.imported().exists())
+
+    def test_wrong_extension_or_missing_columns(self):
+        response = self.upload(SimpleUploadedFile('estudiantes.txt', b'parent_dni,name\n1,Ana\n'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('.csv o .xlsx', response.json()['detail'])
+
+        response = self.upload(SimpleUploadedFile('estudiantes.csv', b'parent_dni,name\n40123456,Ana\n'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('last_name', response.json()['detail'])
+
+        response = self.upload(SimpleUploadedFile('estudiantes.xlsx', b'no es un xlsx'))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(IMPORT_URL, {}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.imported().exists())
+
+
+class BatchCoursesTest(StudentsApiTestCase):
+    URL = '/api/students/batch-courses/'
+
+    def setUp(self):
+        super().setUp()
+        self.ingles = Class.objects.create(name='Inglés')
+        self.arte = Class.objects.create(name='Arte')
+        self.musica = Class.objects.create(name='Música')
+        self.ana = Students.objects.create(name='Ana', document_id='S1')
+        self.luis = Students.objects.create(name='Luis', document_id='S2')
+        StudentClass.objects.create(id_student=self.ana, id_class=self.ingles)
+        StudentClass.objects.create(id_student=self.luis, id_class=self.arte)
+
+    def post(self, operations):
+        return self.client.post(self.URL, {'operations': operations}, format='json')
+
+    def enrollments(self):
+        return set(StudentClass.objects.values_list('id_student', 'id_class'))
+
+    def versions(self):
+        return [MetricasCacheService.version()] + [
+            MetricasCacheService.version(course.id) for course in (self.ingles, self.arte, self.musica)
+        ]
+
+    def test_operations_apply_in_order_to_the_desired_state(self):
+        response = self.post([
+            {'student_id': self.ana.id, 'add_class_ids': [self.arte.id, self.musica.id], 'remove_class_ids': [self.ingles.id]},
+            # La última operación sobre un par manda: Música se quita y Arte se vuelve a asignar
+            {'student_id': self.ana.id, 'remove_class_ids': [self.musica.id, self.arte.id], 'add_class_ids': [self.arte.id]},
+            # Asignar un curso que ya tiene y quitar uno que no tiene no cambia nada
+            {'student_id': self.luis.id, 'add_class_ids': [self.arte.id], 'remove_class_ids': [self.musica.id]},
+            {'student_id': str(self.luis.id), 'add_class_ids': [str(self.ingles.id)]},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.enrollments(), {
+            (self.ana.id, self.arte.id), (self.luis.id, self.arte.id), (self.luis.id, self.ingles.id),
+        })
+        self.assertEqual((response.json()['inserted'], response.json()['deleted']), (2, 1))
+        self.assertEqual(response.json()['results'][0], {
+            'student_id': self.ana.id, 'assigned_courses': ['Arte', 'Música'], 'removed_courses': ['Inglés'],
+        })
+        self.assertEqual(len(response.json()['results']), 4)
+
+    def test_unknown_ids_are_rejected_without_partial_writes(self):
+        before = self.enrollments()
+        response = self.post([
+            {'student_id': self.ana.id, 'add_class_ids': [self.musica.id], 'remove_class_ids': [self.ingles.id]},
+            {'student_id': 9999, 'add_class_ids': [self.arte.id]},
+            {'student_id': self.luis.id, 'add_class_ids': [8888], 'remove_class_ids': [self.arte.id]},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['unknown_students'], [9999])
+        self.assertEqual(response.json()['unknown_classes'], [8888])
+        self.assertEqual(self.enrollments(), before)
+
+    def test_invalid_payloads(self):
+        for operations in [[], 'x', [1], [{'student_id': 'abc'}], [{'student_id': self.ana.id, 'add_class_ids': 3}]]:
+            with self.subTest(operations=operations):
+                self.assertEqual(self.post(operations).status_code, 400)
+        with mock.patch('students.views.BATCH_MAX_OPERATIONS', 2):
+            self.assertEqual(self.post([{'student_id': self.ana.id}] * 3).status_code, 400)
+
+    def test_metric_caches_are_invalidated_on_commit(self):
+        before = self.versions()
+        response = self.post([{'student_id': self.ana.id, 'add_class_ids': [self.arte.id], 'remove_class_ids': [self.ingles.id]}])
+        self.assertEqual(response.status_code, 200)
+
+        after = self.versions()
+        # Cambian la versión global y las de los cursos tocados; Música no
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+        self.assertNotEqual(after[2], before[2])
+        self.assertEqual(after[3], before[3])
+
+    def test_failed_transaction_keeps_enrollments_and_caches(self):
+        before, versions = self.enrollments(), self.versions()
+        client = APIClient(raise_request_exception=False)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+        with mock.patch.object(StudentClass.objects, 'bulk_create', side_effect=DatabaseError('fallo')):
+            response = client.post(self.URL, {'operations': [
+                {'student_id': self.ana.id, 'add_class_ids': [self.arte.id], 'remove_class_ids': [self.ingles.id]}
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        # El DELETE se deshizo y on_commit no llegó a invalidar nada
+        self.assertEqual(self.enrollments(), before)
+        self.assertEqual(self.versions(), versions)
+
+
+class PaginationTest(StudentsApiTestCase):
+    URL = '/api/students/get/'
+
+    def setUp(self):
+        super().setUp()
+        self.ids = [Students.objects.create(name=f'Estudiante {i}', document_id=f'S{i}').id for i in range(7)]
+
+    def ids_of(self, response):
+        return [student['id'] for student in response.json()['results']]
+
+    def test_cursor_pages_are_newest_first_and_traversable(self):
+        first = self.client.get(self.URL, {'page_size': 3})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(set(first.json()), {'next', 'previous', 'results'})
+        self.assertEqual(self.ids_of(first), self.ids[:-4:-1])
+        self.assertIsNone(first.json()['previous'])
+
+        # Un alta entre páginas no desplaza las siguientes: el cursor es un ID, no un desplazamiento
+        Students.objects.create(name='Nuevo', document_id='N1')
+
+        second = self.client.get(first.json()['next'])
+        self.assertEqual(self.ids_of(second), self.ids[3:0:-1])
+        last = self.client.get(second.json()['next'])
+        self.assertEqual(self.ids_of(last), self.ids[:1])
+        self.assertIsNone(last.json()['next'])
+
+        back = self.client.get(last.json()['previous'])
+        self.assertEqual(self.ids_of(back), self.ids_of(second))
+        back = self.client.get(back.json()['previous'])
+        self.assertEqual(self.ids_of(back), self.ids_of(first))
+
+    def test_page_size_is_capped(self):
+        with mock.patch('api.pagination.IdCursorPagination.max_page_size', 4):
+            response = self.client.get(self.URL, {'page_size': 100})
+        self.assertEqual(self.ids_of(response), self.ids[:-5:-1])
+
+        with mock.patch('api.pagination.IdCursorPagination.page_size', 2):
+            response = self.client.get(self.URL)
+        self.assertEqual(self.ids_of(response), self.ids[:-3:-1])
+
+    def test_unpaginated_legacy_shape(self):
+        for value in ('false', '0', 'False'):
+            with self.subTest(paginate=value):
+                response = self.client.get(self.URL, {'paginate': value, 'page_size': 2})
+                self.assertEqual(response.status_code, 200)
+                # La lista completa, sin {next, previous, results}, como antes de la paginación
+                self.assertIsInstance(response.json(), list)
+                self.assertEqual([student['id'] for student in response.json()], self.ids[::-1])
+
+        response = self.client.get('/api/students/all-students-courses-info/', {'paginate': 'false'})
+        self.assertEqual([student['id'] for student in response.json()], self.ids[::-1])
@@ -1,30 +1,65 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.exceptions import NotFound
 from api.models import Parents, BirthStudents  
 from api.models import Students, Class, StudentClass
 from .serializers import StudentSerializer, StudentDetailsSerializer, StudentPartialUpdateSerializer,StudentCourseInfoSerializer
+from .serializers import StudentDetailsValuesSerializer, StudentCourseInfoValuesSerializer
+from django.db import transaction
 from django.db.models import Prefetch
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+from metricas.services.cache_service import MetricasCacheService
+from api.fieldsets import FIELDS_PARAMETER, requested_fields
+from api.pagination import PAGINATION_PARAMETERS, paginated_response
+from api.search import SEARCH_PARAMETERS, SEARCH_QUERY_PARAM, STUDENT_INDEX, parse_limit
+from api.catalog import CLASS_CATALOG
+from .services.import_service import StudentImportError, StudentImportService
+
+# Máximo de operaciones (estudiantes) aceptadas por batch-courses y tamaño de cada INSERT
+BATCH_MAX_OPERATIONS = 5000
+BATCH_INSERT_SIZE = 500
 
 class StudentsViewSet(viewsets.ViewSet):
     
     @swagger_auto_schema(
         operation_description="Obtener lista de todos los estudiantes",
-        responses={200: StudentDetailsSerializer(many=True), 500: "Error interno"},
+        manual_parameters=PAGINATION_PARAMETERS + [FIELDS_PARAMETER],
+        responses={200: StudentDetailsSerializer(many=True), 400: "fields inválido", 500: "Error interno"},
         tags=['📚 Gestión de Estudiantes']
     )
     @action(detail=False, methods=["GET"], url_path="get")
     def list_students(self, request):
-        students = Students.objects.all().order_by('-id').select_related('parent').prefetch_related(
-            'studentclass_set__id_class',  
-            Prefetch('birthstudents_set', queryset=BirthStudents.objects.all(), to_attr='birth_prefetched')
-        )
-        
-        serializer = StudentDetailsSerializer(students, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            fields = requested_fields(request, StudentDetailsValuesSerializer.field_names())
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Listado por la vía rápida (.values()); la salida es la misma que con StudentDetailsSerializer
+        students = StudentDetailsValuesSerializer.queryset(Students.objects.all().order_by('-id'), fields)
+
+        return paginated_response(request, students, StudentDetailsValuesSerializer, view=self, fields=fields)
+
+    @swagger_auto_schema(
+        operation_description="Buscar estudiantes por nombre, apellido o documento (por prefijo y sin distinguir tildes). "
+                              "Devuelve los mejores resultados primero.",
+        manual_parameters=SEARCH_PARAMETERS,
+        responses={200: "Resultados de la búsqueda", 400: "Parámetros inválidos"},
+        tags=['📚 Gestión de Estudiantes']
+    )
+    @action(detail=False, methods=["GET"], url_path="search")
+    def search_students(self, request):
+        query = request.query_params.get(SEARCH_QUERY_PARAM, "").strip()
+        if not query:
+            return Response({"detail": "El parámetro 'q' es obligatorio."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = parse_limit(request)
+        except ValueError:
+            return Response({"detail": "El parámetro 'limit' debe ser un número entero."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": STUDENT_INDEX.search(query, limit)}, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_description="Crear un nuevo estudiante",
@@ -89,12 +124,67 @@ class StudentsViewSet(viewsets.ViewSet):
             city=birth_info.get("city"),
             country=birth_info.get("country")
         )
+        MetricasCacheService.invalidar()
 
         return Response(
             StudentDetailsSerializer(student).data,
             status=status.HTTP_201_CREATED
         )
     
+    @swagger_auto_schema(
+        operation_description="Importar estudiantes desde un archivo CSV o XLSX. "
+                              "Columnas obligatorias: parent_dni, name, last_name, document_id. "
+                              "Opcionales: nationality, document_type, birthdate, gender, status, city, country. "
+                              "Si alguna fila tiene errores no se importa ninguna.",
+        manual_parameters=[
+            openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True,
+                              description="Archivo .csv o .xlsx (la primera fila es la cabecera)")
+        ],
+        consumes=['multipart/form-data'],
+        responses={
+            201: openapi.Response(
+                description="Estudiantes importados",
+                examples={"application/json": {"created": 2, "student_ids": [301, 302], "errors": []}}
+            ),
+            400: openapi.Response(
+                description="Archivo no válido o filas con errores (no se importa nada)",
+                examples={"application/json": {
+                    "created": 0,
+                    "student_ids": [],
+                    "errors": [{"row": 3, "errors": {"parent_dni": "No existe un padre con el DNI proporcionado."}}]
+                }}
+            ),
+        },
+        tags=['📚 Gestión de Estudiantes']
+    )
+    @action(detail=False, methods=["POST"], url_path="import", parser_classes=[MultiPartParser])
+    def import_students(self, request):
+        archivo = request.FILES.get("file")
+        if not archivo:
+            return Response({"detail": "Debe enviar el archivo en el campo 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            filas = StudentImportService.leer_filas(archivo)
+        except StudentImportError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not filas:
+            return Response({"detail": "El archivo no contiene filas."}, status=status.HTTP_400_BAD_REQUEST)
+
+        validas, errores = StudentImportService.validar(filas)
+        if errores:
+            return Response({"created": 0, "student_ids": [], "errors": errores}, status=status.HTTP_400_BAD_REQUEST)
+
+        student_ids = StudentImportService.importar(validas)
+        MetricasCacheService.invalidar()
+        # bulk_create no emite señales: el índice de búsqueda se invalida aquí
+        STUDENT_INDEX.invalidate()
+
+        return Response(
+            {"created": len(student_ids), "student_ids": student_ids, "errors": []},
+            status=status.HTTP_201_CREATED
+        )
+
     @swagger_auto_schema(
         operation_description="Obtener estudiante por ID",
         manual_parameters=[
@@ -162,6 +252,7 @@ class StudentsViewSet(viewsets.ViewSet):
 
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        MetricasCacheService.invalidar(*student.studentclass_set.values_list('id_class', flat=True))
 
         return Response(
             {"detail": "Información del estudiante actualizada correctamente."},
@@ -197,6 +288,7 @@ class StudentsViewSet(viewsets.ViewSet):
             message = "Estudiante activado."
         
         student.save()
+        MetricasCacheService.invalidar(*student.studentclass_set.values_list('id_class', flat=True))
         
         return Response({"detail": message}, status=status.HTTP_200_OK)
 
@@ -242,12 +334,15 @@ class StudentsViewSet(viewsets.ViewSet):
         assigned_courses = []
         for course_id in class_id:
             try:
-                course = Class.objects.get(pk=course_id)
+                course = CLASS_CATALOG.get(course_id)
                 StudentClass.objects.get_or_create(id_student=student, id_class=course)
                 assigned_courses.append(course.name)
             except Class.DoesNotExist:
+                MetricasCacheService.invalidar(*class_id)
                 return Response({"detail": f"Curso con ID {course_id} no encontrado."}, status=404)
 
+        MetricasCacheService.invalidar(*class_id)
+
         return Response(
             {
                 "message": "Cursos asignados con éxito",
@@ -296,11 +391,13 @@ class StudentsViewSet(viewsets.ViewSet):
         for course_id in class_id:
             StudentClass.objects.filter(id_student=student, id_class=course_id).delete()
             try:
-                course = Class.objects.get(pk=course_id)
+                course = CLASS_CATALOG.get(course_id)
                 removed_courses.append(course.name)
             except Class.DoesNotExist:
                 pass
 
+        MetricasCacheService.invalidar(*class_id)
+
         return Response(
             {
                 "message": "Cursos removidos con éxito",
@@ -348,7 +445,7 @@ class StudentsViewSet(viewsets.ViewSet):
         for course_id in old_class_id:
             StudentClass.objects.filter(id_student=student, id_class=course_id).delete()
             try:
-                course = Class.objects.get(pk=course_id)
+                course = CLASS_CATALOG.get(course_id)
                 removed_courses.append(course.name)
             except Class.DoesNotExist:
                 pass
@@ -356,12 +453,14 @@ class StudentsViewSet(viewsets.ViewSet):
         assigned_courses = []
         for course_id in new_class_id:
             try:
-                course = Class.objects.get(pk=course_id)
+                course = CLASS_CATALOG.get(course_id)
                 StudentClass.objects.get_or_create(id_student=student, id_class=course)
                 assigned_courses.append(course.name)
             except Class.DoesNotExist:
                 pass
 
+        MetricasCacheService.invalidar(*old_class_id, *new_class_id)
+
         return Response(
             {
                 "message": f"El estudiante {student.name} ha sido actualizado. Cursos removidos y asignados correctamente.",
@@ -371,19 +470,137 @@ class StudentsViewSet(viewsets.ViewSet):
             status=status.HTTP_200_OK
         )
     
+    @swagger_auto_schema(
+        operation_description="Asignar, remover o mover cursos de varios estudiantes en una sola petición. "
+                              "Para cada estudiante primero se remueven los cursos de remove_class_ids y luego se asignan "
+                              "los de add_class_ids (mover = remover + asignar). Se valida todo antes de escribir y los "
+                              "cambios se aplican en una única transacción.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['operations'],
+            properties={
+                'operations': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    description=f"Máximo {BATCH_MAX_OPERATIONS} operaciones",
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        required=['student_id'],
+                        properties={
+                            'student_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                            'add_class_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                            'remove_class_ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                        }
+                    )
+                )
+            }
+        ),
+        responses={
+            200: openapi.Response(
+                description="Cambios aplicados",
+                examples={"application/json": {
+                    "message": "Cursos actualizados con éxito",
+                    "inserted": 1,
+                    "deleted": 1,
+                    "results": [{"student_id": 127, "assigned_courses": ["Inglés 5 - 7"], "removed_courses": ["Arte"]}]
+                }}
+            ),
+            400: "Datos inválidos, o estudiantes/cursos inexistentes (no se aplica ningún cambio)"
+        },
+        tags=['📚 Gestión de Estudiantes']
+    )
+    @action(detail=False, methods=["POST"], url_path="batch-courses")
+    def batch_courses(self, request):
+        operations = request.data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return Response({"detail": "operations debe ser una lista no vacía."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return Response({"detail": f"Se permiten como máximo {BATCH_MAX_OPERATIONS} operaciones por petición."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Normalizar: (student_id, cursos a remover, cursos a asignar) por operación
+        parsed = []
+        for i, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                return Response({"detail": f"operations[{i}] debe ser un objeto."}, status=status.HTTP_400_BAD_REQUEST)
+            add_ids = operation.get('add_class_ids', [])
+            remove_ids = operation.get('remove_class_ids', [])
+            if not isinstance(add_ids, list) or not isinstance(remove_ids, list):
+                return Response({"detail": f"operations[{i}]: add_class_ids y remove_class_ids deben ser listas."}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                parsed.append((
+                    int(operation.get('student_id')),
+                    [int(course_id) for course_id in remove_ids],
+                    [int(course_id) for course_id in add_ids],
+                ))
+            except (TypeError, ValueError):
+                return Response({"detail": f"operations[{i}]: student_id y los IDs de cursos deben ser enteros."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Validar todos los estudiantes y cursos con una consulta cada uno
+        student_ids = {student_id for student_id, _, _ in parsed}
+        class_ids = {course_id for _, remove_ids, add_ids in parsed for course_id in remove_ids + add_ids}
+        existing_students = set(Students.objects.filter(pk__in=student_ids).values_list('id', flat=True))
+        class_names = {course_id: course.name for course_id, course in CLASS_CATALOG.get_many(class_ids).items()}
+
+        unknown_students = sorted(student_ids - existing_students)
+        unknown_classes = sorted(class_ids - set(class_names))
+        if unknown_students or unknown_classes:
+            return Response({
+                "detail": "Hay estudiantes o cursos que no existen. No se aplicó ningún cambio.",
+                "unknown_students": unknown_students,
+                "unknown_classes": unknown_classes,
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Estado final deseado por par (estudiante, curso); las operaciones se aplican en orden
+        desired = {}
+        for student_id, remove_ids, add_ids in parsed:
+            for course_id in remove_ids:
+                desired[(student_id, course_id)] = False
+            for course_id in add_ids:
+                desired[(student_id, course_id)] = True
+
+        existing = {}
+        for row_id, student_id, course_id in StudentClass.objects.filter(
+            id_student__in=student_ids, id_class__in=class_ids
+        ).values_list('id', 'id_student', 'id_class'):
+            existing.setdefault((student_id, course_id), []).append(row_id)
+
+        to_delete = [row_id for pair, keep in desired.items() if not keep for row_id in existing.get(pair, [])]
+        to_insert = [
+            StudentClass(id_student_id=student_id, id_class_id=course_id)
+            for (student_id, course_id), keep in desired.items()
+            if keep and (student_id, course_id) not in existing
+        ]
+
+        with transaction.atomic():
+            if to_delete:
+                StudentClass.objects.filter(pk__in=to_delete).delete()
+            StudentClass.objects.bulk_create(to_insert, batch_size=BATCH_INSERT_SIZE)
+            transaction.on_commit(lambda: MetricasCacheService.invalidar(*class_ids))
+
+        return Response({
+            "message": "Cursos actualizados con éxito",
+            "inserted": len(to_insert),
+            "deleted": len(to_delete),
+            "results": [
+                {
+                    "student_id": student_id,
+                    "assigned_courses": [class_names[course_id] for course_id in add_ids],
+                    "removed_courses": [class_names[course_id] for course_id in remove_ids],
+                }
+                for student_id, remove_ids, add_ids in parsed
+            ]
+        }, status=status.HTTP_200_OK)
+
     @swagger_auto_schema(
         operation_description="Obtener información de cursos de todos los estudiantes",
+        manual_parameters=PAGINATION_PARAMETERS,
         responses={200: StudentCourseInfoSerializer(many=True), 500: "Error interno"},
         tags=['📚 Gestión de Estudiantes']
     )
     @action(detail=False, methods=["GET"], url_path="all-students-courses-info")
     def get_all_students_courses_info(self, request):
-        students = Students.objects.all().prefetch_related(
-            'studentclass_set__id_class'
-        ).order_by('-id')
-        
-        serializer = StudentCourseInfoSerializer(students, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        students = StudentCourseInfoValuesSerializer.queryset(Students.objects.all().order_by('-id'))
+
+        return paginated_response(request, students, StudentCourseInfoValuesSerializer, view=self)
     
     @swagger_auto_schema(
         operation_description="Obtener información de cursos de un estudiante específico",
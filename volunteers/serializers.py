@@ -1,46 +1,60 @@
 from rest_framework import serializers
 from api.models import Volunteers, AuthUser, AuthUserRoles, VolunteerClass
 from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Prefetch, Subquery
+from api.fieldsets import SparseFieldsMixin
 User = get_user_model()
 
-class GetVolunteersSerializer(serializers.ModelSerializer):
+class GetVolunteersSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     role = serializers.SerializerMethodField()
     email = serializers.SerializerMethodField()
     course_ids = serializers.SerializerMethodField()  # Nuevo campo para devolver la lista de IDs de cursos
     
+    # Requiere un queryset preparado con GetVolunteersSerializer.setup_queryset
     class Meta:
         model = Volunteers
         fields = ['id', 'name', 'last_name', 'email', 'personal_email', 'phone', 'photo', 'nationality', 'document_type', 'document_id', 'birthdate', 'gender', 'status', 'created_at', 'updated_at', 'user', 'role', 'course_ids']  # Incluimos 'courses' en los campos
     
+    @staticmethod
+    def setup_queryset(queryset, fields=None):
+        """
+        Carga en la misma consulta el email del usuario y el ID de su rol, y en una sola
+        consulta adicional los cursos de todos los voluntarios. El serializer lee estos
+        atributos en lugar de consultar por cada voluntario.
+        Con `fields` solo se prepara lo que necesitan los campos pedidos.
+        """
+        if fields is None:
+            queryset = queryset.select_related('user')
+        else:
+            # Solo las columnas de los campos pedidos (id siempre, para la paginación por cursor)
+            columnas = {field.name for field in Volunteers._meta.concrete_fields}
+            cargar = ['id'] + [name for name in fields if name in columnas]
+            if 'email' in fields:
+                queryset = queryset.select_related('user')
+                cargar.append('user__email')
+            queryset = queryset.only(*cargar)
+
+        if fields is None or 'role' in fields:
+            primer_rol = AuthUserRoles.objects.filter(
+                user_id=OuterRef('user_id')
+            ).order_by('id').values('role_id')[:1]
+            queryset = queryset.annotate(role_id=Subquery(primer_rol))
+
+        if fields is None or 'course_ids' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('volunteerclass_set', queryset=VolunteerClass.objects.order_by('id'), to_attr='volunteer_classes')
+            )
+        return queryset
+
     def get_role(self, obj):
-        try:
-            # Primero obtenemos el objeto AuthUser
-            auth_user = AuthUser.objects.get(id=obj.user_id)
-            
-            # Buscamos el rol directamente por user_id en lugar del objeto
-            # Esto evita el error de tipos incompatibles
-            user_role = AuthUserRoles.objects.filter(user_id=auth_user.id).first()
-            
-            if user_role:
-                return user_role.role.id  # Devolver el ID del rol
-            return None  # Devolver None si no se encuentra rol
-            
-        except Exception :
-            # Silenciar la excepción para no mostrar errores en la consola
-            return None  # En caso de error, devolver None
+        return obj.role_id  # ID del rol, o None si el usuario no tiene rol
 
     def get_email(self, obj):
-        auth_user = AuthUser.objects.filter(id=obj.user_id).first()
-        if auth_user:
-            return auth_user.email  # Devolver el email del usuario
-        return None  # Devolver None si no se encuentra usuario
+        return obj.user.email if obj.user else None  # None si no hay usuario
 
     def get_course_ids(self, obj):
-        # Obtener todos los cursos asociados al voluntario desde VolunteerClass
-        volunteer_classes = VolunteerClass.objects.filter(id_volunteer=obj.id)
-        # Extraer los IDs de los cursos de las instancias de VolunteerClass
-        course_ids = volunteer_classes.values_list('id_class', flat=True)
-        return list(course_ids)  # Devolver los IDs de los cursos como una lista
+        # IDs de los cursos asociados al voluntario desde VolunteerClass
+        return [volunteer_class.id_class_id for volunteer_class in obj.volunteer_classes]
 
     
 class UserAuthSerializer(serializers.ModelSerializer):
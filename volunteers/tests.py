@@ -1,3 +1,130 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from api.models import AuthRole, AuthUserRoles, Class, VolunteerClass, Volunteers
+from api.tests import UnmanagedTablesTestCase, selected_columns
+
+LIST_URL = '/volunteers/volunteers/Get_Volunteers/'
+
+
+class VolunteersApiTestCase(UnmanagedTablesTestCase):
+    """Cliente autenticado, roles y cursos para el listado de voluntarios"""
+
+    def setUp(self):
+        cache.clear()
+        admin = User.objects.create_user(username='coordinador', password='clave')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+
+        self.profesor = AuthRole.objects.create(name='Volunteers_Profesor')
+        self.admin = AuthRole.objects.create(name='admin')
+        self.courses = [Class.objects.create(name=name) for name in ('Inglés', 'Arte', 'Música')]
+
+    def create_volunteers(self, count, start=0):
+        """`count` voluntarios con usuario, uno o dos roles y varios cursos; devuelve sus IDs"""
+        ids = []
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f'profe{i}', password='clave', email=f'profe{i}@x.com')
+            volunteer = Volunteers.objects.create(name=f'Voluntario {i}', last_name='Pérez', user_id=user.id, status=1)
+            AuthUserRoles.objects.create(user_id=user.id, role=self.profesor)
+            if i % 2:
+                AuthUserRoles.objects.create(user_id=user.id, role=self.admin)
+            for course in self.courses[:i % 3 + 1]:
+                VolunteerClass.objects.create(id_volunteer=volunteer, id_class=course)
+            ids.append(volunteer.id)
+        return ids
+
+    def get(self, **params):
+        return self.client.get(LIST_URL, params)
+
+
+class VolunteersListTest(VolunteersApiTestCase):
+
+    def test_full_list_payload(self):
+        ids = self.create_volunteers(3)
+        sin_usuario = Volunteers.objects.create(name='Sin cuenta', status=1)
+
+        results = self.get().json()['results']
+        self.assertEqual([item['id'] for item in results], [sin_usuario.id] + ids[::-1])
+        self.assertEqual(
+            [(item['email'], item['role'], item['course_ids']) for item in results],
+            [
+                (None, None, []),
+                ('profe2@x.com', self.profesor.id, [course.id for course in self.courses]),
+                ('profe1@x.com', self.profesor.id, [course.id for course in self.courses[:2]]),
+                ('profe0@x.com', self.profesor.id, [self.courses[0].id]),
+            ]
+        )
+
+    def test_query_count_does_not_grow_with_volunteers(self):
+        self.create_volunteers(3)
+        # La primera petición deja el token en la caché: las siguientes solo consultan la lista
+        self.assertEqual(self.get().status_code, 200)
+
+        for total in (3, 8):
+            with self.subTest(total=total):
+                if total > 3:
+                    self.create_volunteers(total - 3, start=3)
+                # Voluntarios con usuario y rol en una consulta, y sus cursos en otra
+                with self.assertNumQueries(2):
+                    response = self.get()
+                self.assertEqual(len(response.json()['results']), total)
+
+                with self.assertNumQueries(2):
+                    response = self.get(paginate='false')
+                self.assertEqual(len(response.json()), total)
+
+                # Sin role ni course_ids: ni la subconsulta de roles ni la consulta de cursos
+                with self.assertNumQueries(1):
+                    response = self.get(fields='id,email')
+                self.assertEqual(len(response.json()['results']), total)
+
+
+class VolunteersSparseFieldsTest(VolunteersApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ids = self.create_volunteers(3)
+
+    def test_fields_trim_payload_and_columns(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.get(fields='email,name')
+        # En el orden del serializador, no en el de la petición
+        self.assertEqual([list(item) for item in response.json()['results']], [['name', 'email']] * 3)
+        self.assertEqual(response.json()['results'][0], {'name': 'Voluntario 2', 'email': 'profe2@x.com'})
+
+        sql = consultas.captured_queries[-1]['sql']
+        self.assertEqual(selected_columns(sql, 'volunteers'), ['id', 'name', 'user_id'])
+        self.assertEqual(selected_columns(sql, 'auth_user'), ['id', 'email'])
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.get(fields='role,course_ids')
+        self.assertEqual(response.json()['results'][0], {
+            'role': self.profesor.id, 'course_ids': [course.id for course in self.courses]
+        })
+        volunteers_sql = [consulta['sql'] for consulta in consultas.captured_queries if 'FROM "volunteers"' in consulta['sql']]
+        self.assertEqual(selected_columns(volunteers_sql[0], 'volunteers'), ['id'])
+        # Sin email no hace falta el JOIN con el usuario
+        self.assertNotIn('JOIN "auth_user"', volunteers_sql[0])
+
+    def test_id_is_always_loaded_for_the_cursor(self):
+        # Sin id en fields la paginación por cursor sigue funcionando
+        names, url, params = [], LIST_URL, {'fields': 'name', 'page_size': 1}
+        while url:
+            page = self.client.get(url, params).json()
+            self.assertTrue(all(list(item) == ['name'] for item in page['results']))
+            names += [item['name'] for item in page['results']]
+            url, params = page['next'], None
+        self.assertEqual(names, ['Voluntario 2', 'Voluntario 1', 'Voluntario 0'])
+
+    def test_unknown_fields_are_rejected(self):
+        for value in ['name,password', 'clave', '', ' , ']:
+            with self.subTest(fields=value):
+                response = self.get(fields=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Campos no válidos', response.json()['error'])
+        self.assertIn('password', self.get(fields='name,password').json()['error'])
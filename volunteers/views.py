@@ -12,19 +12,26 @@ from django.utils import timezone
 from api.models import Volunteers ,AuthUser , AuthRole , AuthUserRoles ,Class ,VolunteerClass
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token
+from api.pagination import paginated_response
+from api.authentication import CachedTokenAuthentication
+from api.fieldsets import requested_fields
+from api.catalog import CLASS_CATALOG
 
 class VolunteersViewSet(ViewSet):
     
     @action(detail=False, methods=['GET'], url_path='Get_Volunteers')
     def Get_Volunteers(self, request):
         try:
-            # Obtener todos los voluntarios
-            volunteers = Volunteers.objects.all().order_by("-id")
+            fields = requested_fields(request, GetVolunteersSerializer.Meta.fields)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Serializar los voluntarios
-            serializer = GetVolunteersSerializer(volunteers, many=True)
+        try:
+            # Obtener todos los voluntarios
+            volunteers = GetVolunteersSerializer.setup_queryset(Volunteers.objects.all().order_by("-id"), fields)
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # Serializar los voluntarios (una página, salvo paginate=false)
+            return paginated_response(request, volunteers, GetVolunteersSerializer, view=self, fields=fields)
 
         except Exception as e:
             print(f"Unexpected error: {str(e)}")
@@ -81,7 +88,7 @@ class VolunteersViewSet(ViewSet):
             valid_courses = []
             for course_id in course_ids:
                 try:
-                    class_instance = Class.objects.get(id=course_id)
+                    class_instance = CLASS_CATALOG.get(course_id)
                     VolunteerClass.objects.create(id_class=class_instance, id_volunteer=volunteer)
                     valid_courses.append(class_instance.name)  # Añadir el nombre del curso a una lista
                 except Class.DoesNotExist:
@@ -190,7 +197,7 @@ class VolunteersViewSet(ViewSet):
                     # Crear nuevas relaciones
                     for course_id in course_ids:
                         try:
-                            class_instance = Class.objects.get(id=course_id)
+                            class_instance = CLASS_CATALOG.get(course_id)
                             VolunteerClass.objects.create(id_class=class_instance, id_volunteer=volunteer)
                         except Class.DoesNotExist:
                             return Response(
@@ -233,6 +240,10 @@ class VolunteersViewSet(ViewSet):
         volunteer.status = 0  # Cambia 'Inactivo' por el valor que represente la desactivación en tu sistema
         volunteer.save()
 
+        # Descartar los tokens cacheados del usuario para que la próxima petición se autentique contra la base de datos
+        if volunteer.user_id:
+            CachedTokenAuthentication.invalidate_user(volunteer.user_id)
+
         return Response({"message": "El estado del voluntario ha sido actualizado a inactivo."}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['PATCH'], url_path='enable_volunteer')